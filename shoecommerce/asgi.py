@@ -12,5 +12,14 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shoecommerce.settings')
+# Serve the catalog pages with the async views (see shoecommerce/asgi_urls.py)
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'shoecommerce.asgi_urls')
+# No persistent DB connections under ASGI (see DATABASES in settings.py)
+os.environ.setdefault('DJANGO_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
+
+# Load the search suggestion index (store/autocomplete.py) before the first keystroke
+from store import autocomplete  # noqa: E402
+
+autocomplete.warm()
@@ -0,0 +1,13 @@
+"""
+URL configuration for the ASGI application.
+
+Identical to shoecommerce/urls.py except that the store's catalog pages
+are served by async views (store/async_views.py).
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include('store.async_urls')),
+]
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 
@@ -42,7 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    # First, so its wall time covers everything below (store/middleware/metrics.py)
+    'store.middleware.metrics.RequestMetricsMiddleware',
+    # Separate admin/shopper sessions (replaces Django's SessionMiddleware)
+    'store.middleware.sessions.DualSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -50,8 +54,21 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'shoecommerce.urls'
+# shoecommerce/asgi.py switches this to 'shoecommerce.asgi_urls'
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'shoecommerce.urls')
+
 
+# Admin pages get their own session cookie and store, so logging into the
+# admin never touches the shopper session (store/middleware/sessions.py)
+ADMIN_SESSION_COOKIE_NAME = 'admin_sessionid'
+ADMIN_SESSION_ENGINE = 'store.admin_sessions'
+ADMIN_SESSION_PATHS = (
+    '/admin/',
+    '/admin-login/',
+    '/myadmin/',
+    '/orders/',
+    '/delete_order/',
+)
 
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
@@ -84,9 +101,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Transactions take SQLite's write lock on BEGIN, so concurrent
+            # writers (e.g. checkouts) wait their turn instead of failing
+            # with "database is locked" when upgrading a read lock
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Keep connections between requests (the pragmas below run once per
+        # connection). shoecommerce/asgi.py sets 0: under ASGI requests
+        # don't stay on one thread, so persistent connections would pile up.
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        # A file (not the default in-memory DB) so tests can run real
+        # concurrent writers, e.g. the parallel checkout test
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Run on every new SQLite connection (store/sqlite.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',       # readers and the writer don't block each other
+    'synchronous': 'normal',     # durable in WAL mode, far fewer fsyncs
+    'cache_size': -20000,        # 20 MB page cache per connection
+    'mmap_size': 134217728,      # read through a 128 MB memory map
+    'busy_timeout': 5000,        # wait up to 5 s for the write lock
+}
+
+# Extra attempts (with backoff) for write transactions that still hit
+# "database is locked" after busy_timeout
+SQLITE_LOCK_RETRIES = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -123,6 +169,24 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# With DEBUG off, collectstatic writes content-hashed names plus .gz/.br
+# copies, served with far-future Cache-Control (store/assets.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'store.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Let the web server send media/static files: '' (Python streams them),
+# 'x-sendfile' (Apache/lighttpd) or 'x-accel-redirect' (nginx; internal
+# location at ASSET_ACCEL_PREFIX, see store/assets.py)
+ASSET_SENDFILE = os.environ.get('DJANGO_ASSET_SENDFILE', '')
+ASSET_ACCEL_PREFIX = '/_protected/'
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 30
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -134,3 +198,41 @@ TEMPLATES[0]['DIRS'] = [os.path.join(BASE_DIR, 'templates')]
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# A directory shared by every process on this machine (web workers and
+# run_workers), so catalog and suggestion version bumps made by a task
+# reach the web processes (store/cache.py). Across several machines use a
+# server cache such as Redis instead.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'store.cache.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Full-page cache for anonymous visitors on the catalog pages (store/page_cache.py)
+PAGE_CACHE_ENABLED = False
+PAGE_CACHE_TIMEOUT = 300
+PAGE_CACHE_ALIAS = 'default'
+
+# Per-view request metrics (store/metrics.py), shown on /myadmin/metrics/.
+# Fraction of requests that are measured, 0.0 turns it off.
+METRICS_SAMPLE_RATE = 1.0
+
+# Order archival (store/order_archive.py): where the .jsonl.gz files go,
+# orders per delete transaction and the pause between batches (seconds)
+ORDER_ARCHIVE_DIR = BASE_DIR / 'archives'
+ORDER_ARCHIVE_BATCH_SIZE = 500
+ORDER_ARCHIVE_PAUSE = 0.2
+
+# Background tasks (store/task_queue.py), run by `manage.py run_workers`:
+# worker processes (None: one per CPU), retry backoff (seconds, doubled
+# per attempt up to the max) and how long done tasks are kept
+TASK_WORKERS = None
+TASK_RETRY_BACKOFF = 10
+TASK_RETRY_BACKOFF_MAX = 60 * 60
+TASK_RETENTION_DAYS = 7
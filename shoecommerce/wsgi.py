@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shoecommerce.settings')
 
 application = get_wsgi_application()
+
+# Load the search suggestion index (store/autocomplete.py) before the first keystroke
+from store import autocomplete  # noqa: E402
+
+autocomplete.warm()
@@ -0,0 +1,14 @@
+"""
+Session engine for the admin side (ADMIN_SESSION_ENGINE = 'store.admin_sessions').
+
+Same as Django's database engine, but rows live in the store_adminsession
+table, so admin and shopper sessions never share a store.
+"""
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+
+class SessionStore(DBStore):
+    @classmethod
+    def get_model_class(cls):
+        from .models import AdminSession
+        return AdminSession
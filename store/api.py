@@ -0,0 +1,324 @@
+"""
+JSON API (version 1) for the mobile app, mounted at /api/v1/.
+
+    GET    products/                 product list, newest first
+    GET    products/<id>/            one product
+    GET    search/?q=                ranked full-text search (store/search.py)
+    GET    cart/                     the current cart
+    POST   cart/items/               add {"product_id": .., "quantity": 1}
+    PUT    cart/items/<product_id>/  set {"quantity": ..} (0 removes the line)
+    DELETE cart/items/<product_id>/  remove the line
+
+Responses are built straight from .values() rows with json.dumps, with no
+templates and no model instances on the listing paths.
+
+- Sparse fieldsets: ?fields=id,name,price picks from PRODUCT_FIELDS (the
+  defaults are LIST_FIELDS / all of them for a single product). Only the
+  columns behind the requested fields are selected, and the category is
+  only joined when `category` is asked for.
+- Pagination: ?limit= (default 24, at most MAX_LIMIT) and ?after=<next_cursor
+  from the previous page>. The list is keyset-paginated like the HTML catalog.
+  Search results are ranked, so their cursor is an opaque page token. A
+  cursor that isn't a positive id SQLite can hold is a 400.
+- Ids and quantities are checked before they reach the database: an id
+  past SQLite's INTEGER range is a 404 in the URL and a 400 in a body, and
+  a quantity may be at most MAX_QUANTITY.
+- The list takes the same facets as the home page (?category=, ?price=,
+  ?in_stock=1).
+- Compression: gzip or deflate, whichever the client accepts (gzip first).
+- GET product endpoints answer If-None-Match / If-Modified-Since with 304
+  like the HTML pages (store/conditional.py).
+- The cart endpoints use the session like the site, so writes need the
+  CSRF token: GET cart/ sets the csrftoken cookie; send it back in the
+  X-CSRFToken header.
+
+Query budget per request, not counting the session and user lookups the
+middleware does for a logged-in client:
+
+    products/            2  (validator + one page)
+    products/<id>/       2  (validator + the product)
+    search/              3  (validator + ranked ids + the products)
+    cart/                2  (lines + total; 1 for an anonymous cart)
+    cart/items/...      <= 7 (the change: an UPDATE, or UPDATE + product
+                              check + INSERT in its own transaction;
+                              then the cart)
+
+The tests in store/tests.py hold the endpoints to these numbers.
+"""
+import json
+import re
+import zlib
+from decimal import Decimal
+from functools import wraps
+
+from django.core.files.storage import default_storage
+from django.http import JsonResponse, QueryDict
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from django.views.decorators.csrf import ensure_csrf_cookie
+
+from . import cart_service, facets, search
+from .conditional import catalog_state, conditional_page, product_state
+from .models import Product
+from .pagination import keyset_page, parse_cursor
+from .sqlite import MAX_INTEGER
+
+DEFAULT_LIMIT = 24
+MAX_LIMIT = 100
+
+# Per cart line; keeps line totals well inside their DecimalField
+MAX_QUANTITY = 1000
+
+# Responses smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 200
+
+COMPACT = {'separators': (',', ':')}
+
+CENT = Decimal('0.01')
+
+
+def _image_url(name):
+    return default_storage.url(name) if name else None
+
+
+# field -> (columns it needs, value from a .values() row)
+PRODUCT_FIELDS = {
+    'id': (['id'], lambda row: row['id']),
+    'name': (['name'], lambda row: row['name']),
+    'price': (['price'], lambda row: row['price']),
+    'stock': (['stock'], lambda row: row['stock']),
+    'in_stock': (['stock'], lambda row: row['stock'] > 0),
+    'description': (['description'], lambda row: row['description']),
+    'category': (['category_id', 'category__name'],
+                 lambda row: {'id': row['category_id'], 'name': row['category__name']}),
+    'image': (['image'], lambda row: _image_url(row['image'])),
+    'updated_at': (['updated_at'], lambda row: row['updated_at']),
+}
+LIST_FIELDS = ['id', 'name', 'price', 'in_stock', 'category', 'image']
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=COMPACT)
+
+
+def _compress(request, response):
+    if response.streaming or response.has_header('Content-Encoding') or len(response.content) < MIN_COMPRESS_SIZE:
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if re.search(r'\bgzip\b', accepted):
+        encoding, body = 'gzip', compress_string(response.content)
+    elif re.search(r'\bdeflate\b', accepted):
+        encoding, body = 'deflate', zlib.compress(response.content)
+    else:
+        return response
+    if len(body) >= len(response.content):
+        return response
+    response.content = body
+    response['Content-Length'] = str(len(body))
+    response['Content-Encoding'] = encoding
+    return response
+
+
+def api_view(methods):
+    """Allow `methods`, turn ApiError into a JSON error and compress the response."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods and not (request.method == 'HEAD' and 'GET' in methods):
+                response = _json({'error': f'Method {request.method} not allowed.'}, status=405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            try:
+                response = view(request, *args, **kwargs)
+            except ApiError as exc:
+                response = _json({'error': str(exc)}, status=exc.status)
+            return _compress(request, response)
+
+        return wrapper
+
+    return decorator
+
+
+def _fields(request, default):
+    requested = request.GET.get('fields')
+    if not requested:
+        return default
+    fields = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in PRODUCT_FIELDS]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(PRODUCT_FIELDS)}.")
+    return fields
+
+
+def _columns(fields):
+    # 'id' is always selected: it is the pagination cursor
+    columns = {'id'}
+    for name in fields:
+        columns.update(PRODUCT_FIELDS[name][0])
+    return sorted(columns)
+
+
+def _serialize(row, fields):
+    return {name: PRODUCT_FIELDS[name][1](row) for name in fields}
+
+
+def _row(product):
+    """A Product instance (category loaded) as the .values() row the serializers expect."""
+    return {
+        'id': product.pk, 'name': product.name, 'price': product.price, 'stock': product.stock,
+        'description': product.description, 'category_id': product.category_id,
+        'category__name': product.category.name, 'image': product.image.name,
+        'updated_at': product.updated_at,
+    }
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError("limit must be a number.")
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def _after(request):
+    value = request.GET.get('after')
+    if not value:
+        return None
+    cursor = parse_cursor(value)
+    if cursor is None:
+        raise ApiError("after must be the next_cursor of a previous page.")
+    return cursor
+
+
+def _product_id(pk):
+    # Larger ids can't exist, and SQLite can't even compare them
+    if pk > MAX_INTEGER:
+        raise ApiError("Product not found.", status=404)
+    return pk
+
+
+def _product_state(request, pk):
+    return product_state(request, _product_id(pk))
+
+
+@api_view(['GET'])
+@conditional_page(catalog_state)
+def products(request):
+    fields = _fields(request, LIST_FIELDS)
+    rows = facets.filter_products(Product.objects.all(), facets.parse_facets(request.GET))
+    rows, next_cursor = keyset_page(
+        rows.values(*_columns(fields)), _after(request), _limit(request),
+    )
+    return _json({
+        'data': [_serialize(row, fields) for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+@api_view(['GET'])
+@conditional_page(_product_state)
+def product(request, pk):
+    fields = _fields(request, list(PRODUCT_FIELDS))
+    row = Product.objects.filter(pk=pk).values(*_columns(fields)).first()
+    if row is None:
+        raise ApiError("Product not found.", status=404)
+    return _json({'data': _serialize(row, fields)})
+
+
+@api_view(['GET'])
+@conditional_page(catalog_state)
+def search_products(request):
+    fields = _fields(request, LIST_FIELDS)
+    query = request.GET.get('q', '').strip()
+    page = _after(request) or 1
+    results, has_next = search.search_products(query, page, _limit(request)) if query else ([], False)
+    return _json({
+        'data': [_serialize(_row(p), fields) for p in results],
+        'next_cursor': page + 1 if has_next else None,
+    })
+
+
+def _money(value):
+    # SQLite sums come back with varying decimal places
+    return Decimal(value).quantize(CENT)
+
+
+def _cart_data(request):
+    lines, total = cart_service.contents(request)
+    data = []
+    for line in lines:
+        if isinstance(line, dict):  # anonymous (session) cart
+            item, quantity, line_total = line['product'], line['quantity'], line['line_total']
+        else:
+            item, quantity, line_total = line.product, line.quantity, line.line_total
+        data.append({
+            'product': {'id': item.pk, 'name': item.name, 'price': item.price, 'image': _image_url(item.image.name)},
+            'quantity': quantity,
+            'line_total': _money(line_total),
+        })
+    return _json({'data': data, 'total': _money(total or 0)})
+
+
+def _body(request):
+    if request.content_type == 'application/json':
+        try:
+            body = json.loads(request.body or b'{}')
+        except ValueError:
+            raise ApiError("The body is not valid JSON.")
+        if not isinstance(body, dict):
+            raise ApiError("The body must be a JSON object.")
+        return body
+    return request.POST if request.method == 'POST' else QueryDict(request.body)
+
+
+def _int(body, name, default=None, minimum=0, maximum=MAX_INTEGER):
+    value = body.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f"{name} must be a whole number.")
+    if value < minimum:
+        raise ApiError(f"{name} must be at least {minimum}.")
+    if value > maximum:
+        raise ApiError(f"{name} must be at most {maximum}.")
+    return value
+
+
+def _change_cart(request, change, product_id, quantity):
+    # Session carts (anonymous) take any id, so check those here; the
+    # CartItem paths check it themselves and return False
+    if not request.user.is_authenticated and quantity and not Product.objects.filter(pk=product_id).exists():
+        raise ApiError("Product not found.", status=404)
+    if not change(request, product_id, quantity):
+        raise ApiError("Product not found.", status=404)
+
+
+@api_view(['GET'])
+@ensure_csrf_cookie
+def cart(request):
+    return _cart_data(request)
+
+
+@api_view(['POST'])
+def cart_items(request):
+    body = _body(request)
+    product_id = _int(body, 'product_id', minimum=1)
+    _change_cart(request, cart_service.add, product_id, _int(body, 'quantity', 1, minimum=1, maximum=MAX_QUANTITY))
+    return _cart_data(request)
+
+
+@api_view(['PUT', 'PATCH', 'DELETE'])
+def cart_item(request, product_id):
+    _product_id(product_id)
+    if request.method == 'DELETE':
+        cart_service.remove(request, [product_id])
+    else:
+        _change_cart(request, cart_service.set_quantity, product_id, _int(_body(request), 'quantity', maximum=MAX_QUANTITY))
+    return _cart_data(request)
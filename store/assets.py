@@ -0,0 +1,260 @@
+"""
+Production delivery of media (product images, renditions) and static files.
+
+Static files
+    With DEBUG off, collectstatic uses CompressedManifestStaticFilesStorage:
+    every file gets a content hash in its name (style.3f2a1c9e8b7d.css),
+    and compressible ones get a .gz copy, plus a .br copy when the optional
+    `brotli` package is installed, written once at collect time. A hashed
+    name changes whenever the content does, so those files are sent with
+    `Cache-Control: max-age=<1 year>, immutable`. serve_static() picks
+    the .br/.gz copy the client accepts, so nothing is compressed per
+    request.
+
+Media
+    serve_media() serves MEDIA_ROOT. Uploaded names are never reused
+    (storage adds a suffix) and rendition names follow the upload name, so
+    media gets a long MEDIA_CACHE_MAX_AGE plus an ETag/Last-Modified for
+    revalidation.
+
+Handing off to the web server
+    With ASSET_SENDFILE = 'x-sendfile' (Apache mod_xsendfile, lighttpd) or
+    'x-accel-redirect' (nginx), the views only check the path and set the
+    headers; the web server sends the bytes. For nginx, ASSET_ACCEL_PREFIX
+    must point at an `internal` location aliasing the project directory's
+    media/ and staticfiles/ folders (use `gzip_static on;` there for the
+    precompressed copies).
+
+    Otherwise the file is sent from Python: FileResponse for whole files
+    (which lets the WSGI server use sendfile()), or a streamed slice for a
+    single byte range (Range / If-Range, 206 / 416).
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz copies are made
+    brotli = None
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 30
+
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot', '.otf'}
+MIN_COMPRESS_SIZE = 256
+
+# (Accept-Encoding token, file suffix), best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CHUNK_SIZE = 64 * 1024
+
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes .gz (and .br) copies of the hashed files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(hashed):
+            for compressed in self._compress(name):
+                yield name, compressed, True
+
+    def _compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+            return
+        with self.open(name) as f:
+            content = f.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+
+        variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content, quality=11)
+        for suffix, data in variants.items():
+            # Only worth keeping if it saves something
+            if len(data) < len(content) * 0.95:
+                path = self.path(name + suffix)
+                with open(path, 'wb') as out:
+                    out.write(data)
+                yield name + suffix
+
+
+def _file_validators(stat):
+    etag = '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+    return etag, int(stat.st_mtime)
+
+
+def _content_type(path):
+    content_type, encoding = mimetypes.guess_type(path)
+    return content_type or 'application/octet-stream'
+
+
+def _byte_range(request, size, etag, last_modified):
+    """
+    Return (start, end) (inclusive) for a satisfiable single Range, None to
+    send the whole file, or False if the range can't be satisfied.
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    match = RANGE.match(header.replace(' ', ''))
+    if not match or (not match[1] and not match[2]):
+        # No range, several ranges or another unit: the whole file
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        return None
+
+    if match[1]:
+        start = int(match[1])
+        if match[2] and int(match[2]) < start:
+            # Not a valid range (e.g. bytes=5-3): ignored, like a malformed header
+            return None
+        end = min(int(match[2]), size - 1) if match[2] else size - 1
+    else:
+        # bytes=-N: the last N bytes
+        start, end = max(size - int(match[2]), 0), size - 1
+    # Also bytes=-0, and any range of an empty file
+    if start >= size:
+        return False
+    return start, end
+
+
+def _stream(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _handoff_path(kind, relative):
+    mode = getattr(settings, 'ASSET_SENDFILE', '')
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'ASSET_ACCEL_PREFIX', '/_protected/')
+        return 'X-Accel-Redirect', f"{prefix.rstrip('/')}/{kind}/{relative}"
+    if mode == 'x-sendfile':
+        return 'X-Sendfile', None
+    return None, None
+
+
+def send_file(request, path, kind, relative, cache_control, encoding=None, content_type=None):
+    """
+    Respond with the file at `path` (a `kind` asset at `relative`): a 304,
+    a web server hand-off, a 206 byte range or the whole file.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404("File not found.")
+    if not os.path.isfile(path):
+        raise Http404("File not found.")
+
+    etag, last_modified = _file_validators(stat)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        header, target = _handoff_path(kind, relative)
+        if header and encoding is None:
+            response = HttpResponse(content_type=content_type or _content_type(path))
+            response[header] = target or path
+        else:
+            response = _file_response(request, path, stat.st_size, etag, last_modified, encoding)
+            if response.status_code == 416:
+                return response
+
+        if content_type:
+            response['Content-Type'] = content_type
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, **cache_control)
+    return response
+
+
+def _file_response(request, path, size, etag, last_modified, encoding):
+    byte_range = _byte_range(request, size, etag, last_modified) if encoding is None else None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=_content_type(path))
+        # Not a download; and for a .gz/.br copy the file name would be wrong
+        del response['Content-Disposition']
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_stream(path, start, end - start + 1), status=206,
+                                         content_type=_content_type(path))
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_media(request, path):
+    full_path = _safe_path(settings.MEDIA_ROOT, path)
+    max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', MEDIA_CACHE_MAX_AGE)
+    return send_file(request, full_path, 'media', path, {'public': True, 'max_age': max_age})
+
+
+def serve_static(request, path):
+    full_path = _safe_path(settings.STATIC_ROOT, path)
+    if HASHED_NAME.search(path):
+        cache_control = {'public': True, 'max_age': IMMUTABLE_MAX_AGE, 'immutable': True}
+    else:
+        # Unhashed copies may change on the next collectstatic
+        cache_control = {'public': True, 'max_age': 60 * 5}
+
+    encoding = None
+    if not getattr(settings, 'ASSET_SENDFILE', ''):
+        accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        for token, suffix in ENCODINGS:
+            if re.search(rf'\b{token}\b', accepted) and os.path.isfile(full_path + suffix):
+                encoding = token
+                break
+    if encoding:
+        response = send_file(request, full_path + dict(ENCODINGS)[encoding], 'static', path, cache_control,
+                             encoding=encoding, content_type=_content_type(full_path))
+    else:
+        response = send_file(request, full_path, 'static', path, cache_control)
+    if os.path.splitext(path)[1].lower() in COMPRESSIBLE:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def _safe_path(root, path):
+    if not root:
+        raise Http404("File not found.")
+    try:
+        return safe_join(str(root), path)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404("File not found.")
+
+
+def urlpatterns():
+    """URL patterns for MEDIA_URL (always) and STATIC_URL (when DEBUG is off; runserver serves it otherwise)."""
+    patterns = [re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media)]
+    if not settings.DEBUG and settings.STATIC_ROOT:
+        patterns.append(re_path(r'^%s(?P<path>.+)$' % re.escape(settings.STATIC_URL.lstrip('/')), serve_static))
+    return patterns
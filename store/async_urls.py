@@ -0,0 +1,19 @@
+# Same routes as store/urls.py, with the catalog pages served by the async
+# views. Used by the ASGI application (see shoecommerce/asgi_urls.py).
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    'home': async_views.home,
+    'catalog_more': async_views.catalog_more,
+    'product_detail': async_views.product_detail,
+    'search_products': async_views.search_products,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name)
+    if getattr(pattern, 'name', None) in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+]
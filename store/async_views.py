@@ -0,0 +1,82 @@
+"""
+Async versions of the catalog read views.
+
+Under ASGI (shoecommerce/asgi.py) these replace home, catalog_more,
+product_detail and search_products, so a worker can keep many slow client
+connections open without holding a thread for each one. They share the
+templates, page sizes, page cache and conditional GET handling with the
+sync views in views.py.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404, render
+from django.template.loader import render_to_string
+
+from . import facets, recommendations, search
+from .conditional import catalog_state, conditional_page, product_state
+from .models import Product
+from .page_cache import cache_anonymous_page
+from .pagination import akeyset_page, parse_cursor
+from .views import CATALOG_PAGE_SIZE, SEARCH_PAGE_SIZE, _search_params
+
+
+async def _load_user(request):
+    # Templates read request.user synchronously. Load it (and the session)
+    # here so rendering never touches the database from the event loop.
+    request.user = await request.auser()
+
+
+async def _catalog_page(request, selected):
+    products = facets.filter_products(Product.objects.select_related('category'), selected)
+    after = parse_cursor(request.GET.get('after'))
+    return await akeyset_page(products, after, CATALOG_PAGE_SIZE)
+
+
+@conditional_page(catalog_state)
+@cache_anonymous_page
+async def home(request):
+    await _load_user(request)
+    selected = facets.parse_facets(request.GET)
+    products, next_cursor = await _catalog_page(request, selected)
+    rows, names = await sync_to_async(facets.counts)()
+    return render(request, 'store/home.html', {
+        'products': products,
+        'next_cursor': next_cursor,
+        'facets': facets.build(request.GET, selected, rows, names),
+    })
+
+
+@conditional_page(catalog_state)
+@cache_anonymous_page
+async def catalog_more(request):
+    await _load_user(request)
+    products, next_cursor = await _catalog_page(request, facets.parse_facets(request.GET))
+    html = render_to_string('store/product_cards.html', {'products': products}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+
+@conditional_page(product_state)
+@cache_anonymous_page
+async def product_detail(request, pk):
+    await _load_user(request)
+    product = await aget_object_or_404(Product.objects.select_related('category'), pk=pk)
+    related = [r.related async for r in recommendations.for_product(pk)]
+    return render(request, 'store/product_detail.html', {'product': product, 'related': related})
+
+
+@conditional_page(catalog_state)
+@cache_anonymous_page
+async def search_products(request):
+    await _load_user(request)
+    query, page = _search_params(request)
+
+    results, has_next = [], False
+    if query:
+        results, has_next = await search.asearch_products(query, page, SEARCH_PAGE_SIZE)
+
+    return render(request, 'store/search_results.html', {
+        'query': query,
+        'results': results,
+        'page': page,
+        'has_next': has_next,
+    })
@@ -0,0 +1,179 @@
+"""
+Search-as-you-type suggestions from an in-process prefix index.
+
+Each worker process keeps a PrefixIndex of product names and one of
+category names: a sorted list of (key, id) pairs with one key per word of
+the name ("Air Runner 5" is found by "air", "run" and "5"), so a lookup
+is a bisect plus a short scan and touches no database. Keys are
+lowercased and accent-free (normalize()).
+
+The indexes are loaded by warm() when the worker starts (wsgi.py /
+asgi.py) and otherwise on first use. They carry the "suggestion version"
+kept in the cache (SUGGEST_VERSION_KEY):
+
+- Saving or deleting a Product or Category (signals.py) updates this
+  worker's indexes in place once the transaction commits, and bumps the
+  version. If the bump moved it exactly one step from the version this
+  worker had, nobody else changed anything in between and the worker keeps
+  its indexes; otherwise they are rebuilt.
+- Other workers see a version that differs from theirs on their next
+  lookup and rebuild their indexes (two queries).
+- Code that changes names without signals (bulk_create, QuerySet.update)
+  calls invalidate(), which only bumps the version.
+
+As with the page cache, the version lives in a cache shared by the web
+processes and the task workers (store/cache.py), whose incr() is atomic,
+so a bump in one process reaches all of them.
+"""
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from .models import Category, Product
+
+SUGGEST_VERSION_KEY = 'store:suggest_version'
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+# Longest prefix looked up; longer input is cut to this
+MAX_PREFIX = 50
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace."""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.split())
+
+
+def _keys(name):
+    words = normalize(name).split(' ')
+    # The name from each word onwards, so a prefix matches at any word
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    """Sorted (key, id) pairs for prefix lookups, plus id -> name."""
+
+    def __init__(self, rows=()):
+        self.names = dict(rows)
+        self.entries = sorted((key, pk) for pk, name in self.names.items() for key in _keys(name))
+
+    def search(self, prefix, limit):
+        """[(id, name)] of up to `limit` names with a word starting with `prefix` (normalized), by matched text."""
+        found = []
+        seen = set()
+        i = bisect_left(self.entries, (prefix,))
+        while i < len(self.entries) and len(found) < limit:
+            key, pk = self.entries[i]
+            if not key.startswith(prefix):
+                break
+            if pk not in seen:
+                seen.add(pk)
+                found.append((pk, self.names[pk]))
+            i += 1
+        return found
+
+    def add(self, pk, name):
+        self.remove(pk)
+        self.names[pk] = name
+        for key in _keys(name):
+            insort(self.entries, (key, pk))
+
+    def remove(self, pk):
+        name = self.names.pop(pk, None)
+        if name is None:
+            return
+        for key in _keys(name):
+            i = bisect_left(self.entries, (key, pk))
+            if i < len(self.entries) and self.entries[i] == (key, pk):
+                del self.entries[i]
+
+
+_lock = threading.Lock()
+_indexes = {}
+_version = None
+
+MODELS = {'products': Product, 'categories': Category}
+
+
+def _current_version():
+    version = cache.get(SUGGEST_VERSION_KEY)
+    if version is None:
+        # Time based like the catalog version, so an evicted version never comes back
+        cache.add(SUGGEST_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(SUGGEST_VERSION_KEY)
+    return version
+
+
+def _bump():
+    """Bump the shared version; returns the new one."""
+    try:
+        return cache.incr(SUGGEST_VERSION_KEY)
+    except ValueError:
+        # Missing (evicted): a new time based value makes every worker rebuild
+        return _current_version()
+
+
+def _load(version):
+    global _version
+    indexes = {
+        kind: PrefixIndex(model.objects.values_list('pk', 'name').iterator(chunk_size=5000))
+        for kind, model in MODELS.items()
+    }
+    _indexes.update(indexes)
+    _version = version
+
+
+def warm():
+    """Build this worker's indexes now instead of on the first keystroke. False if the tables aren't there yet."""
+    try:
+        with _lock:
+            _load(_current_version())
+    except DatabaseError:
+        return False
+    return True
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    """{'products': [(id, name)], 'categories': [(id, name)]} for names with a word starting with `query`."""
+    prefix = normalize(query)[:MAX_PREFIX]
+    if not prefix:
+        return {kind: [] for kind in MODELS}
+    version = _current_version()
+    with _lock:
+        if version != _version:
+            _load(version)
+        return {kind: _indexes[kind].search(prefix, limit) for kind in MODELS}
+
+
+def changed(kind, pk, name=None):
+    """
+    Apply a committed save (`name`) or delete (name None) of a `kind` row
+    to this worker's index and tell the other workers.
+    """
+    global _version
+    with _lock:
+        index = _indexes.get(kind)
+        if index is not None and _version == _current_version() and index.names.get(pk) == name:
+            return  # e.g. a price or stock change
+        new_version = _bump()
+        if index is None or _version != new_version - 1:
+            # Someone else changed something too (or nothing is loaded): rebuild when next used
+            _version = None
+            return
+        if name is None:
+            index.remove(pk)
+        else:
+            index.add(pk, name)
+        _version = new_version
+
+
+def invalidate():
+    """For changes made without signals: every worker rebuilds on its next lookup."""
+    _bump()
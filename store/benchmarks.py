@@ -0,0 +1,200 @@
+"""
+Per-view performance benchmarks.
+
+seed() fills the database with a deterministic catalog, users and orders
+(size controlled by `scale`); run_suite() then drives the hot views through
+the test client and records, per view, the SQL query count, p50/p95
+latency and response size. find_regressions() compares a run with the
+checked-in baseline (benchmark_baseline.json).
+
+Run it with `manage.py bench_views`, which uses a throwaway database.
+The test suite also checks query counts and sizes against the baseline.
+"""
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+
+from . import autocomplete, recommendations
+from .admin_sessions import SessionStore as AdminSessionStore
+from .models import CartItem, Category, Order, OrderItem, Product
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'benchmark_baseline.json'
+
+WORDS = ['air', 'runner', 'court', 'trail', 'classic', 'street', 'flex', 'max', 'pro', 'lite']
+CART_LINES = 5
+
+
+def seed(scale=1, rng_seed=42):
+    """Create a deterministic dataset; returns (shopper, admin)."""
+    rng = random.Random(rng_seed)
+
+    categories = Category.objects.bulk_create(
+        [Category(name=f'Category {i}') for i in range(10 * scale)]
+    )
+    Product.objects.bulk_create([
+        Product(
+            name=f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}',
+            category=rng.choice(categories),
+            price=rng.randint(500, 9000),
+            description=' '.join(rng.choices(WORDS, k=30)),
+            image='shoes/benchmark.jpg',
+            stock=10_000,
+        )
+        for i in range(500 * scale)
+    ], batch_size=500)
+    product_ids = list(Product.objects.values_list('id', flat=True))
+
+    password = make_password(None)
+    User.objects.bulk_create(
+        [User(username=f'shopper{i}', password=password) for i in range(50 * scale)]
+    )
+    user_ids = list(User.objects.values_list('id', flat=True))
+
+    orders = Order.objects.bulk_create(
+        [Order(user_id=rng.choice(user_ids), total_price=0) for _ in range(1000 * scale)],
+        batch_size=500,
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_id=product_id, quantity=rng.randint(1, 3), price=100)
+        for order in orders
+        for product_id in rng.sample(product_ids, rng.randint(1, 4))
+    ], batch_size=500)
+    recommendations.rebuild()
+    # Created without signals
+    autocomplete.invalidate()
+
+    shopper = User.objects.get(username='shopper0')
+    admin = User.objects.create_user('bench_admin', is_staff=True)
+    return shopper, admin
+
+
+def admin_client(user):
+    """A test client logged into the admin session store (force_login only does the shop side)."""
+    session = AdminSessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+
+    client = Client()
+    client.cookies[getattr(settings, 'ADMIN_SESSION_COOKIE_NAME', 'admin_sessionid')] = session.session_key
+    return client
+
+
+def _fill_cart(user, product_ids):
+    CartItem.objects.filter(user=user).delete()
+    CartItem.objects.bulk_create([CartItem(user=user, product_id=pid, quantity=1) for pid in product_ids])
+
+
+def _scenarios(shopper, admin):
+    """(name, client, method, url, data, prepare) for every benchmarked view."""
+    anonymous = Client()
+    shopper_client = Client()
+    shopper_client.force_login(shopper)
+    staff = admin_client(admin)
+
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:CART_LINES])
+    fill_cart = lambda: _fill_cart(shopper, product_ids)  # noqa: E731
+
+    return [
+        ('home', anonymous, 'get', '/', None, None),
+        ('product_detail', anonymous, 'get', f'/product/{product_ids[0]}/', None, None),
+        ('search_products', anonymous, 'get', '/search/?q=runner', None, None),
+        ('search_suggestions', anonymous, 'get', '/search/suggest/?q=run', None, None),
+        ('cart', shopper_client, 'get', '/cart/', None, fill_cart),
+        ('checkout', shopper_client, 'post', '/checkout/',
+         {'selected_items': [str(pid) for pid in product_ids]}, fill_cart),
+        ('my_orders', shopper_client, 'get', '/my-orders/', None, None),
+        ('orders_page', staff, 'get', '/myadmin/orders/', None, None),
+        ('myadmin', staff, 'get', '/myadmin/', None, None),
+    ]
+
+
+class QueryCounter:
+    """Counts queries on `connection` (unlike CaptureQueriesContext, with no 9000 query cap)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _percentile(values, pct):
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def run_suite(scale=1, iterations=20):
+    """Seed the current database and benchmark every view. Returns the results dict."""
+    shopper, admin = seed(scale)
+    results = {'scale': scale, 'iterations': iterations, 'views': {}}
+
+    for name, client, method, url, data, prepare in _scenarios(shopper, admin):
+        timings = []
+        queries = size = status = None
+        # The first round warms up caches and is not timed
+        for i in range(iterations + 1):
+            if prepare:
+                prepare()
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                elapsed = time.perf_counter() - started
+            if i:
+                timings.append(elapsed * 1000)
+            queries, size, status = counter.count, len(response.content), response.status_code
+
+        results['views'][name] = {
+            'status': status,
+            'queries': queries,
+            'p50_ms': round(_percentile(timings, 50), 2),
+            'p95_ms': round(_percentile(timings, 95), 2),
+            'bytes': size,
+        }
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def find_regressions(results, baseline, latency_tolerance=0.5, latency_slack_ms=2.0, size_tolerance=0.1):
+    """
+    Return a list of human readable regressions of `results` vs `baseline`.
+
+    Any extra query is a regression. Latency (p95) may grow by
+    `latency_tolerance` (fraction) plus `latency_slack_ms`, size by
+    `size_tolerance`. Pass latency_tolerance=None to skip latency checks,
+    e.g. on shared CI machines.
+    """
+    regressions = []
+    for name, base in baseline['views'].items():
+        current = results['views'].get(name)
+        if current is None:
+            regressions.append(f'{name}: missing from results')
+            continue
+        if current['status'] != base['status']:
+            regressions.append(f"{name}: status {current['status']} (baseline {base['status']})")
+        if current['queries'] > base['queries']:
+            regressions.append(f"{name}: {current['queries']} queries (baseline {base['queries']})")
+        if current['bytes'] > base['bytes'] * (1 + size_tolerance):
+            regressions.append(f"{name}: {current['bytes']} bytes (baseline {base['bytes']})")
+        if latency_tolerance is not None:
+            limit = base['p95_ms'] * (1 + latency_tolerance) + latency_slack_ms
+            if current['p95_ms'] > limit:
+                regressions.append(f"{name}: p95 {current['p95_ms']} ms (baseline {base['p95_ms']} ms)")
+    return regressions
@@ -0,0 +1,153 @@
+"""
+Bulk actions for the product table in myadmin.
+
+Every action works on a list of product ids and runs as a single UPDATE
+(or one delete) inside a transaction, however many products are selected:
+
+- set_price: one price for all of them;
+- adjust_price: raise or lower every price by a percentage, rounded to
+  the cent (never below zero);
+- set_stock: one stock level for all of them;
+- move_category: put them all in another category;
+- delete: delete them, with their order lines and cart items like
+  delete_product does.
+
+delete_category() is a task (store/task_queue.py) for the category delete
+button: it deletes the category's products DELETE_BATCH_SIZE at a time,
+each batch in its own short transaction, then the category.
+
+QuerySet.update() skips save() and the post_save signals, so updated_at is
+set in the statement and the catalog page cache is bumped here. Values are
+checked with the model fields' own validation before anything is written.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, Value
+from django.db.models.functions import Greatest, Now, Round
+
+from .models import Category, Product
+from .page_cache import bump_catalog_version
+from .sqlite import retry_on_lock
+from .task_queue import task
+
+DELETE_BATCH_SIZE = 200
+
+ACTIONS = [
+    ('set_price', 'Set price'),
+    ('adjust_price', 'Adjust price by %'),
+    ('set_stock', 'Set stock'),
+    ('move_category', 'Move to category'),
+    ('delete', 'Delete'),
+]
+
+
+def _clean(field_name, value):
+    """Validate `value` the way the model field would; raises ValidationError."""
+    return Product._meta.get_field(field_name).clean(value, None)
+
+
+def _percent(value):
+    try:
+        percent = Decimal(str(value).strip().rstrip('%'))
+    except InvalidOperation:
+        raise ValidationError("Enter a percentage, e.g. 10 or -15.")
+    if not percent.is_finite() or percent <= -100:
+        raise ValidationError("The percentage must be a number above -100.")
+    return percent
+
+
+def _set_price(products, value):
+    price = _clean('price', value)
+    if price < 0:
+        raise ValidationError("The price can't be negative.")
+    price = price.quantize(Decimal('0.01'))
+    count = products.update(price=price, updated_at=Now())
+    return count, f"Set the price of {count} product(s) to ₱{price}."
+
+
+def _adjust_price(products, value):
+    percent = _percent(value)
+    factor = 1 + percent / 100
+    # The highest new price has to fit the column as well
+    highest = products.aggregate(highest=Max('price'))['highest']
+    if highest is not None:
+        _clean('price', (highest * factor).quantize(Decimal('0.01')))
+
+    new_price = Greatest(
+        Round(F('price') * Value(factor, output_field=DecimalField()), 2),
+        Value(Decimal('0.00')),
+        output_field=Product._meta.get_field('price'),
+    )
+    count = products.update(price=new_price, updated_at=Now())
+    return count, f"Adjusted the price of {count} product(s) by {percent:+}%."
+
+
+def _set_stock(products, value):
+    stock = _clean('stock', value)
+    count = products.update(stock=stock, updated_at=Now())
+    return count, f"Set the stock of {count} product(s) to {stock}."
+
+
+def _move_category(products, value):
+    category = Category.objects.filter(pk=value).first() if str(value).isdigit() else None
+    if category is None:
+        raise ValidationError("Choose a category.")
+    count = products.update(category=category, updated_at=Now())
+    return count, f"Moved {count} product(s) to {category.name}."
+
+
+def _delete(products, value):
+    _, deleted = products.delete()
+    count = deleted.get(Product._meta.label, 0)
+    others = sum(n for label, n in deleted.items() if label != Product._meta.label)
+    message = f"Deleted {count} product(s)"
+    if others:
+        message += f" and {others} related row(s) (order lines, cart items, sales rollups)"
+    return count, message + "."
+
+
+HANDLERS = {
+    'set_price': _set_price,
+    'adjust_price': _adjust_price,
+    'set_stock': _set_stock,
+    'move_category': _move_category,
+    'delete': _delete,
+}
+
+
+@retry_on_lock
+def apply(action, ids, value=None):
+    """
+    Run `action` on the products with these ids.
+
+    Returns (affected products, summary message); raises ValidationError
+    for an unknown action, an empty selection or an invalid value.
+    """
+    handler = HANDLERS.get(action)
+    if handler is None:
+        raise ValidationError("Choose an action.")
+    ids = {int(pk) for pk in ids if str(pk).isdigit()}
+    if not ids:
+        raise ValidationError("Select at least one product.")
+
+    with transaction.atomic():
+        count, message = handler(Product.objects.filter(pk__in=ids), value)
+    if count:
+        bump_catalog_version()
+    return count, message
+
+
+@retry_on_lock
+def _delete_batch(ids):
+    with transaction.atomic():
+        Product.objects.filter(pk__in=ids).delete()
+
+
+@task(timeout=30 * 60)
+def delete_category(category_id):
+    products = Product.objects.filter(category_id=category_id).order_by('pk')
+    while ids := list(products.values_list('pk', flat=True)[:DELETE_BATCH_SIZE]):
+        _delete_batch(ids)
+    Category.objects.filter(pk=category_id).delete()
@@ -0,0 +1,44 @@
+"""
+The default cache backend: Django's FileBasedCache with atomic counters.
+
+Every process on the machine (web workers and `manage.py run_workers`)
+reads and writes the same directory, so a version bump made in one of them
+(page_cache.bump_catalog_version(), the autocomplete version) is seen by
+all. Django's incr() is a get followed by a set, so two processes could
+both turn 5 into 6; here incr()/decr() hold an exclusive flock on a lock
+file in the cache directory, which makes them atomic across processes.
+
+Processes on several machines need a server cache (Redis, Memcached)
+instead; its incr() is atomic already.
+"""
+import os
+from contextlib import contextmanager
+
+from django.core.cache.backends.filebased import FileBasedCache as DjangoFileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: incr() is only as atomic as Django's
+    fcntl = None
+
+LOCK_NAME = '.incr.lock'
+
+
+class FileBasedCache(DjangoFileBasedCache):
+    def incr(self, key, delta=1, version=None):
+        # decr() calls incr() with -delta
+        with self._counter_lock():
+            return super().incr(key, delta, version)
+
+    @contextmanager
+    def _counter_lock(self):
+        if fcntl is None:
+            yield
+            return
+        self._createdir()
+        with open(os.path.join(self._dir, LOCK_NAME), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
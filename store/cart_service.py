@@ -0,0 +1,161 @@
+"""
+Shopping cart storage.
+
+Logged-in shoppers keep their cart in CartItem rows: every change is a
+single-row UPDATE (or one INSERT for a new line), and line and grand totals
+are computed by the database. Anonymous visitors keep the old
+request.session['cart'] dict ({product_id: quantity}); it is merged into
+their CartItem rows when they log in (see signals.py).
+
+All functions take the request and pick the right storage.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+from .models import CartItem, Product
+from .sqlite import retry_on_lock
+
+LINE_TOTAL = ExpressionWrapper(
+    F('product__price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)
+)
+
+
+def _uses_db(request):
+    return request.user.is_authenticated
+
+
+def _session_cart(request):
+    return request.session.get('cart', {})
+
+
+@retry_on_lock
+def add(request, product_id, quantity=1):
+    """Add `quantity` of a product, creating the line if needed. Returns False if there is no such product."""
+    if not _uses_db(request):
+        cart = _session_cart(request)
+        cart[str(product_id)] = cart.get(str(product_id), 0) + quantity
+        request.session['cart'] = cart
+        return True
+
+    return _add_for_user(request.user, product_id, quantity)
+
+
+def _add_for_user(user, product_id, quantity):
+    items = CartItem.objects.filter(user=user, product_id=product_id)
+    if items.update(quantity=F('quantity') + quantity):
+        return True
+    return _create_line(user, product_id, quantity, F('quantity') + quantity)
+
+
+def _create_line(user, product_id, quantity, on_conflict):
+    if not Product.objects.filter(pk=product_id).exists():
+        return False
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(user=user, product_id=product_id, quantity=quantity)
+    except IntegrityError:
+        # Another request created the line first
+        CartItem.objects.filter(user=user, product_id=product_id).update(quantity=on_conflict)
+    return True
+
+
+@retry_on_lock
+def increase(request, product_id):
+    """Add one more of a product that is already in the cart."""
+    if not _uses_db(request):
+        cart = _session_cart(request)
+        if str(product_id) in cart:
+            cart[str(product_id)] += 1
+        request.session['cart'] = cart
+        return
+
+    CartItem.objects.filter(user=request.user, product_id=product_id).update(quantity=F('quantity') + 1)
+
+
+@retry_on_lock
+def decrease(request, product_id):
+    """Take one off a line, removing it when it reaches zero."""
+    if not _uses_db(request):
+        cart = _session_cart(request)
+        if str(product_id) in cart:
+            if cart[str(product_id)] > 1:
+                cart[str(product_id)] -= 1
+            else:
+                del cart[str(product_id)]
+        request.session['cart'] = cart
+        return
+
+    items = CartItem.objects.filter(user=request.user, product_id=product_id)
+    if not items.filter(quantity__gt=1).update(quantity=F('quantity') - 1):
+        items.delete()
+
+
+@retry_on_lock
+def set_quantity(request, product_id, quantity):
+    """
+    Set a line to `quantity`, adding it if needed; 0 removes it. Returns
+    False if a line would be added for a product that doesn't exist.
+    """
+    if not _uses_db(request):
+        cart = _session_cart(request)
+        if quantity > 0:
+            cart[str(product_id)] = quantity
+        else:
+            cart.pop(str(product_id), None)
+        request.session['cart'] = cart
+        return True
+
+    items = CartItem.objects.filter(user=request.user, product_id=product_id)
+    if quantity <= 0:
+        items.delete()
+        return True
+    return bool(items.update(quantity=quantity)) or _create_line(request.user, product_id, quantity, quantity)
+
+
+@retry_on_lock
+def remove(request, product_ids):
+    """Remove the lines for `product_ids`."""
+    if not _uses_db(request):
+        cart = _session_cart(request)
+        for product_id in product_ids:
+            cart.pop(str(product_id), None)
+        request.session['cart'] = cart
+        return
+
+    CartItem.objects.filter(user=request.user, product_id__in=product_ids).delete()
+
+
+def quantities(request):
+    """Return {product_id: quantity} for every line."""
+    if not _uses_db(request):
+        return {int(pid): qty for pid, qty in _session_cart(request).items()}
+
+    return dict(CartItem.objects.filter(user=request.user).values_list('product_id', 'quantity'))
+
+
+def contents(request):
+    """
+    Return (lines, total). Each line has .product, .quantity and
+    .line_total (or the same dict keys for anonymous carts).
+    """
+    if not _uses_db(request):
+        cart = _session_cart(request)
+        lines = []
+        for product in Product.objects.filter(id__in=cart.keys()):
+            quantity = cart[str(product.id)]
+            lines.append({'product': product, 'quantity': quantity, 'line_total': product.price * quantity})
+        return lines, sum(line['line_total'] for line in lines)
+
+    items = CartItem.objects.filter(user=request.user)
+    lines = list(items.select_related('product').annotate(line_total=LINE_TOTAL).order_by('added_at'))
+    total = items.aggregate(total=Sum(LINE_TOTAL))['total'] if lines else 0
+    return lines, total
+
+
+def merge_session_cart(request, user):
+    """Move an anonymous session cart into `user`'s CartItem rows."""
+    cart = request.session.pop('cart', None)
+    if not cart:
+        return
+    for product_id, quantity in cart.items():
+        _add_for_user(user, int(product_id), quantity)
@@ -0,0 +1,215 @@
+"""
+Bulk product import / export (CSV or JSON Lines).
+
+Both directions stream: rows are read and written one at a time and the
+database is touched in chunks, so memory use does not grow with the file.
+The columns are the ones in FIELDS; an export can be imported again (its
+`id` column is ignored).
+
+Imports resolve categories by name for a whole chunk at once (one SELECT,
+one bulk INSERT for the missing ones) and insert the chunk's products with
+one bulk_create. Rows that don't validate are reported and skipped; the
+rest of the file still goes in. bulk_create skips the post_save signals,
+so the catalog page cache is bumped here once at the end.
+"""
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import autocomplete
+from .models import Category, Product
+from .page_cache import bump_catalog_version
+
+FIELDS = ['name', 'category', 'price', 'description', 'image', 'stock']
+EXPORT_FIELDS = ['id'] + FIELDS
+
+
+class RowError(Exception):
+    pass
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f"Can't tell the format of {path!r}; pass --format csv or jsonl.")
+
+
+def read_rows(f, fmt):
+    """Yield (line_number, row dict) from a CSV or JSONL file object."""
+    if fmt == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            row = RowError(f"invalid JSON: {exc}")
+        if not isinstance(row, (dict, RowError)):
+            row = RowError("expected a JSON object")
+        yield line_number, row
+
+
+def _text(row, field, max_length=None):
+    value = row.get(field)
+    value = '' if value is None else str(value).strip()
+    if not value:
+        raise RowError(f"{field} is required")
+    if max_length and len(value) > max_length:
+        raise RowError(f"{field} is longer than {max_length} characters")
+    return value
+
+
+def _build_product(row, images_dir):
+    """Validate one row; returns (Product without category, category name, image source path)."""
+    if isinstance(row, RowError):
+        raise row
+
+    try:
+        price = Decimal(str(row.get('price', '')).strip())
+    except InvalidOperation:
+        raise RowError(f"price {row.get('price')!r} is not a number")
+
+    stock = row.get('stock')
+    stock = '0' if stock in (None, '') else str(stock).strip()
+    if not stock.isdigit():
+        raise RowError(f"stock {row.get('stock')!r} is not a whole number >= 0")
+
+    image = _text(row, 'image')
+    source = None
+    if images_dir:
+        source = os.path.join(images_dir, image)
+        if not os.path.isfile(source):
+            raise RowError(f"image {image!r} not found in {images_dir}")
+        image = f"shoes/{os.path.basename(image)}"
+
+    product = Product(
+        name=_text(row, 'name', 200),
+        price=price,
+        description=_text(row, 'description'),
+        stock=int(stock),
+        image=image,
+    )
+    try:
+        # Model-level checks (price digits, negative values, lengths)
+        product.clean_fields(exclude=['category', 'image'])
+    except ValidationError as exc:
+        raise RowError('; '.join(
+            f"{field}: {' '.join(errors)}" for field, errors in exc.message_dict.items()
+        ))
+    return product, _text(row, 'category', 100), source
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.categories_created = 0
+        self.errors = 0
+
+
+def import_products(rows, images_dir=None, batch_size=500, dry_run=False, on_error=None):
+    """
+    Import the (line_number, row) pairs from read_rows().
+
+    `on_error(line_number, row, message)` is called for every skipped row.
+    With dry_run nothing is written (no rows, categories or image files) but
+    every row is still validated. Returns an ImportResult.
+    """
+    result = ImportResult()
+    categories = {}  # name -> id, for the whole import (one entry per category)
+
+    for chunk in _chunks(rows, batch_size):
+        valid = []
+        for line_number, row in chunk:
+            result.rows += 1
+            try:
+                valid.append(_build_product(row, images_dir))
+            except RowError as exc:
+                result.errors += 1
+                if on_error:
+                    on_error(line_number, row, str(exc))
+
+        if not valid:
+            continue
+
+        with transaction.atomic():
+            missing = {name for _, name, _ in valid if name not in categories}
+            if missing:
+                # Names aren't unique in Category; reuse the oldest match like get_or_create would
+                for pk, name in (Category.objects.filter(name__in=missing)
+                                 .order_by('-pk').values_list('pk', 'name')):
+                    categories[name] = pk
+                new_names = sorted(missing - categories.keys())
+                result.categories_created += len(new_names)
+                if new_names and not dry_run:
+                    for category in Category.objects.bulk_create([Category(name=n) for n in new_names]):
+                        categories[category.name] = category.pk
+                elif new_names:
+                    categories.update((name, None) for name in new_names)
+
+            result.created += len(valid)
+            if dry_run:
+                continue
+
+            products = []
+            for product, category_name, source in valid:
+                product.category_id = categories[category_name]
+                if source:
+                    with open(source, 'rb') as f:
+                        product.image = default_storage.save(product.image.name, File(f))
+                products.append(product)
+            Product.objects.bulk_create(products)
+
+    if result.created and not dry_run:
+        bump_catalog_version()
+        autocomplete.invalidate()
+    return result
+
+
+def export_rows(chunk_size=2000):
+    """Yield one dict per product (EXPORT_FIELDS), reading `chunk_size` rows at a time."""
+    products = (Product.objects.order_by('pk')
+                .values_list('pk', 'name', 'category__name', 'price', 'description', 'image', 'stock'))
+    for values in products.iterator(chunk_size=chunk_size):
+        yield dict(zip(EXPORT_FIELDS, values))
+
+
+def write_rows(rows, f, fmt):
+    """Write export_rows() to a text file object; returns the number of rows."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        return count
+
+    for row in rows:
+        row['price'] = str(row['price'])
+        f.write(json.dumps(row) + '\n')
+        count += 1
+    return count
@@ -0,0 +1,86 @@
+"""
+Checkout pipeline.
+
+place_order() turns cart lines into an Order in a single transaction:
+
+1. One UPDATE takes the stock for every line, but only if every product
+   still has enough (`stock >= quantity`). The database checks and
+   decrements in the same statement, so two buyers can never both take the
+   last pair, without needing SELECT ... FOR UPDATE (which SQLite lacks).
+2. If any line is short the transaction is rolled back and nothing is
+   written; the caller gets a per-item list of what is missing.
+3. Otherwise the order and all of its lines are written with one INSERT
+   each, and the total is computed from the prices read in the same
+   transaction.
+4. The daily sales rollups (sales.py) are updated in the same transaction.
+"""
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Now
+
+from . import sales
+from .models import Order, OrderItem, Product
+from .sqlite import retry_on_lock
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def _take_stock(quantities):
+    """Decrement stock for every product in `quantities` or raise OutOfStock."""
+    needed = Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()]
+    )
+    updated = Product.objects.filter(
+        id__in=quantities, stock__gte=needed
+    ).update(stock=F('stock') - needed, updated_at=Now())
+
+    if updated != len(quantities):
+        raise OutOfStock
+
+
+def _shortages(quantities):
+    products = Product.objects.filter(id__in=quantities).only('id', 'name', 'stock')
+    return [
+        {'product': product, 'requested': quantities[product.id], 'available': product.stock}
+        for product in products
+        if product.stock < quantities[product.id]
+    ]
+
+
+@retry_on_lock
+def place_order(user, quantities):
+    """
+    Create an order for `quantities` ({product_id: quantity}).
+
+    Returns (order, order_items, out_of_stock). On success out_of_stock is
+    empty. Otherwise order is None, nothing was written, and out_of_stock
+    lists {'product', 'requested', 'available'} for every short line.
+    """
+    quantities = {int(pid): qty for pid, qty in quantities.items() if qty > 0}
+    # Products deleted since they were added to the cart are dropped
+    existing = set(Product.objects.filter(id__in=quantities).values_list('id', flat=True))
+    quantities = {pid: qty for pid, qty in quantities.items() if pid in existing}
+    if not quantities:
+        return None, [], []
+
+    try:
+        with transaction.atomic():
+            # Write first: on SQLite this takes the write lock up front, so
+            # concurrent checkouts queue up instead of failing on upgrade
+            _take_stock(quantities)
+
+            products = Product.objects.select_related('category').in_bulk(quantities)
+            total_price = sum(products[pid].price * qty for pid, qty in quantities.items())
+            order = Order.objects.create(user=user, total_price=total_price)
+
+            order_items = OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=products[pid], quantity=qty, price=products[pid].price)
+                for pid, qty in quantities.items()
+            ])
+            sales.record_order(order, order_items)
+    except OutOfStock:
+        return None, [], _shortages(quantities)
+
+    return order, order_items, []
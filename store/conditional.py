@@ -0,0 +1,141 @@
+"""
+Conditional GET for the catalog pages.
+
+Products and categories carry an `updated_at` timestamp. The decorated
+views first run one small query for the validators:
+
+- catalog pages (home, catalog_more, search): the newest product and
+  category timestamps plus the number of categories;
+- product_detail: the product's and its category's timestamps, the
+  newest id among its recommendations (store/recommendations.py rewrites
+  a product's rows only when its top k is recomputed), and the newest
+  timestamps and in-stock count of the recommended products, whose cards
+  the page shows.
+
+If the client's If-None-Match / If-Modified-Since still match, a 304 is
+returned before the view runs, so nothing is rendered. Otherwise the view
+runs as usual and the response gets ETag and Last-Modified headers.
+
+The pages also depend on who is looking (the header shows the username,
+the forms carry a CSRF token), so the ETag includes the user and the CSRF
+cookie. Last-Modified can't express that, so it is only sent to anonymous
+visitors. The ETags are weak because the CSRF token in the body is masked
+differently on every render.
+
+Deleting a product touches its category (see signals.py), since a delete
+leaves no newer timestamp behind.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import Category, Product, Recommendation
+
+
+def catalog_state(request, *args, **kwargs):
+    """(newest product change, newest category change, category count), in one query."""
+    newest_product = Product.objects.order_by('-updated_at').values('updated_at')[:1]
+    state = Category.objects.aggregate(
+        categories_changed=Max('updated_at'),
+        categories=Count('pk'),
+        products_changed=Max(Subquery(newest_product)),
+    )
+    return state['products_changed'], state['categories_changed'], state['categories']
+
+
+def _over_recommendations(aggregate):
+    """Subquery of `aggregate` over the outer product's Recommendation rows."""
+    rows = Recommendation.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    return Subquery(rows.annotate(value=aggregate).values('value'))
+
+
+def product_state(request, pk, *args, **kwargs):
+    """
+    State of one product page, or None if the product doesn't exist: the
+    product's and its category's changes, its newest recommendation, and
+    the newest change and in-stock count of the recommended products and
+    their categories (the "frequently bought together" cards).
+    """
+    return Product.objects.filter(pk=pk).values_list(
+        'updated_at', 'category__updated_at',
+        _over_recommendations(Max('pk')),
+        _over_recommendations(Max('related__updated_at')),
+        _over_recommendations(Max('related__category__updated_at')),
+        _over_recommendations(Count('pk', filter=Q(related__stock__gt=0))),
+    ).first()
+
+
+def _validators(request, state):
+    """Return (etag, last_modified) for `state` as seen by this visitor."""
+    user = request.user
+    raw = '|'.join([
+        repr(state),
+        str(user.pk) if user.is_authenticated else 'anonymous',
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ])
+    etag = 'W/"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+    last_modified = None
+    if not user.is_authenticated:
+        timestamps = [value for value in state if hasattr(value, 'timestamp')]
+        if timestamps:
+            last_modified = int(max(timestamps).timestamp())
+    return etag, last_modified
+
+
+def _finish(request, response, etag, last_modified):
+    if request.method in ('GET', 'HEAD') and response.status_code == 200:
+        response.headers.setdefault('ETag', etag)
+        if last_modified is not None:
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+def conditional_page(state_func):
+    """
+    Answer conditional GETs for a view (sync or async) from `state_func(request, *args, **kwargs)`.
+
+    state_func returns a tuple describing the data the page shows, or None
+    (e.g. a missing product) to skip the check and let the view respond.
+    It is kept as request.conditional_state, which the page cache adds to
+    its key (store/page_cache.py).
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                request.user = await request.auser()
+                state = request.conditional_state = await sync_to_async(state_func)(request, *args, **kwargs)
+                if state is None:
+                    return await view(request, *args, **kwargs)
+                etag, last_modified = _validators(request, state)
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(request, response, etag, last_modified)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            state = request.conditional_state = state_func(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+            etag, last_modified = _validators(request, state)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _finish(request, response, etag, last_modified)
+
+        return wrapper
+
+    return decorator
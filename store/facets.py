@@ -0,0 +1,181 @@
+"""
+Faceted filtering for the catalog (home page and its infinite scroll).
+
+Shoppers can narrow the listing by category (?category=<id>), price band
+(?price=<slug>, see PRICE_BANDS) and stock (?in_stock=1). The counts next
+to every option come from one aggregate query over the composite index on
+(category, price, stock), giving per category the number of products in
+each (price band, in stock) cell. The counts for each facet are then added
+up in Python with the *other* selected facets applied, so every number
+says how many products picking that option would show. The counts are
+cached per catalog version (see counts()), category names included.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+
+from .models import Product
+from .page_cache import catalog_version
+from .sqlite import MAX_INTEGER
+
+# (slug, label, lowest price, highest price (exclusive))
+PRICE_BANDS = [
+    ('under-1000', 'Under ₱1,000', None, Decimal('1000')),
+    ('1000-2500', '₱1,000 – ₱2,500', Decimal('1000'), Decimal('2500')),
+    ('2500-5000', '₱2,500 – ₱5,000', Decimal('2500'), Decimal('5000')),
+    ('5000-plus', '₱5,000 and up', Decimal('5000'), None),
+]
+BANDS = {slug: (low, high) for slug, _, low, high in PRICE_BANDS}
+
+FACET_PARAMS = ('category', 'price', 'in_stock')
+
+COUNTS_TIMEOUT = 60
+
+
+def _band_q(slug):
+    low, high = BANDS[slug]
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def parse_facets(params):
+    """Read the selected facets from a QueryDict; invalid values are ignored."""
+    try:
+        category = int(params.get('category', ''))
+    except ValueError:
+        category = None
+    if category is not None and not 0 < category <= MAX_INTEGER:
+        category = None
+    price = params.get('price')
+    return {
+        'category': category,
+        'price': price if price in BANDS else None,
+        'in_stock': params.get('in_stock') == '1',
+    }
+
+
+def filter_products(products, facets):
+    if facets['category'] is not None:
+        products = products.filter(category_id=facets['category'])
+    if facets['price']:
+        products = products.filter(_band_q(facets['price']))
+    if facets['in_stock']:
+        products = products.filter(stock__gt=0)
+    return products
+
+
+def count_query():
+    """
+    The single aggregate query behind every facet count: one row per
+    category with its name and a count per (price band, in stock) pair.
+    Grouping by category alone follows the index order, so no temporary
+    B-tree is needed for the GROUP BY; the name is one primary key lookup
+    per product.
+    """
+    counts = {
+        f'band{i}_{int(stocked)}': Count('pk', filter=_band_q(slug) & (Q(stock__gt=0) if stocked else Q(stock=0)))
+        for i, (slug, *_) in enumerate(PRICE_BANDS)
+        for stocked in (True, False)
+    }
+    return Product.objects.order_by().values('category_id').annotate(
+        category_name=Max('category__name'), **counts,
+    )
+
+
+def counts():
+    """
+    Return (rows, category names): rows are (category_id, band, in_stock, n).
+
+    Cached per catalog version, so the aggregate runs once after each
+    product or category change. Stock taken by checkouts doesn't bump the
+    version, so the in-stock counts may lag by up to COUNTS_TIMEOUT seconds.
+    """
+    key = f'store:facets:{catalog_version()}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    rows, names = [], []
+    for values in count_query():
+        names.append((values['category_id'], values['category_name']))
+        for i, (slug, *_) in enumerate(PRICE_BANDS):
+            for stocked in (True, False):
+                n = values[f'band{i}_{int(stocked)}']
+                if n:
+                    rows.append((values['category_id'], slug, stocked, n))
+    cache.set(key, (rows, names), COUNTS_TIMEOUT)
+    return rows, names
+
+
+def _url(params, name, value):
+    """Query string with facet `name` set to `value` (None removes it), starting over at page one."""
+    params = _without(params, ('after', name))
+    if value is not None:
+        params[name] = value
+    return '?' + params.urlencode()
+
+
+def build(params, facets, rows, names):
+    """
+    Turn the counts() rows into template data: for each facet a list of
+    options with label, count, selected flag and the URL that toggles it.
+    """
+    def matches(row, skip):
+        category_id, band, in_stock, _ = row
+        return ((skip == 'category' or facets['category'] is None or category_id == facets['category'])
+                and (skip == 'price' or not facets['price'] or band == facets['price'])
+                and (skip == 'in_stock' or not facets['in_stock'] or in_stock))
+
+    category_counts, band_counts, in_stock_count, total = {}, {}, 0, 0
+    for row in rows:
+        category_id, band, in_stock, n = row
+        if matches(row, 'category'):
+            category_counts[category_id] = category_counts.get(category_id, 0) + n
+        if matches(row, 'price'):
+            band_counts[band] = band_counts.get(band, 0) + n
+        if in_stock and matches(row, 'in_stock'):
+            in_stock_count += n
+        if matches(row, None):
+            total += n
+
+    def option(name, value, label, count):
+        selected = facets[name] == value
+        return {
+            'label': label,
+            'count': count,
+            'selected': selected,
+            'url': _url(params, name, None if selected else value),
+        }
+
+    return {
+        'total': total,
+        'categories': sorted(
+            (option('category', pk, name, category_counts.get(pk, 0)) for pk, name in names),
+            key=lambda o: o['label'].lower(),
+        ),
+        'price_bands': [
+            option('price', slug, label, band_counts.get(slug, 0)) for slug, label, *_ in PRICE_BANDS
+        ],
+        'in_stock': {
+            'label': 'In stock only',
+            'count': in_stock_count,
+            'selected': facets['in_stock'],
+            'url': _url(params, 'in_stock', None if facets['in_stock'] else '1'),
+        },
+        'active': any(facets[name] not in (None, False) for name in FACET_PARAMS),
+        'clear_url': '?' + _without(params, FACET_PARAMS + ('after',)).urlencode(),
+        # The selected facets, for the "load more" requests
+        'query': _without(params, ('after',)).urlencode(),
+    }
+
+
+def _without(params, names):
+    params = params.copy()
+    for name in names:
+        params.pop(name, None)
+    return params
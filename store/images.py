@@ -0,0 +1,101 @@
+"""
+Responsive renditions of Product.image.
+
+For every product image we store smaller copies at RENDITION_WIDTHS, each
+as WebP plus a JPEG fallback, under media/renditions/. File names are
+derived from the original image name, so templates can build the srcset
+without any lookups (see templatetags/store_images.py). Product.has_renditions
+tells templates whether the files exist yet; until then they fall back to
+the original image.
+
+Renditions are built by the task queue (store/task_queue.py) after
+add_product/edit_product, and in bulk by `manage.py build_renditions`.
+"""
+import os
+from functools import reduce
+from io import BytesIO
+from operator import or_
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .task_queue import enqueue, task
+
+RENDITION_WIDTHS = (96, 240, 480, 960)
+
+# (file extension, Pillow format, mime type); the last one is the fallback
+RENDITION_FORMATS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+)
+
+
+def rendition_name(image_name, width, ext):
+    folder, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join('renditions', folder, f'{stem}-{width}w.{ext}')
+
+
+def _encode(image, fmt):
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, fmt, quality=80, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_renditions(image_name):
+    """
+    Write every width/format of `image_name`. Touches only files (no DB),
+    so it is safe to run in worker processes.
+    """
+    with default_storage.open(image_name) as f:
+        original = Image.open(f)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+
+    for width in RENDITION_WIDTHS:
+        resized = original.copy()
+        # thumbnail() keeps the aspect ratio and never upscales
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        for ext, fmt, _ in RENDITION_FORMATS:
+            name = rendition_name(image_name, width, ext)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(_encode(resized, fmt)))
+
+
+def mark_ready(built):
+    """
+    Set has_renditions for `built`, (product id, image name) pairs. A
+    product whose image was replaced since is left alone: its own task
+    builds the new image's renditions.
+    """
+    from django.db.models.functions import Now
+
+    from .models import Product
+    from .page_cache import bump_catalog_version
+
+    built = list(built)
+    if not built:
+        return
+    matches = reduce(or_, (Q(id=product_id, image=image_name) for product_id, image_name in built))
+    Product.objects.filter(matches).update(has_renditions=True, updated_at=Now())
+    # QuerySet.update() sends no signals, so refresh cached pages ourselves
+    bump_catalog_version()
+
+
+@task(timeout=600)
+def build_renditions(product_id, image_name):
+    generate_renditions(image_name)
+    mark_ready([(product_id, image_name)])
+
+
+def schedule_renditions(product):
+    """Queue building the renditions of `product`'s image; the task commits with the current transaction."""
+    if not product.image:
+        return
+    # One task per image: saving the product again before it runs adds nothing
+    enqueue(build_renditions, product.pk, product.image.name, key=f'renditions:{product.pk}:{product.image.name}')
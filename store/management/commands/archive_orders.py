@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from store.order_archive import ArchiveBusy, archive_orders, orders_before
+
+
+class Command(BaseCommand):
+    help = (
+        "Move orders older than a cutoff into a compressed JSONL archive (ORDER_ARCHIVE_DIR) "
+        "and delete them in small batches. Safe to stop and run again with the same cutoff."
+    )
+
+    def add_arguments(self, parser):
+        cutoff = parser.add_mutually_exclusive_group(required=True)
+        cutoff.add_argument('--before', help="Archive orders placed before this day (YYYY-MM-DD).")
+        cutoff.add_argument('--older-than-days', type=int,
+                            help="Archive orders placed more than this many days ago.")
+        parser.add_argument('--batch-size', type=int,
+                            help="Orders per batch/transaction (default: ORDER_ARCHIVE_BATCH_SIZE).")
+        parser.add_argument('--pause', type=float,
+                            help="Seconds to wait between batches (default: ORDER_ARCHIVE_PAUSE).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count the orders that would be archived.")
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                cutoff = parse_date(options['before'])
+            except ValueError:
+                # Well formed but impossible, e.g. 2024-13-45
+                cutoff = None
+            if cutoff is None:
+                raise CommandError("--before must be a date like 2024-01-31.")
+        else:
+            cutoff = timezone.localdate() - timedelta(days=options['older_than_days'])
+
+        if options['dry_run']:
+            count = orders_before(cutoff).count()
+            self.stdout.write(f"{count} order(s) placed before {cutoff} would be archived.")
+            return
+
+        def progress(result):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  batch {result.batches}: {result.archived} order(s) archived")
+
+        try:
+            result = archive_orders(cutoff, options['batch_size'], options['pause'], progress)
+        except ArchiveBusy as exc:
+            raise CommandError(exc)
+
+        if result.recovered:
+            self.stdout.write(f"Resumed an interrupted run: {result.recovered}.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result.archived} order(s) placed before {cutoff} "
+            f"in {result.batches} batch(es) to {result.path}."
+        ))
@@ -0,0 +1,110 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from store.benchmarks import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the sync (WSGI) and async (ASGI) catalog views "
+        "at high concurrency. Runs in-process on a seeded throwaway database, "
+        "like bench_views, and fails if any response is not a 200."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', dest='paths',
+                            help="URL to request (repeatable). Default: / and /search/?q=a")
+        parser.add_argument('--scale', type=int, default=1, help="Dataset size multiplier.")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per mode and path.")
+        parser.add_argument('--concurrency', type=int, default=200, help="Simultaneous clients.")
+        parser.add_argument('--threads', type=int, default=8,
+                            help="Worker threads for the sync mode, like a threaded WSGI worker.")
+        parser.add_argument('--client-delay', type=float, default=0,
+                            help="Milliseconds each client keeps its connection after the "
+                                 "response, to model slow clients.")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/', '/search/?q=a']
+        delay = options['client_delay'] / 1000
+
+        # The test environment also allows the test client's host (ALLOWED_HOSTS)
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            seed(options['scale'])
+            self.stdout.write(f"{'mode':<6} {'path':<24} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+            for path in paths:
+                for mode, run in (('sync', self.run_sync), ('async', self.run_async)):
+                    started = time.perf_counter()
+                    results = run(path, options, delay)
+                    elapsed = time.perf_counter() - started
+                    failed = sorted({status for _, status in results if status != 200})
+                    if failed:
+                        raise CommandError(f"{mode} {path}: got status {', '.join(map(str, failed))}, not 200.")
+                    latencies = [latency for latency, _ in results]
+                    self.stdout.write(
+                        f"{mode:<6} {path:<24} {len(latencies) / elapsed:>9.1f} "
+                        f"{self.percentile(latencies, 50):>8.1f} {self.percentile(latencies, 95):>8.1f}"
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def percentile(self, values, pct):
+        if len(values) < 2:
+            return values[0] * 1000 if values else 0.0
+        return statistics.quantiles(values, n=100)[pct - 1] * 1000
+
+    def run_sync(self, path, options, delay):
+        local = threading.local()
+        pool = ThreadPoolExecutor(max_workers=options['threads'])
+
+        def handle_request():
+            # Django's test client is not thread safe: one per worker thread
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            status = local.client.get(path).status_code
+            if delay:
+                time.sleep(delay)  # a slow client keeps the worker thread busy
+            return status
+
+        async def request():
+            # Waiting for a free worker thread counts towards the latency
+            return await asyncio.get_running_loop().run_in_executor(pool, handle_request)
+
+        try:
+            return asyncio.run(self.drive(request, options))
+        finally:
+            pool.shutdown()
+
+    def run_async(self, path, options, delay):
+        client = AsyncClient()
+
+        async def request():
+            status = (await client.get(path)).status_code
+            if delay:
+                await asyncio.sleep(delay)  # waiting here costs no thread
+            return status
+
+        with override_settings(ROOT_URLCONF='shoecommerce.asgi_urls'):
+            return asyncio.run(self.drive(request, options))
+
+    async def drive(self, request, options):
+        """Fire all requests from `concurrency` simultaneous clients; return (latency, status) pairs."""
+        clients = asyncio.Semaphore(options['concurrency'])
+
+        async def timed():
+            async with clients:
+                started = time.perf_counter()
+                status = await request()
+                return time.perf_counter() - started, status
+
+        return await asyncio.gather(*[timed() for _ in range(options['requests'])])
@@ -0,0 +1,123 @@
+import multiprocessing
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from store.checkout import place_order
+from store.models import Category, Product
+
+# SQLite's defaults: rollback journal, fsync on every commit, no retries
+DEFAULT_MODE = {
+    'SQLITE_PRAGMAS': {'journal_mode': 'delete', 'synchronous': 'full'},
+    'SQLITE_LOCK_RETRIES': 0,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent checkouts plus catalog readers on a throwaway database, once with "
+        "SQLite's defaults and once with the production settings (SQLITE_PRAGMAS, "
+        "SQLITE_LOCK_RETRIES), and compare throughput and lock errors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Processes placing orders.")
+        parser.add_argument('--readers', type=int, default=4, help="Processes reading the catalog.")
+        parser.add_argument('--seconds', type=float, default=5.0, help="Duration of each run.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            users, product_ids = self.seed(options['writers'])
+            results = {}
+            for label, overrides in (('default', DEFAULT_MODE), ('production', {})):
+                with override_settings(**overrides):
+                    # Reconnect alone, so this mode's journal_mode can be
+                    # switched before the workers open their connections
+                    connections.close_all()
+                    connection.ensure_connection()
+                    connections.close_all()
+                    results[label] = self.run(users, product_ids, options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'mode':<12}{'orders/s':>10}{'reads/s':>10}{'lock errors':>13}")
+        for label, r in results.items():
+            self.stdout.write(f"{label:<12}{r['orders'] / r['seconds']:>10.1f}"
+                              f"{r['reads'] / r['seconds']:>10.1f}{r['errors']:>13}")
+        before, after = results['default'], results['production']
+        if before['orders']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Write throughput x{after['orders'] / before['orders']:.2f}, "
+                f"read throughput x{after['reads'] / max(before['reads'], 1):.2f}."
+            ))
+
+    def seed(self, writers):
+        category = Category.objects.create(name='Bench')
+        Product.objects.bulk_create([
+            Product(name=f'Bench shoe {i}', category=category, price=1000, description='bench',
+                    image='shoes/benchmark.jpg', stock=10_000_000)
+            for i in range(200)
+        ])
+        users = [User.objects.create_user(f'writer{i}') for i in range(writers)]
+        return users, list(Product.objects.values_list('id', flat=True))
+
+    def run(self, users, product_ids, options):
+        # Separate processes, like real workers: each has its own connection
+        # and nothing is serialized by the GIL
+        ctx = multiprocessing.get_context('fork')
+        start = ctx.Barrier(len(users) + options['readers'] + 1, timeout=60)
+        results = ctx.Queue()
+        args = (start, results, options['seconds'])
+        workers = [ctx.Process(target=_writer, args=(*args, user.pk, i, product_ids)) for i, user in enumerate(users)]
+        workers += [ctx.Process(target=_reader, args=args) for _ in range(options['readers'])]
+        for worker in workers:
+            worker.start()
+        start.wait()
+        started = time.perf_counter()
+
+        counts = {'orders': 0, 'reads': 0, 'errors': 0}
+        for _ in workers:
+            for name, value in results.get().items():
+                counts[name] += value
+        for worker in workers:
+            worker.join()
+        return {**counts, 'seconds': time.perf_counter() - started}
+
+
+def _writer(start, results, seconds, user_id, index, product_ids):
+    user = User.objects.get(pk=user_id)
+    counts = {'orders': 0, 'errors': 0}
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    i = index
+    while time.perf_counter() < deadline:
+        i += 1
+        try:
+            place_order(user, {product_ids[i % len(product_ids)]: 1,
+                               product_ids[(i * 7) % len(product_ids)]: 1})
+            counts['orders'] += 1
+        except OperationalError:
+            counts['errors'] += 1
+    connection.close()
+    results.put(counts)
+
+
+def _reader(start, results, seconds):
+    counts = {'reads': 0, 'errors': 0}
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            list(Product.objects.select_related('category').order_by('-pk')[:24])
+            counts['reads'] += 1
+        except OperationalError:
+            counts['errors'] += 1
+    connection.close()
+    results.put(counts)
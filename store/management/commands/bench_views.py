@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from store.benchmarks import BASELINE_PATH, find_regressions, load_baseline, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot store views (query count, p50/p95 latency, response size) "
+        "on a seeded throwaway database and compare with the checked-in baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help="Dataset size multiplier.")
+        parser.add_argument('--iterations', type=int, default=20, help="Timed requests per view.")
+        parser.add_argument('--output', help="Write the results JSON to this file.")
+        parser.add_argument('--baseline', default=str(BASELINE_PATH), help="Baseline JSON to compare with.")
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Save the results as the new baseline instead of comparing.")
+        parser.add_argument('--latency-tolerance', type=float, default=0.5,
+                            help="Allowed p95 growth as a fraction (default 0.5 = +50%%).")
+        parser.add_argument('--no-latency', action='store_true',
+                            help="Only compare query counts and sizes.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = run_suite(options['scale'], options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.print_table(results)
+        text = json.dumps(results, indent=2) + '\n'
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(text)
+
+        if options['update_baseline']:
+            with open(options['baseline'], 'w') as f:
+                f.write(text)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        baseline = load_baseline(options['baseline'])
+        if baseline['scale'] != results['scale']:
+            self.stderr.write(f"Baseline was recorded at scale {baseline['scale']}; latency may not compare.")
+        regressions = find_regressions(
+            results, baseline,
+            latency_tolerance=None if options['no_latency'] else options['latency_tolerance'],
+        )
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def print_table(self, results):
+        self.stdout.write(f"{'view':<16} {'status':>6} {'queries':>8} {'p50 ms':>8} {'p95 ms':>8} {'bytes':>8}")
+        for name, view in results['views'].items():
+            self.stdout.write(
+                f"{name:<16} {view['status']:>6} {view['queries']:>8} {view['p50_ms']:>8} "
+                f"{view['p95_ms']:>8} {view['bytes']:>8}"
+            )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = ("Update the \"frequently bought together\" recommendations (store/recommendations.py) "
+            "with the orders placed since the last run, or rebuild them from every order.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Recompute everything instead of adding the new orders.")
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K,
+                            help="Recommendations kept per product.")
+        parser.add_argument('--batch-size', type=int, default=recommendations.UPDATE_BATCH_SIZE,
+                            help="Orders per transaction when updating.")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            pairs, rows = recommendations.rebuild(options['top_k'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt {pairs} product pair(s) and {rows} recommendation(s)."
+            ))
+        else:
+            orders = recommendations.update(options['batch_size'], options['top_k'])
+            self.stdout.write(self.style.SUCCESS(f"Added {orders} new order(s)."))
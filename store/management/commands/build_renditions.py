@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from store.images import generate_renditions, mark_ready
+from store.models import Product
+
+
+def _init_worker():
+    # Needed when worker processes are spawned instead of forked
+    django.setup()
+
+
+def _build(product_id, image_name):
+    generate_renditions(image_name)
+    return product_id, image_name
+
+
+class Command(BaseCommand):
+    help = "Build the responsive image renditions for products that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Worker processes (default: one per CPU).")
+        parser.add_argument('--all', action='store_true',
+                            help="Rebuild renditions for every product, not only missing ones.")
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Products marked ready per UPDATE.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='')
+        if not options['all']:
+            products = products.filter(has_renditions=False)
+        jobs = list(products.values_list('id', 'image'))
+
+        if not jobs:
+            self.stdout.write("Nothing to do.")
+            return
+
+        # Forked workers must not share the parent's SQLite connection
+        connections.close_all()
+
+        done, failed = [], 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = {pool.submit(_build, pk, name): pk for pk, name in jobs}
+            for future in as_completed(futures):
+                try:
+                    done.append(future.result())
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"Product {futures[future]}: {exc}")
+
+                if len(done) >= options['batch_size']:
+                    mark_ready(done)
+                    done = []
+
+        if done:
+            mark_ready(done)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built renditions for {len(jobs) - failed} product(s), {failed} failed."
+        ))
@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import detect_format, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = "Export every product to CSV or JSONL (the format import_products reads)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help="File to write, or - for stdout (the default).")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Output format (default: from the file extension, csv for stdout).")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help="Rows fetched from the database at a time.")
+
+    def handle(self, *args, **options):
+        path = options['output']
+        if path == '-':
+            fmt = options['format'] or 'csv'
+        else:
+            try:
+                fmt = detect_format(path, options['format'])
+            except ValueError as exc:
+                raise CommandError(exc)
+
+        out = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        try:
+            count = write_rows(export_rows(options['chunk_size']), out, fmt)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(f"Exported {count} product(s) to {path}."))
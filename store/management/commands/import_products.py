@@ -0,0 +1,70 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import detect_format, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Import products from a CSV or JSONL file (columns: name, category, price, "
+        "description, image, stock). Rows that fail validation are reported and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin (needs --format).")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Input format (default: from the file extension).")
+        parser.add_argument('--images-dir',
+                            help="Directory holding the files named in the image column; they are "
+                                 "copied into media/shoes/. Without it the image column must already "
+                                 "be a path in the media storage.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Rows per bulk INSERT.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Validate everything but write nothing.")
+        parser.add_argument('--errors',
+                            help="Write the per-row error report to this CSV file instead of stderr.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            fmt = detect_format(path, options['format'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        report_file = open(options['errors'], 'w', newline='') if options['errors'] else None
+        if report_file:
+            report = csv.writer(report_file)
+            report.writerow(['line', 'error', 'row'])
+
+        def on_error(line_number, row, message):
+            if report_file:
+                report.writerow([line_number, message, json.dumps(row) if isinstance(row, dict) else ''])
+            else:
+                self.stderr.write(f"Line {line_number}: {message}")
+
+        source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            result = import_products(
+                read_rows(source, fmt),
+                images_dir=options['images_dir'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                on_error=on_error,
+            )
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if report_file:
+                report_file.close()
+
+        verb = "Would import" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result.created} of {result.rows} product(s) "
+            f"({result.categories_created} new categories), {result.errors} row(s) with errors."
+        ))
+        if result.created and not options['dry_run']:
+            self.stdout.write("Run `manage.py build_renditions` to make their thumbnails.")
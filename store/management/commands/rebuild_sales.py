@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store.sales import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollups (store/sales.py) from every order."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rollup rows per bulk INSERT.")
+
+    def handle(self, *args, **options):
+        counts = rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            "Rebuilt " + ", ".join(f"{count} {name} row(s)" for name, count in counts.items()) + "."
+        ))
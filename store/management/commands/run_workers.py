@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from store import task_queue
+
+
+class Command(BaseCommand):
+    help = "Run the background task workers (store/task_queue.py) until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None,
+                            help="Worker processes (default: TASK_WORKERS, or one per CPU).")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once no task is due instead of waiting for more.")
+        parser.add_argument('--poll', type=float, default=task_queue.POLL_INTERVAL,
+                            help="Seconds between looks at an empty queue.")
+
+    def handle(self, *args, **options):
+        processed = task_queue.run_workers(options['processes'], options['burst'], options['poll'])
+        if processed is not None:
+            self.stdout.write(self.style.SUCCESS(f"Ran {processed} task(s)."))
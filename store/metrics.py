@@ -0,0 +1,174 @@
+"""
+In-process request metrics.
+
+RequestMetricsMiddleware (store/middleware/metrics.py) records, for a
+sample of requests, the wall time, SQL query count, SQL time and template
+render time under the resolved URL name. They are kept here in fixed-bucket
+histograms, which can be exported in the Prometheus text format or shown on
+the staff metrics page.
+
+Each worker process has its own numbers; scrape every worker (or sum them)
+to see the whole site.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250, 500)
+
+# name: (help text, buckets)
+METRICS = {
+    'request_duration_seconds': ("Wall time of the request", SECONDS_BUCKETS),
+    'sql_queries': ("SQL queries run by the request", COUNT_BUCKETS),
+    'sql_duration_seconds': ("Time spent in SQL queries", SECONDS_BUCKETS),
+    'template_duration_seconds': ("Time spent rendering templates", SECONDS_BUCKETS),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+    def percentile(self, pct):
+        """Estimate a percentile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = self.count * pct / 100
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.buckets[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}  # view name -> {metric name: Histogram}
+
+    def record(self, view, **values):
+        with self._lock:
+            histograms = self._views.get(view)
+            if histograms is None:
+                histograms = self._views[view] = {
+                    name: Histogram(buckets) for name, (_, buckets) in METRICS.items()
+                }
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+    def summary(self):
+        """One row per view for the metrics page, slowest (by p95) first."""
+        rows = []
+        with self._lock:
+            for view, h in self._views.items():
+                duration = h['request_duration_seconds']
+                rows.append({
+                    'view': view,
+                    'requests': duration.count,
+                    'avg_ms': duration.total / duration.count * 1000,
+                    'p50_ms': duration.percentile(50) * 1000,
+                    'p95_ms': duration.percentile(95) * 1000,
+                    'avg_queries': h['sql_queries'].total / duration.count,
+                    'avg_sql_ms': h['sql_duration_seconds'].total / duration.count * 1000,
+                    'avg_template_ms': h['template_duration_seconds'].total / duration.count * 1000,
+                })
+        return sorted(rows, key=lambda row: row['p95_ms'], reverse=True)
+
+    def prometheus(self):
+        """Export every histogram in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            for name, (help_text, buckets) in METRICS.items():
+                metric = f'store_{name}'
+                lines.append(f'# HELP {metric} {help_text}.')
+                lines.append(f'# TYPE {metric} histogram')
+                for view, histograms in sorted(self._views.items()):
+                    h = histograms[name]
+                    label = view.replace('\\', '\\\\').replace('"', '\\"')
+                    cumulative = 0
+                    for upper, count in zip(buckets, h.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{view="{label}",le="{upper}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{view="{label}",le="+Inf"}} {h.count}')
+                    lines.append(f'{metric}_sum{{view="{label}"}} {h.total}')
+                    lines.append(f'{metric}_count{{view="{label}"}} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestTimings:
+    """SQL and template totals of the request being measured."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Used as a connection.execute_wrapper()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_seconds += time.perf_counter() - started
+
+
+# Timings of the current request, if it was sampled
+current_timings = ContextVar('store_request_timings', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """Execute wrapper for every connection (signals.py): adds to the current request's timings, if any."""
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+_templates_patched = False
+
+
+def instrument_templates():
+    """Time every top-level template render (done once per process)."""
+    global _templates_patched
+    if _templates_patched:
+        return
+    from django.template.backends.django import Template
+
+    original_render = Template.render
+
+    def render(self, context=None, request=None):
+        timings = current_timings.get()
+        if timings is None:
+            return original_render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            timings.template_seconds += time.perf_counter() - started
+
+    Template.render = render
+    _templates_patched = True
@@ -0,0 +1,74 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from store.metrics import RequestTimings, current_timings, instrument_templates, registry
+
+
+class RequestMetricsMiddleware:
+    """
+    Record wall time, SQL queries, SQL time and template time per URL name.
+
+    Only METRICS_SAMPLE_RATE of the requests (0.0 - 1.0) are measured; the
+    rest pass straight through. Put it first in MIDDLEWARE so the wall time
+    covers the other middlewares too.
+
+    Works sync and async, so under ASGI the async views aren't pushed to a
+    thread. Queries are counted through current_timings by a wrapper on
+    every connection (see signals.py), so the ones run by sync_to_async in
+    another thread count too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        instrument_templates()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        return self.sample_rate and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        self._record(request, timings, started)
+        return response
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        self._record(request, timings, started)
+        return response
+
+    def _record(self, request, timings, started):
+        match = getattr(request, 'resolver_match', None)
+        registry.record(
+            match.view_name if match else 'unresolved',
+            request_duration_seconds=time.perf_counter() - started,
+            sql_queries=timings.queries,
+            sql_duration_seconds=timings.sql_seconds,
+            template_duration_seconds=timings.template_seconds,
+        )
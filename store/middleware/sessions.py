@@ -0,0 +1,100 @@
+"""
+Separate sessions for the admin side and the shop side.
+
+Replaces django.contrib.sessions.middleware.SessionMiddleware. Each request
+is sorted by path: admin pages (ADMIN_SESSION_PATHS) use the
+ADMIN_SESSION_COOKIE_NAME cookie and the ADMIN_SESSION_ENGINE store, and
+everything else uses the normal SESSION_COOKIE_NAME / SESSION_ENGINE. So a
+staff member can be logged into the admin while shopping as someone else
+(or as nobody) in the same browser.
+
+The choice is made per request and kept on the request object; settings
+are never modified, so this is safe with threaded and ASGI workers.
+"""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.exceptions import SessionInterrupted
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+from store.sqlite import retry_on_lock
+
+DEFAULT_ADMIN_PATHS = ('/admin/', '/myadmin/', '/admin-login/')
+
+
+def is_admin_path(path):
+    prefixes = getattr(settings, 'ADMIN_SESSION_PATHS', DEFAULT_ADMIN_PATHS)
+    return path.startswith(tuple(prefixes))
+
+
+class DualSessionMiddleware(SessionMiddleware):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        admin_engine = import_module(getattr(settings, 'ADMIN_SESSION_ENGINE', settings.SESSION_ENGINE))
+        self.AdminSessionStore = admin_engine.SessionStore
+
+    def process_request(self, request):
+        if is_admin_path(request.path):
+            request.session_cookie_name = getattr(settings, 'ADMIN_SESSION_COOKIE_NAME', 'admin_sessionid')
+            store = self.AdminSessionStore
+        else:
+            request.session_cookie_name = settings.SESSION_COOKIE_NAME
+            store = self.SessionStore
+        request.session = store(request.COOKIES.get(request.session_cookie_name))
+
+    def process_response(self, request, response):
+        # Same as SessionMiddleware.process_response, but with the cookie
+        # name chosen for this request
+        try:
+            accessed = request.session.accessed
+            modified = request.session.modified
+            empty = request.session.is_empty()
+            cookie_name = request.session_cookie_name
+        except AttributeError:
+            return response
+
+        if cookie_name in request.COOKIES and empty:
+            response.delete_cookie(
+                cookie_name,
+                path=settings.SESSION_COOKIE_PATH,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+
+        if accessed:
+            patch_vary_headers(response, ('Cookie',))
+        if (modified or settings.SESSION_SAVE_EVERY_REQUEST) and not empty:
+            if request.session.get_expire_at_browser_close():
+                max_age = None
+                expires = None
+            else:
+                max_age = request.session.get_expiry_age()
+                expires = http_date(time.time() + max_age)
+            # Skip session save for 5xx responses
+            if response.status_code < 500:
+                try:
+                    retry_on_lock(request.session.save)()
+                except UpdateError:
+                    raise SessionInterrupted(
+                        "The request's session was deleted before the "
+                        "request completed. The user may have logged "
+                        "out in a concurrent request, for example."
+                    )
+                response.set_cookie(
+                    cookie_name,
+                    request.session.session_key,
+                    max_age=max_age,
+                    expires=expires,
+                    domain=settings.SESSION_COOKIE_DOMAIN,
+                    path=settings.SESSION_COOKIE_PATH,
+                    secure=settings.SESSION_COOKIE_SECURE or None,
+                    httponly=settings.SESSION_COOKIE_HTTPONLY or None,
+                    samesite=settings.SESSION_COOKIE_SAMESITE,
+                )
+        return response
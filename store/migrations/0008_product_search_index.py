@@ -0,0 +1,84 @@
+from django.db import migrations
+
+# The search index and the triggers that keep it in sync (see store/search.py).
+# The SQL is copied here rather than imported, so this migration keeps
+# building the schema of its time whatever store/search.py becomes.
+TABLE_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts USING fts5(
+        name, description, category,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+"""
+
+TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS store_product_fts_insert
+    AFTER INSERT ON store_product BEGIN
+        INSERT INTO store_product_fts (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                (SELECT name FROM store_category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS store_product_fts_update
+    AFTER UPDATE ON store_product BEGIN
+        DELETE FROM store_product_fts WHERE rowid = old.id;
+        INSERT INTO store_product_fts (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                (SELECT name FROM store_category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS store_product_fts_delete
+    AFTER DELETE ON store_product BEGIN
+        DELETE FROM store_product_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS store_category_fts_rename
+    AFTER UPDATE OF name ON store_category BEGIN
+        UPDATE store_product_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM store_product WHERE category_id = new.id);
+    END
+    """,
+]
+
+FILL_SQL = """
+    INSERT INTO store_product_fts (rowid, name, description, category)
+    SELECT p.id, p.name, p.description, c.name
+    FROM store_product p JOIN store_category c ON c.id = p.category_id
+"""
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS store_category_fts_rename",
+    "DROP TRIGGER IF EXISTS store_product_fts_delete",
+    "DROP TRIGGER IF EXISTS store_product_fts_update",
+    "DROP TRIGGER IF EXISTS store_product_fts_insert",
+    "DROP TABLE IF EXISTS store_product_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in [TABLE_SQL, *TRIGGERS_SQL, FILL_SQL]:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_remove_product_size_delete_shoesize'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# The search triggers of migration 0008. On SQLite AddField rebuilds the
+# table, which drops its triggers, so they are dropped first and created
+# again afterwards (copied here rather than imported from store/search.py).
+TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS store_product_fts_insert
+    AFTER INSERT ON store_product BEGIN
+        INSERT INTO store_product_fts (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                (SELECT name FROM store_category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS store_product_fts_update
+    AFTER UPDATE ON store_product BEGIN
+        DELETE FROM store_product_fts WHERE rowid = old.id;
+        INSERT INTO store_product_fts (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                (SELECT name FROM store_category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS store_product_fts_delete
+    AFTER DELETE ON store_product BEGIN
+        DELETE FROM store_product_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS store_category_fts_rename
+    AFTER UPDATE OF name ON store_category BEGIN
+        UPDATE store_product_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM store_product WHERE category_id = new.id);
+    END
+    """,
+]
+
+DROP_TRIGGERS_SQL = [
+    "DROP TRIGGER IF EXISTS store_category_fts_rename",
+    "DROP TRIGGER IF EXISTS store_product_fts_delete",
+    "DROP TRIGGER IF EXISTS store_product_fts_update",
+    "DROP TRIGGER IF EXISTS store_product_fts_insert",
+]
+
+
+def _run(statements, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in statements:
+            schema_editor.execute(sql)
+
+
+def drop_triggers(apps, schema_editor):
+    _run(DROP_TRIGGERS_SQL, schema_editor)
+
+
+def create_triggers(apps, schema_editor):
+    _run(TRIGGERS_SQL, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_product_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_triggers, create_triggers),
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# store_product_fts_update only fires when a searched column changes now,
+# so price and stock updates leave the search index alone. The SQL is
+# copied here rather than imported from store/search.py.
+UPDATE_TRIGGER_SQL = """
+    CREATE TRIGGER IF NOT EXISTS store_product_fts_update
+    AFTER UPDATE OF name, description, category_id ON store_product BEGIN
+        DELETE FROM store_product_fts WHERE rowid = old.id;
+        INSERT INTO store_product_fts (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                (SELECT name FROM store_category WHERE id = new.category_id));
+    END
+"""
+
+OLD_UPDATE_TRIGGER_SQL = """
+    CREATE TRIGGER IF NOT EXISTS store_product_fts_update
+    AFTER UPDATE ON store_product BEGIN
+        DELETE FROM store_product_fts WHERE rowid = old.id;
+        INSERT INTO store_product_fts (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                (SELECT name FROM store_category WHERE id = new.category_id));
+    END
+"""
+
+DROP_UPDATE_TRIGGER_SQL = "DROP TRIGGER IF EXISTS store_product_fts_update"
+
+
+def _replace_update_trigger(sql, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(DROP_UPDATE_TRIGGER_SQL)
+        schema_editor.execute(sql)
+
+
+def narrow_update_trigger(apps, schema_editor):
+    _replace_update_trigger(UPDATE_TRIGGER_SQL, schema_editor)
+
+
+def restore_update_trigger(apps, schema_editor):
+    _replace_update_trigger(OLD_UPDATE_TRIGGER_SQL, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_task_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(narrow_update_trigger, restore_update_trigger),
+    ]
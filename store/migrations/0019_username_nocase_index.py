@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# The orders page filters by username prefix (username__istartswith, a
+# case-insensitive LIKE 'abc%'). SQLite only turns that into an index range
+# on an index with NOCASE collation; auth_user's own username index is BINARY.
+INDEX_SQL = 'CREATE INDEX IF NOT EXISTS store_username_nocase_idx ON auth_user (username COLLATE NOCASE)'
+DROP_SQL = 'DROP INDEX IF EXISTS store_username_nocase_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(INDEX_SQL)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('store', '0018_product_fts_update_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
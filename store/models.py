@@ -1,8 +1,12 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
+from django.contrib.sessions.base_session import AbstractBaseSession
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
+    # Used for conditional GETs (store/conditional.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     def __str__(self):
         return self.name
 
@@ -12,7 +16,19 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2)
     description = models.TextField()
     image = models.ImageField(upload_to='shoes/')
+    # True once the resized copies from store/images.py exist
+    has_renditions = models.BooleanField(default=False)
     stock = models.PositiveIntegerField(default=0)
+    # Set on every save; QuerySet.update() callers set it themselves
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Catalog facets (store/facets.py): the counts are read from the
+            # first one alone, filters use whichever matches best
+            models.Index(fields=['category', 'price', 'stock'], name='product_facets_idx'),
+            models.Index(fields=['price', 'stock'], name='product_price_stock_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -21,7 +37,7 @@ class Product(models.Model):
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
@@ -41,9 +57,132 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # One line per product per user; quantities are updated in place
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_line'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} × {self.product.name} ({self.user.username})"
 
     @property
     def total_price(self):
         return self.product.price * self.quantity
+
+
+class AdminSession(AbstractBaseSession):
+    """Sessions of the admin side, kept apart from shopper sessions (see admin_sessions.py)."""
+
+    @classmethod
+    def get_session_store_class(cls):
+        from .admin_sessions import SessionStore
+        return SessionStore
+
+
+class SalesRollup(models.Model):
+    """Totals kept up to date by store/sales.py (see `manage.py rebuild_sales`)."""
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailySales(SalesRollup):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day'], name='unique_daily_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: ₱{self.revenue}"
+
+
+class ProductDailySales(SalesRollup):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='unique_product_daily_sales'),
+        ]
+
+
+class CategoryDailySales(SalesRollup):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='unique_category_daily_sales'),
+        ]
+
+
+class CoPurchase(models.Model):
+    """One cell of the sparse co-occurrence matrix: `orders` containing both products (see store/recommendations.py)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='unique_co_purchase'),
+        ]
+
+
+class Recommendation(models.Model):
+    """The top-k "frequently bought together" products of a product, rank 1 first."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    orders = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            # Also the index product_detail reads through
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_recommendation_rank'),
+        ]
+
+
+class RecommendationState(models.Model):
+    """Single row: how far the co-occurrence matrix has read the orders."""
+    last_order_id = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True)
+
+
+class Task(models.Model):
+    """A unit of background work for `manage.py run_workers` (see store/task_queue.py)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    # Idempotency key: at most one queued/running task per key
+    key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    # Visibility timeout (seconds): a running task not finished by then is picked up again
+    timeout = models.PositiveIntegerField(default=300)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='task_queue_idx'),
+            models.Index(fields=['status', 'locked_until'], name='task_lease_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=models.Q(status__in=['queued', 'running']),
+                                    name='unique_pending_task_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
@@ -0,0 +1,221 @@
+"""
+Order archival: move old orders into compressed JSON Lines files.
+
+Orders created before a cutoff day are written to
+ORDER_ARCHIVE_DIR/orders-before-<day>.jsonl.gz (same format as the JSONL
+export, see order_export.py) and deleted, a batch at a time:
+
+1. take the next ORDER_ARCHIVE_BATCH_SIZE order ids below the cutoff;
+2. append them to the archive as one more gzip member and fsync it;
+3. delete them (and their lines) in one short transaction;
+4. sleep ORDER_ARCHIVE_PAUSE seconds so checkouts can take the write lock.
+
+Each write transaction is one small batch, so the store keeps taking
+orders while an archive runs.
+
+It can be stopped at any point and run again with the same cutoff. Before
+step 2 a journal (<archive>.pending) records the file size and the batch's
+ids. If a run stops between steps 2 and 3, the next run finds the journal.
+Batch still in the database: the half-written member is cut off. Batch
+already deleted: the member is kept. Either way every order ends up in the
+archive exactly once.
+
+The sales rollups are left alone (sales.keep_history()): archived orders
+still count in the dashboard's history (sales.rebuild() only sees the
+orders that are left).
+
+Runs from `manage.py archive_orders` or, through the task queue
+(store/task_queue.py), from the orders page. Progress goes to
+ORDER_ARCHIVE_DIR/status.json.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import sales
+from .models import Order
+from .order_export import jsonl_lines
+from .sqlite import retry_on_lock
+from .task_queue import enqueue, task
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock below applies
+    fcntl = None
+
+BATCH_SIZE = 500
+PAUSE = 0.2  # seconds between batches
+
+_running = threading.Lock()
+
+
+class ArchiveBusy(Exception):
+    """Another archival run holds the lock."""
+
+
+@dataclass
+class ArchiveResult:
+    path: str
+    archived: int = 0
+    batches: int = 0
+    recovered: str = ''  # what was done with an interrupted batch, if any
+
+
+def archive_dir():
+    return str(getattr(settings, 'ORDER_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archives')))
+
+
+def archive_path(cutoff):
+    return os.path.join(archive_dir(), f'orders-before-{cutoff:%Y%m%d}.jsonl.gz')
+
+
+def orders_before(cutoff):
+    """Orders created before local midnight at the start of `cutoff` (a date)."""
+    start = timezone.make_aware(datetime.combine(cutoff, dt_time.min))
+    return Order.objects.filter(created_at__lt=start)
+
+
+def read_status():
+    try:
+        with open(os.path.join(archive_dir(), 'status.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    # Write and rename, so a crash never leaves half a file behind
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def _write_status(**status):
+    status['updated_at'] = timezone.now().isoformat()
+    _write_json(os.path.join(archive_dir(), 'status.json'), status)
+
+
+def _recover(path):
+    """Finish or undo the batch an interrupted run left in the journal."""
+    journal = path + '.pending'
+    if not os.path.exists(journal):
+        return ''
+    with open(journal) as f:
+        pending = json.load(f)
+    if Order.objects.filter(pk__in=pending['ids']).exists():
+        # Not deleted: drop the partly or fully written member, it is archived again below
+        try:
+            with open(path, 'r+b') as f:
+                f.truncate(pending['offset'])
+        except FileNotFoundError:
+            pass  # stopped before the first batch created the file (offset 0)
+        outcome = f"discarded an unfinished batch of {len(pending['ids'])} order(s)"
+    else:
+        outcome = f"kept a finished batch of {len(pending['ids'])} order(s)"
+    os.remove(journal)
+    return outcome
+
+
+def _append(path, orders):
+    """Append `orders` to the archive as one gzip member, durably."""
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+            for line in jsonl_lines(orders):
+                gz.write(line.encode())
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+@retry_on_lock
+def _delete_batch(ids):
+    with transaction.atomic(), sales.keep_history():
+        Order.objects.filter(pk__in=ids).delete()
+
+
+def archive_orders(cutoff, batch_size=None, pause=None, progress=None):
+    """
+    Archive and delete every order created before `cutoff` (a date).
+
+    `progress(result)` is called after each batch. Raises ArchiveBusy if
+    another run is in progress.
+    """
+    batch_size = batch_size or getattr(settings, 'ORDER_ARCHIVE_BATCH_SIZE', BATCH_SIZE)
+    pause = getattr(settings, 'ORDER_ARCHIVE_PAUSE', PAUSE) if pause is None else pause
+    os.makedirs(archive_dir(), exist_ok=True)
+    path = archive_path(cutoff)
+    result = ArchiveResult(path=path)
+
+    if not _running.acquire(blocking=False):
+        raise ArchiveBusy("An order archive is already running in this process.")
+    lock_file = open(os.path.join(archive_dir(), '.lock'), 'w')
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise ArchiveBusy("An order archive is already running.")
+
+        def status(state, **extra):
+            _write_status(state=state, cutoff=cutoff.isoformat(), file=os.path.basename(path),
+                          archived=result.archived, **extra)
+
+        status('running')
+        try:
+            result.recovered = _recover(path)
+            orders = orders_before(cutoff).order_by('pk')
+            while True:
+                ids = list(orders.values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                offset = os.path.getsize(path) if os.path.exists(path) else 0
+                _write_json(path + '.pending', {'offset': offset, 'ids': ids})
+                _append(path, Order.objects.filter(pk__in=ids))
+                _delete_batch(ids)
+                os.remove(path + '.pending')
+
+                result.archived += len(ids)
+                result.batches += 1
+                status('running')
+                if progress:
+                    progress(result)
+                if pause:
+                    time.sleep(pause)
+        except Exception as exc:
+            # The journal stays, so the next run can pick up from here
+            status('failed', error=str(exc))
+            raise
+        status('done')
+        return result
+    finally:
+        lock_file.close()
+        _running.release()
+
+
+# Resumable, so a retry (e.g. after ArchiveBusy) or a second run after a
+# lost lease just carries on
+@task(max_attempts=10, timeout=60 * 60)
+def run_archive(cutoff):
+    archive_orders(date.fromisoformat(cutoff))
+
+
+def start_archive(cutoff):
+    """Queue archive_orders(cutoff). Returns False if an archive is already queued or running."""
+    return enqueue(run_archive, cutoff.isoformat(), key='order-archive')
+
+
+def read_archive(path):
+    """Yield the orders (dicts) in an archive file, e.g. to restore or inspect it."""
+    with gzip.open(path, 'rt') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
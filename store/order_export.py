@@ -0,0 +1,75 @@
+"""
+Streaming order exports (CSV or JSON Lines) for the orders admin page.
+
+Orders are read in keyset chunks (see pagination.keyset_chunks), each chunk
+being one query for the orders and users plus one for their lines and
+product names. Rows are produced as the response is sent, so memory use
+is one chunk no matter how many orders match.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .models import OrderItem
+from .pagination import keyset_chunks
+
+EXPORT_CHUNK_SIZE = 1000
+
+CSV_HEADER = ['order_id', 'created_at', 'username', 'order_total',
+              'product_id', 'product_name', 'quantity', 'price']
+
+
+def _orders_with_lines(orders):
+    return orders.select_related('user').only(
+        'created_at', 'total_price', 'user__username',
+    ).prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product').only(
+            'order', 'quantity', 'price', 'product__name',
+        ).order_by('pk'))
+    )
+
+
+def _iter_orders(orders, chunk_size):
+    for chunk in keyset_chunks(_orders_with_lines(orders), chunk_size):
+        yield from chunk
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """One CSV row per order line (an order with no lines gets one row with blank item columns)."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for order in _iter_orders(orders, chunk_size):
+        head = [order.pk, order.created_at.isoformat(), order.user.username, order.total_price]
+        items = order.items.all()
+        if not items:
+            yield writer.writerow(head + ['', '', '', ''])
+        for item in items:
+            yield writer.writerow(head + [item.product_id, item.product.name, item.quantity, item.price])
+
+
+def jsonl_lines(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """One JSON object per order, with its lines in `items`."""
+    for order in _iter_orders(orders, chunk_size):
+        yield json.dumps({
+            'order_id': order.pk,
+            'created_at': order.created_at.isoformat(),
+            'username': order.user.username,
+            'order_total': str(order.total_price),
+            'items': [
+                {
+                    'product_id': item.product_id,
+                    'product_name': item.product.name,
+                    'quantity': item.quantity,
+                    'price': str(item.price),
+                }
+                for item in order.items.all()
+            ],
+        }) + '\n'
@@ -0,0 +1,54 @@
+"""
+A shopper's own order history ("My orders").
+
+history_page() gives one page of the user's orders, newest first, with
+cursor (keyset) pagination. Each page is exactly two queries, whatever its
+size: one for the orders and one for all their lines and products.
+
+summary() is the order count and spend shown above the list. It covers
+the same orders as the list: those still in the database. Orders moved
+out by order_archive no longer count, so the numbers can go down after an
+archive run. It is cached per user and dropped whenever one of their
+orders is created or deleted (checkout, the admin pages, archival; see
+signals.py). The drop happens once the transaction commits, so no request
+can cache numbers from before the change.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Prefetch, Sum
+
+from .models import Order, OrderItem
+from .pagination import keyset_page
+
+HISTORY_PAGE_SIZE = 10
+
+SUMMARY_TIMEOUT = 60 * 60 * 24  # invalidated on change, this is only a backstop
+
+
+def _summary_key(user_id):
+    return f'store:order-summary:{user_id}'
+
+
+def summary(user):
+    """{'orders': n, 'spent': Decimal} over `user`'s orders that haven't been archived."""
+    key = _summary_key(user.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    totals = Order.objects.filter(user=user).aggregate(orders=Count('pk'), spent=Sum('total_price', default=0))
+    cache.set(key, totals, SUMMARY_TIMEOUT)
+    return totals
+
+
+def invalidate_summary(user_id):
+    transaction.on_commit(lambda: cache.delete(_summary_key(user_id)))
+
+
+def history_page(user, after=None, page_size=HISTORY_PAGE_SIZE):
+    """Return (orders, next_cursor); every order has its lines and their products prefetched."""
+    orders = Order.objects.filter(user=user).only('created_at', 'total_price').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product').only(
+            'order', 'quantity', 'price', 'product__name',
+        ).order_by('pk'))
+    )
+    return keyset_page(orders, after, page_size)
@@ -0,0 +1,141 @@
+"""
+Full-page cache for anonymous catalog traffic.
+
+Turned on with PAGE_CACHE_ENABLED = True in settings. Pages are cached per
+path + query string and per visitor cookies (CSRF and session), because the
+add-to-cart forms embed a CSRF token that only works with that visitor's
+cookie.
+
+Every cache key includes a "catalog version". Saving or deleting a Product
+or Category (custom admin views, django.contrib.admin, the shell...) bumps
+the version through the signals in store/signals.py, so all cached pages
+are invalidated at once. Pages behind conditional_page() also key on
+their validator state, e.g. a product page on its own recommendations
+(which never bump the version). Code that writes with QuerySet.update() or
+bulk_create() must call bump_catalog_version() itself, since Django sends
+no signals for those.
+
+Works with any Django cache backend shared by every process that changes
+the catalog or serves pages, including the task workers. The default one
+(store/cache.py) is shared by the processes of one machine.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+
+VERSION_KEY = 'store:catalog_version'
+
+
+def _cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def _new_version():
+    # Time based, so a version that was evicted from the cache can never
+    # come back with the same value and revive stale pages
+    return time.time_ns()
+
+
+def catalog_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog page."""
+    cache = _cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key missing (never set or evicted)
+        cache.set(VERSION_KEY, _new_version(), None)
+
+
+def _timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 300)
+
+
+def _page_key(request):
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    session_cookie = request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+    # The page's validator state (store/conditional.py), when there is one,
+    # covers changes that don't bump the catalog version
+    state = repr(getattr(request, 'conditional_state', None))
+    raw = '\n'.join([request.get_full_path(), csrf_cookie, session_cookie, state])
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return 'store:page:%s:%s' % (catalog_version(), digest)
+
+
+def _can_use_cache(request, user):
+    if not getattr(settings, 'PAGE_CACHE_ENABLED', False):
+        return False
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # Without a CSRF cookie the page would carry a brand new token that the
+    # next visitor's browser doesn't have
+    if settings.CSRF_COOKIE_NAME not in request.COOKIES:
+        return False
+    return not user.is_authenticated
+
+
+def _should_store(request, response):
+    patch_vary_headers(response, ('Cookie',))
+    csrf_unchanged = request.META.get('CSRF_COOKIE') == request.COOKIES[settings.CSRF_COOKIE_NAME]
+    if response.status_code == 200 and not response.streaming and csrf_unchanged:
+        response['X-Page-Cache'] = 'MISS'
+        return True
+    return False
+
+
+def _hit(response):
+    response['X-Page-Cache'] = 'HIT'
+    return response
+
+
+def cache_anonymous_page(view):
+    """Serve `view` (sync or async) from the page cache for anonymous visitors."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not _can_use_cache(request, await request.auser()):
+                return await view(request, *args, **kwargs)
+
+            cache = _cache()
+            key = await sync_to_async(_page_key)(request)
+            response = await cache.aget(key)
+            if response is not None:
+                return _hit(response)
+
+            response = await view(request, *args, **kwargs)
+            if _should_store(request, response):
+                await cache.aset(key, response, _timeout())
+            return response
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _can_use_cache(request, request.user):
+            return view(request, *args, **kwargs)
+
+        cache = _cache()
+        key = _page_key(request)
+        response = cache.get(key)
+        if response is not None:
+            return _hit(response)
+
+        response = view(request, *args, **kwargs)
+        if _should_store(request, response):
+            cache.set(key, response, _timeout())
+        return response
+
+    return wrapper
@@ -0,0 +1,68 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Instead of OFFSET, every page remembers the primary key of its last row and
+the next page starts right after it. The database can jump straight there
+using the primary key index, so page 500 costs the same as page 1.
+"""
+from .sqlite import MAX_INTEGER
+
+
+def parse_cursor(value):
+    """Turn a ?after=... query value into a positive int SQLite can hold, or None if invalid."""
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if 0 < cursor <= MAX_INTEGER else None
+
+
+def _page_query(queryset, after, page_size):
+    queryset = queryset.order_by('-pk')
+    if after is not None:
+        queryset = queryset.filter(pk__lt=after)
+    # One extra row tells us if another page exists, without a COUNT(*)
+    return queryset[:page_size + 1]
+
+
+def _split_page(items, page_size):
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        # Model instances, or dicts from .values() (which must include 'id')
+        return items, last['id'] if isinstance(last, dict) else last.pk
+    return items, None
+
+
+def keyset_page(queryset, after=None, page_size=24):
+    """
+    Return (items, next_cursor) for one page of `queryset`, newest first.
+
+    `after` is the cursor from the previous page (the pk of its last row).
+    `next_cursor` is None when there are no more rows.
+    """
+    items = list(_page_query(queryset, after, page_size))
+    return _split_page(items, page_size)
+
+
+async def akeyset_page(queryset, after=None, page_size=24):
+    """Async version of keyset_page() for async views."""
+    items = [item async for item in _page_query(queryset, after, page_size)]
+    return _split_page(items, page_size)
+
+
+def keyset_chunks(queryset, chunk_size=1000):
+    """
+    Yield lists of at most `chunk_size` rows covering the whole queryset, newest first.
+
+    Each chunk is its own short query (plus any prefetches), so long exports
+    hold no cursor or read lock open between chunks and memory stays at one
+    chunk.
+    """
+    after = None
+    while True:
+        items, after = keyset_page(queryset, after, chunk_size)
+        if items:
+            yield items
+        if after is None:
+            return
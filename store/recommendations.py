@@ -0,0 +1,164 @@
+"""
+"Frequently bought together" recommendations.
+
+CoPurchase is a sparse product x product co-occurrence matrix: one row per
+pair of products that share at least one order, with the number of such
+orders. Recommendation keeps only the top TOP_K cells of each row, ranked,
+so product_detail reads its recommendations with one lookup on the
+(product, rank) index (for_product()).
+
+Both tables are built set-wise inside SQLite rather than by looping in
+Python: the matrix is a self-join of OrderItem on the order, grouped by
+pair and upserted (INSERT ... SELECT ... ON CONFLICT DO UPDATE), and the
+top k come from a ROW_NUMBER() window over each product's row.
+
+- rebuild() recomputes everything from the orders still in the database.
+- update() folds in the orders placed since the last run, in batches of
+  orders. Only the rows of the products in those orders change, so only
+  their top k are recomputed. RecommendationState.last_order_id is the
+  watermark; SQLite serializes writers, so an order is never committed
+  after one with a higher id and the watermark can't skip any.
+
+Neither bumps the catalog version: a product page's validator and page
+cache key include its newest Recommendation id (store/conditional.py),
+and a product's rows are only rewritten when its top k is recomputed.
+
+`manage.py build_recommendations` runs either (update() by default), and
+every checkout queues an update() task (schedule_update(), through
+store/task_queue.py).
+Orders removed later (e.g. archived by order_archive) stay counted until
+the next rebuild().
+"""
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import CoPurchase, Order, OrderItem, Recommendation, RecommendationState
+from .sqlite import retry_on_lock
+from .task_queue import enqueue, task
+
+TOP_K = 10
+
+# How many recommendations product_detail shows
+SHOWN = 4
+
+UPDATE_BATCH_SIZE = 2000
+
+# Seconds a follow-up update waits, so the running one can finish first
+FOLLOW_UP_DELAY = 5
+
+
+def _tables():
+    qn = connection.ops.quote_name
+    return {
+        'items': qn(OrderItem._meta.db_table),
+        'pairs': qn(CoPurchase._meta.db_table),
+        'recommendations': qn(Recommendation._meta.db_table),
+        'rank': qn('rank'),
+    }
+
+
+def _count_pairs(cursor, after, upto):
+    """Add the pairs of orders with after < id <= upto to the matrix."""
+    t = _tables()
+    cursor.execute(
+        f"INSERT INTO {t['pairs']} (product_id, other_id, orders) "
+        f"SELECT a.product_id, b.product_id, COUNT(DISTINCT a.order_id) "
+        f"FROM {t['items']} a JOIN {t['items']} b "
+        f"ON b.order_id = a.order_id AND b.product_id <> a.product_id "
+        f"WHERE a.order_id > %s AND a.order_id <= %s "
+        f"GROUP BY a.product_id, b.product_id "
+        f"ON CONFLICT (product_id, other_id) DO UPDATE SET orders = {t['pairs']}.orders + excluded.orders",
+        [after, upto],
+    )
+
+
+def _rank(cursor, top_k, after=None, upto=None):
+    """
+    Recompute the top k of the products ordered in after < id <= upto
+    (of every product when no range is given).
+    """
+    t = _tables()
+    where, params = '', []
+    if after is not None:
+        where = (f"WHERE product_id IN (SELECT product_id FROM {t['items']} "
+                 f"WHERE order_id > %s AND order_id <= %s)")
+        params = [after, upto]
+    cursor.execute(f"DELETE FROM {t['recommendations']} {where}", params)
+    cursor.execute(
+        f"INSERT INTO {t['recommendations']} (product_id, related_id, {t['rank']}, orders) "
+        f"SELECT product_id, other_id, position, orders FROM ("
+        f"  SELECT product_id, other_id, orders, "
+        f"  ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY orders DESC, other_id) AS position "
+        f"  FROM {t['pairs']} {where}"
+        f") WHERE position <= %s",
+        params + [top_k],
+    )
+
+
+def _state():
+    state, _ = RecommendationState.objects.get_or_create(pk=1)
+    return state
+
+
+def _save_state(last_order_id):
+    RecommendationState.objects.update_or_create(
+        pk=1, defaults={'last_order_id': last_order_id, 'updated_at': timezone.now()},
+    )
+
+
+@retry_on_lock
+def rebuild(top_k=TOP_K):
+    """Recompute the matrix and the recommendations from every order. Returns (pairs, recommendations)."""
+    last_order_id = Order.objects.aggregate(last=Max('id'))['last'] or 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        CoPurchase.objects.all().delete()
+        _count_pairs(cursor, 0, last_order_id)
+        _rank(cursor, top_k)
+        _save_state(last_order_id)
+    return CoPurchase.objects.count(), Recommendation.objects.count()
+
+
+@retry_on_lock
+def _update_batch(batch_size, top_k):
+    """Fold in up to `batch_size` orders after the watermark; returns how many."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Read under the write lock (IMMEDIATE transactions, see settings),
+        # so two concurrent updates can't fold in the same orders
+        after = _state().last_order_id
+        ids = list(Order.objects.filter(id__gt=after).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        _count_pairs(cursor, after, ids[-1])
+        _rank(cursor, top_k, after, ids[-1])
+        _save_state(ids[-1])
+    return len(ids)
+
+
+@task(max_attempts=3)
+def update(batch_size=UPDATE_BATCH_SIZE, top_k=TOP_K):
+    """Fold in the orders placed since the last run. Returns the number of orders read."""
+    total = 0
+    while count := _update_batch(batch_size, top_k):
+        total += count
+    return total
+
+
+def schedule_update():
+    """
+    Queue an update() that will see the orders committed so far (called
+    after each checkout).
+
+    At most one update is queued or running under the 'recommendations'
+    key. A queued one will read the new order. A running one may already be
+    past it and is about to finish, so one follow-up is queued after it.
+    """
+    if not enqueue(update, key='recommendations'):
+        enqueue(update, key='recommendations:follow-up', delay=FOLLOW_UP_DELAY)
+
+
+def for_product(product_id, limit=SHOWN):
+    """Queryset of the in-stock recommendations of a product, best first (category loaded)."""
+    return Recommendation.objects.filter(product_id=product_id, related__stock__gt=0).select_related(
+        'related__category',
+    ).order_by('rank')[:limit]
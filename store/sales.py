@@ -0,0 +1,277 @@
+"""
+Daily sales rollups.
+
+Revenue, units sold and order count are kept per day (DailySales), per day
+and product (ProductDailySales) and per day and category
+(CategoryDailySales), so the myadmin dashboard never has to scan orders.
+
+- record_order() adds a new order; checkout.place_order() calls it inside
+  the checkout transaction, so the rollups commit or roll back with it.
+- remove_orders() subtracts orders that are about to be deleted. Every
+  delete goes through it, from the orders page, the Django admin or a
+  cascade: signals.py calls order_deleted() on pre_delete of an Order.
+- line_deleted() subtracts an order line deleted without its order (a
+  product or category delete cascading to its lines, or a line deleted in
+  the Django admin); signals.py calls it on post_delete of an OrderItem.
+- rebuild() recomputes everything from Order/OrderItem
+  (`manage.py rebuild_sales`), e.g. after bulk SQL. Orders moved out by
+  order_archive (inside keep_history()) are not subtracted, so a rebuild
+  after an archive drops them from the history.
+
+Days are in the current time zone. A category's numbers use the product's
+category at the time of the sale (rebuild() uses the current one).
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .models import CategoryDailySales, DailySales, Order, OrderItem, Product, ProductDailySales
+
+LINE_REVENUE = ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+# model -> the key columns next to `day`
+ROLLUPS = {
+    DailySales: [],
+    ProductDailySales: ['product_id'],
+    CategoryDailySales: ['category_id'],
+}
+
+# The delete() in progress in this thread, see _deletion()
+_deleting = threading.local()
+
+
+def _add(model, rows):
+    """
+    Add {(day, *keys): [revenue, units, orders]} into `model` with one
+    INSERT ... ON CONFLICT DO UPDATE (a new row or an increment per key).
+    """
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    keys = ['day'] + ROLLUPS[model]
+    columns = keys + ['revenue', 'units', 'orders']
+    placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+
+    params = []
+    for key, (revenue, units, orders) in rows.items():
+        params += [connection.ops.adapt_datefield_value(key[0]), *key[1:],
+                   connection.ops.adapt_decimalfield_value(revenue, 14, 2), units, orders]
+
+    sql = (
+        f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) "
+        f"VALUES {', '.join([placeholders] * len(rows))} "
+        f"ON CONFLICT ({', '.join(qn(c) for c in keys)}) DO UPDATE SET "
+        + ', '.join(f"{qn(c)} = {table}.{qn(c)} + excluded.{qn(c)}" for c in ('revenue', 'units', 'orders'))
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def record_order(order, order_items):
+    """Add a just-placed order. `order_items` need .product loaded (for its category)."""
+    day = timezone.localdate(order.created_at)
+    units = sum(item.quantity for item in order_items)
+    products = defaultdict(lambda: [Decimal(0), 0, 0])
+    categories = defaultdict(lambda: [Decimal(0), 0, 0])
+
+    for item in order_items:
+        revenue = item.price * item.quantity
+        for totals in (products[(day, item.product_id)], categories[(day, item.product.category_id)]):
+            totals[0] += revenue
+            totals[1] += item.quantity
+    for totals in list(products.values()) + list(categories.values()):
+        totals[2] = 1
+
+    _add(DailySales, {(day,): [order.total_price, units, 1]})
+    _add(ProductDailySales, products)
+    _add(CategoryDailySales, categories)
+
+
+def _subtract(model, key_fields, deltas):
+    for values in deltas:
+        model.objects.filter(day=values['day'], **{f: values[f] for f in key_fields}).update(
+            revenue=F('revenue') - values['revenue'],
+            # Never below zero, even for orders placed before the rollups existed
+            units=Greatest(F('units') - values['units'], Value(0)),
+            orders=Greatest(F('orders') - values['orders'], Value(0)),
+        )
+
+
+def remove_orders(orders):
+    """Subtract the orders in the `orders` queryset. Call it in the deleting transaction, before the delete."""
+    items = OrderItem.objects.filter(order__in=orders).annotate(day=TruncDate('order__created_at'))
+    totals = dict(revenue=Sum(LINE_REVENUE), units=Sum('quantity'), orders=Count('order', distinct=True))
+
+    product_deltas = list(items.values('day', 'product_id').annotate(**totals).order_by())
+    category_deltas = list(items.values('day', category_id=F('product__category_id')).annotate(**totals).order_by())
+    day_units = defaultdict(int)
+    for values in product_deltas:
+        day_units[values['day']] += values['units']
+    day_deltas = [
+        {**values, 'units': day_units[values['day']]}
+        for values in orders.annotate(day=TruncDate('created_at')).values('day').annotate(
+            revenue=Sum('total_price'), orders=Count('id'),
+        ).order_by()
+    ]
+
+    with transaction.atomic():
+        _subtract(DailySales, [], day_deltas)
+        _subtract(ProductDailySales, ['product_id'], product_deltas)
+        _subtract(CategoryDailySales, ['category_id'], category_deltas)
+        for model in ROLLUPS:
+            model.objects.filter(orders=0).delete()
+
+
+@contextmanager
+def keep_history():
+    """Delete orders inside this block without subtracting them (order_archive moves them out)."""
+    previous = getattr(_deleting, 'keep', False)
+    _deleting.keep = True
+    try:
+        yield
+    finally:
+        _deleting.keep = previous
+
+
+def _deletion(origin):
+    """
+    State shared by the delete signals of one delete() call, told apart by
+    its `origin`: the orders it subtracts whole and the (model, key, order)
+    counts its lines already took off.
+    """
+    if getattr(_deleting, 'origin', None) is not origin:
+        _deleting.origin, _deleting.orders, _deleting.counted = origin, set(), set()
+    return _deleting
+
+
+def order_deleted(order, origin):
+    """Subtract `order` on its pre_delete, while its lines are still there."""
+    if getattr(_deleting, 'keep', False):
+        return
+    remove_orders(Order.objects.filter(pk=order.pk))
+    _deletion(origin).orders.add(order.pk)
+
+
+def line_deleted(item, origin):
+    """
+    Subtract the deleted order line `item` on its post_delete, unless its
+    order is being deleted too (order_deleted() took the whole order off).
+
+    The day keeps the order's total_price, as rebuild() does. The product
+    and category lose the order from their counts once no line of it is
+    left for them; the lines deleted by the same call are already gone,
+    and only the first of them counts.
+    """
+    if getattr(_deleting, 'keep', False):
+        return
+    deletion = _deletion(origin)
+    if item.order_id in deletion.orders:
+        return
+    created_at = Order.objects.filter(pk=item.order_id).values_list('created_at', flat=True).first()
+    category_id = Product.objects.filter(pk=item.product_id).values_list('category_id', flat=True).first()
+    if created_at is None:
+        return
+    day = timezone.localdate(created_at)
+    lines_left = OrderItem.objects.filter(order_id=item.order_id)
+    revenue = item.price * item.quantity
+
+    with transaction.atomic():
+        _subtract(DailySales, [], [{'day': day, 'revenue': 0, 'units': item.quantity, 'orders': 0}])
+        for model, field, key, lines in (
+            (ProductDailySales, 'product_id', item.product_id, lines_left.filter(product_id=item.product_id)),
+            (CategoryDailySales, 'category_id', category_id, lines_left.filter(product__category_id=category_id)),
+        ):
+            if key is None:
+                continue
+            counted = (model, key, item.order_id)
+            orders = 0
+            if counted not in deletion.counted and not lines.exists():
+                deletion.counted.add(counted)
+                orders = 1
+            _subtract(model, [field], [{'day': day, field: key, 'revenue': revenue, 'units': item.quantity,
+                                        'orders': orders}])
+            model.objects.filter(day=day, orders=0, **{field: key}).delete()
+
+
+def rebuild(batch_size=1000):
+    """Recompute every rollup from the orders. Returns {model name: rows written}."""
+    items = OrderItem.objects.annotate(day=TruncDate('order__created_at'))
+    totals = dict(revenue=Sum(LINE_REVENUE), units=Sum('quantity'), orders=Count('order', distinct=True))
+    counts = {}
+
+    with transaction.atomic():
+        for model in ROLLUPS:
+            model.objects.all().delete()
+
+        day_units = dict(
+            items.values('day').annotate(units=Sum('quantity')).order_by().values_list('day', 'units')
+        )
+        days = Order.objects.annotate(day=TruncDate('created_at')).values('day').annotate(
+            revenue=Sum('total_price'), orders=Count('id'),
+        ).order_by()
+        counts['DailySales'] = len(DailySales.objects.bulk_create(
+            [DailySales(units=day_units.get(values['day'], 0), **values) for values in days],
+            batch_size=batch_size,
+        ))
+
+        for model, rows in ((ProductDailySales, items.values('day', 'product_id')),
+                            (CategoryDailySales, items.values('day', category_id=F('product__category_id')))):
+            rows = rows.annotate(**totals).order_by()
+            batch, written = [], 0
+            for values in rows.iterator(chunk_size=batch_size):
+                batch.append(model(**values))
+                if len(batch) >= batch_size:
+                    written += len(model.objects.bulk_create(batch))
+                    batch = []
+            written += len(model.objects.bulk_create(batch))
+            counts[model.__name__] = written
+    return counts
+
+
+def dashboard(days=30, top=5):
+    """Numbers for the myadmin sales panel, read only from the rollups (four small queries)."""
+    today = timezone.localdate()
+    since = today - timedelta(days=days - 1)
+
+    def window(start):
+        condition = Q(day__gte=start)
+        return {
+            'revenue': Sum('revenue', filter=condition, default=0),
+            'units': Sum('units', filter=condition, default=0),
+            'orders': Sum('orders', filter=condition, default=0),
+        }
+
+    periods = {'today': today, 'week': today - timedelta(days=6), 'month': since}
+    summary = {}
+    for name, start in periods.items():
+        summary.update({f'{name}_{k}': v for k, v in window(start).items()})
+    summary = DailySales.objects.filter(day__gte=since).aggregate(**summary)
+
+    by_day = dict(DailySales.objects.filter(day__gte=today - timedelta(days=13)).values_list('day', 'revenue'))
+    daily = [(today - timedelta(days=n), by_day.get(today - timedelta(days=n), 0)) for n in range(13, -1, -1)]
+    peak = max((revenue for _, revenue in daily), default=0) or 1
+
+    def ranking(model, key_field, name_field):
+        return list(
+            model.objects.filter(day__gte=since).values(key_field, name=F(name_field))
+            .annotate(revenue=Sum('revenue'), units=Sum('units')).order_by('-revenue')[:top]
+        )
+
+    return {
+        'days': days,
+        'periods': [
+            (label, {k: summary[f'{name}_{k}'] for k in ('revenue', 'units', 'orders')})
+            for name, label in (('today', 'Today'), ('week', 'Last 7 days'), ('month', f'Last {days} days'))
+        ],
+        'daily': [{'day': day, 'revenue': revenue, 'percent': int(revenue * 100 / peak)} for day, revenue in daily],
+        'top_products': ranking(ProductDailySales, 'product_id', 'product__name'),
+        'top_categories': ranking(CategoryDailySales, 'category_id', 'category__name'),
+    }
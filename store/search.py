@@ -0,0 +1,134 @@
+"""
+Full-text product search backed by an SQLite FTS5 index.
+
+The `store_product_fts` table mirrors each product's name, description and
+category name (rowid = product id). SQLite triggers created in migration
+0008 keep it in sync on every insert/update/delete of a product or a
+category rename, so add_product, edit_product, delete_product and the
+Django admin never have to touch it themselves. Product updates that leave
+the name, description and category alone (price, stock) don't touch it
+(migration 0018). On SQLite most ALTERs rebuild the table and drop its
+triggers, so a migration that alters store_product or store_category must
+drop the triggers before and create them again after, with its own copy of
+their SQL (see 0010); migrations never import this module.
+
+Ranking cost: bm25() has to score every match before ORDER BY ... LIMIT can
+pick a page, about 1 microsecond per match. Measured on 100k products: a
+query matching 1.6k of them ranks in 1.5 ms, 16k in 16-20 ms and a very
+broad one (95k matches, e.g. a word in nearly every description) in
+110-120 ms. Bounding the candidates first (a LIMIT before the ORDER BY)
+would cap that, but it ranks whichever matches come first in rowid order,
+i.e. the oldest products, and drops the best ones of broad queries. So
+every match is ranked; only the page depth is bounded (MAX_RANKED).
+"""
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+FTS_TABLE = 'store_product_fts'
+
+# bm25() weights for (name, description, category): a hit in the name
+# counts far more than one buried in the description
+RANK_WEIGHTS = (10.0, 1.0, 5.0)
+
+# Results can be paged through this deep; later pages are empty. Every
+# match is still ranked (see the ranking cost above), so these are the best
+# MAX_RANKED of them.
+MAX_RANKED = 1000
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def rebuild_index():
+    """Refill the index from scratch, for repairs."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"""
+            INSERT INTO {FTS_TABLE} (rowid, name, description, category)
+            SELECT p.id, p.name, p.description, c.name
+            FROM store_product p JOIN store_category c ON c.id = p.category_id
+        """)
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so "air ma" matches
+    "Air Max" and user input can never inject FTS5 syntax.
+    """
+    words = re.findall(r'\w+', text)
+    return ' '.join('"%s"*' % word for word in words)
+
+
+def product_ids_matching_name(query):
+    """
+    Subquery of ids of products whose name matches `query`, for use in
+    `__in` filters on other tables (e.g. product__in=...). Unranked and
+    unlimited, evaluated inside the outer query.
+    """
+    if not fts_available():
+        return Product.objects.filter(name__icontains=query).values('id')
+
+    match = build_match_query(query)
+    if not match:
+        return Product.objects.none().values('id')
+    return RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+        ['name : (%s)' % match],
+    )
+
+
+def search_products(query, page=1, page_size=24):
+    """
+    Return (products, has_next) for one page of results, best match first.
+    Pages past MAX_RANKED results are empty.
+    """
+    offset = (page - 1) * page_size
+    if offset >= MAX_RANKED:
+        return [], False
+    # The page that reaches MAX_RANKED is the last one
+    limit = min(page_size + 1, MAX_RANKED - offset)
+
+    if not fts_available():
+        # Other databases: slow but correct fallback
+        results = Product.objects.select_related('category').filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        ).order_by('-id')
+        products = list(results[offset:offset + limit])
+        return products[:page_size], len(products) > page_size
+
+    match = build_match_query(query)
+    if not match:
+        return [], False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT rowid FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH %s
+            ORDER BY bm25({FTS_TABLE}, %s, %s, %s)
+            LIMIT %s OFFSET %s
+            """,
+            [match, *RANK_WEIGHTS, limit, offset],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+
+    has_next = len(ids) > page_size
+    ids = ids[:page_size]
+
+    # Load the matching products in one query and keep the ranking order
+    found = Product.objects.select_related('category').in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found], has_next
+
+
+# Raw cursors have no async API, so async views run the search in the
+# ORM's worker thread
+asearch_products = sync_to_async(search_products)
@@ -0,0 +1,83 @@
+from functools import partial
+
+from django.contrib.auth.signals import user_logged_in
+from django.db.backends.signals import connection_created
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autocomplete, sales
+from .cart_service import merge_session_cart
+from .metrics import count_queries
+from .models import Order, OrderItem, Product, Category
+from .order_history import invalidate_summary
+from .page_cache import bump_catalog_version
+from .sqlite import apply_pragmas
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_pages(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def update_suggestions(sender, instance, signal, **kwargs):
+    kind = 'products' if sender is Product else 'categories'
+    name = instance.name if signal is post_save else None
+    # pk is bound now: a deleted instance loses it before the commit
+    transaction.on_commit(partial(autocomplete.changed, kind, instance.pk, name))
+
+
+@receiver(post_delete, sender=Product)
+def touch_category_on_delete(sender, instance, **kwargs):
+    # A deleted product leaves no newer updated_at behind; touching its
+    # category changes the catalog validators (store/conditional.py)
+    Category.objects.filter(pk=instance.category_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Order)
+def invalidate_summary_on_order(sender, instance, created, **kwargs):
+    if created:
+        invalidate_summary(instance.user_id)
+
+
+@receiver(post_delete, sender=Order)
+def invalidate_summary_on_delete(sender, instance, **kwargs):
+    invalidate_summary(instance.user_id)
+
+
+@receiver(pre_delete, sender=Order)
+def subtract_deleted_order(sender, instance, origin, **kwargs):
+    sales.order_deleted(instance, origin)
+
+
+@receiver(post_delete, sender=OrderItem)
+def subtract_deleted_line(sender, instance, origin, **kwargs):
+    sales.line_deleted(instance, origin)
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    if request is not None:
+        merge_session_cart(request, user)
+
+
+@receiver(connection_created)
+def count_request_queries(sender, connection, **kwargs):
+    # On every connection rather than the request thread's only: under ASGI
+    # the queries run in sync_to_async threads (store/middleware/metrics.py)
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection)
@@ -0,0 +1,87 @@
+"""
+Production settings for SQLite.
+
+- apply_pragmas() runs the SQLITE_PRAGMAS from settings on every new
+  connection (wired to connection_created in signals.py). The defaults
+  turn on WAL, so readers never block the writer and the writer never
+  blocks readers, with synchronous=NORMAL (safe in WAL mode, one fsync per
+  checkpoint instead of per commit), a bigger page cache, memory-mapped
+  reads and a busy timeout.
+- retry_on_lock() re-runs a write transaction when SQLite still reports
+  "database is locked" after the busy timeout, with bounded exponential
+  backoff (SQLITE_LOCK_RETRIES attempts).
+
+Connections are kept between requests with CONN_MAX_AGE (see settings.py),
+so the pragmas are paid once per connection, not per request.
+"""
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+LOCK_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+# Largest INTEGER SQLite stores; bigger query parameters raise OverflowError
+MAX_INTEGER = 2 ** 63 - 1
+
+BACKOFF_BASE = 0.01  # seconds
+BACKOFF_MAX = 0.5
+
+
+def apply_pragmas(conn):
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if not pragmas:
+        return
+    journal_mode = pragmas.pop('journal_mode', None)
+    with conn.cursor() as cursor:
+        # busy_timeout first, so the rest can wait for locks
+        if 'busy_timeout' in pragmas:
+            cursor.execute(f"PRAGMA busy_timeout = {pragmas.pop('busy_timeout')}")
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+        # The journal mode is stored in the database file, so it normally
+        # only changes once. Switching needs every other connection closed;
+        # if some are open, keep the current mode and try again next time.
+        if journal_mode:
+            cursor.execute('PRAGMA journal_mode')
+            if cursor.fetchone()[0].lower() != str(journal_mode).lower():
+                try:
+                    cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+                except OperationalError as exc:
+                    if not is_lock_error(exc):
+                        raise
+                    logger.warning("Could not switch SQLite to journal_mode=%s: %s", journal_mode, exc)
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and any(m in str(exc).lower() for m in LOCK_MESSAGES)
+
+
+def retry_on_lock(func):
+    """
+    Retry `func` when it fails with a SQLite lock error.
+
+    `func` must be a whole unit of work (its own transaction or autocommit
+    statements), so re-running it is safe. Inside an outer atomic block
+    the error is raised at once, since the outer transaction is already
+    broken and only its owner can retry it.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        attempts = getattr(settings, 'SQLITE_LOCK_RETRIES', 0)
+        for attempt in range(attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if attempt == attempts or not is_lock_error(exc) or connection.in_atomic_block:
+                    raise
+            # Full jitter, so the waiting writers don't all come back together
+            time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+
+    return wrapper
@@ -0,0 +1,40 @@
+// Search box suggestions from /search/suggest/ (store/autocomplete.py)
+(function () {
+  const input = document.getElementById('search-q');
+  const list = document.getElementById('search-suggest');
+  if (!input || !list) return;
+  let timer, pending;
+
+  function show(data) {
+    const items = data.categories.map(function (c) { return [c, ' in categories']; })
+      .concat(data.products.map(function (p) { return [p, '']; }));
+    list.replaceChildren.apply(list, items.map(function (item) {
+      const li = document.createElement('li');
+      const a = document.createElement('a');
+      a.href = item[0].url;
+      a.textContent = item[0].name + item[1];
+      a.className = 'block px-4 py-2 hover:bg-red-700';
+      li.appendChild(a);
+      return li;
+    }));
+    list.classList.toggle('hidden', !items.length);
+  }
+
+  input.addEventListener('input', function () {
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+      if (pending) pending.abort();
+      if (!input.value.trim()) return show({ categories: [], products: [] });
+      pending = new AbortController();
+      fetch(input.dataset.url + '?q=' + encodeURIComponent(input.value), { signal: pending.signal })
+        .then(function (response) { return response.json(); })
+        .then(show)
+        .catch(function () {});
+    }, 80);
+  });
+
+  // Late enough for a click on a suggestion to land
+  input.addEventListener('blur', function () {
+    setTimeout(function () { list.classList.add('hidden'); }, 150);
+  });
+})();
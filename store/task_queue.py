@@ -0,0 +1,274 @@
+"""
+A durable task queue in the database, for work that shouldn't hold up a
+request. No broker: tasks are rows of the Task table.
+
+Declaring and queueing
+    @task(max_attempts=5, timeout=300)
+    def build_renditions(product_id, image_name): ...
+
+    enqueue(build_renditions, product.pk, product.image.name, key=...)
+
+    Arguments must be JSON serializable. enqueue() is one INSERT in the
+    caller's transaction, so the task only exists if the change that
+    asked for it commits. With a `key` it is idempotent: while a task
+    with that key is queued or running, enqueueing it again does nothing
+    (and returns False).
+
+Running
+    `manage.py run_workers` starts worker processes (TASK_WORKERS, one per
+    CPU by default). A worker claims the oldest due task with a
+    compare-and-set UPDATE, so two workers never get the same one, then
+    calls the function.
+
+    - Success: the task is done. Done tasks are deleted after
+      TASK_RETENTION_DAYS.
+    - An exception: it is queued again after an exponential backoff
+      (TASK_RETRY_BACKOFF * 2^(attempt - 1), at most TASK_RETRY_BACKOFF_MAX,
+      with jitter) until max_attempts, then left as failed with the
+      traceback in last_error.
+    - Visibility timeout: a claimed task is leased for `timeout` seconds.
+      If its worker dies, another worker picks it up once the lease has
+      run out. Tasks should therefore be safe to run twice.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+from .sqlite import retry_on_lock
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+TIMEOUT = 300  # seconds
+
+RETRY_BACKOFF = 10  # seconds before the first retry
+RETRY_BACKOFF_MAX = 60 * 60
+RETENTION_DAYS = 7
+
+POLL_INTERVAL = 1.0  # seconds between looks at an empty queue
+SWEEP_INTERVAL = 60  # seconds between clean-ups of expired leases and old tasks
+
+# Due tasks looked at per claim; another worker may win some of them
+CLAIM_CANDIDATES = 5
+
+_registry = {}
+
+
+class UnknownTask(Exception):
+    """A task row names a function that isn't a registered task."""
+
+
+def task(max_attempts=MAX_ATTEMPTS, timeout=TIMEOUT):
+    """Register the decorated function as a task; it can still be called directly."""
+    def decorator(func):
+        func.task_name = f'{func.__module__}.{func.__qualname__}'
+        func.task_options = {'max_attempts': max_attempts, 'timeout': timeout}
+        _registry[func.task_name] = func
+        return func
+
+    return decorator
+
+
+def enqueue(func, *args, key=None, delay=0):
+    """
+    Queue `func(*args)` to run in a worker, `delay` seconds from now at the
+    earliest. Returns False if a task with the same key is already waiting.
+    """
+    if getattr(func, 'task_name', None) not in _registry:
+        raise UnknownTask(f"{func!r} is not a @task.")
+    now = timezone.now()
+    ops = connection.ops
+    values = {
+        'name': func.task_name,
+        'args': json.dumps(list(args)),
+        'key': key,
+        'status': Task.QUEUED,
+        'attempts': 0,
+        'max_attempts': func.task_options['max_attempts'],
+        'timeout': func.task_options['timeout'],
+        'run_after': ops.adapt_datetimefield_value(now + timedelta(seconds=delay)),
+        'last_error': '',
+        'created_at': ops.adapt_datetimefield_value(now),
+    }
+    qn = ops.quote_name
+    # ON CONFLICT DO NOTHING skips the insert when the key is taken
+    # (unique_pending_task_key); the row count tells which happened
+    sql = (
+        f"INSERT INTO {qn(Task._meta.db_table)} ({', '.join(qn(c) for c in values)}) "
+        f"VALUES ({', '.join(['%s'] * len(values))}) ON CONFLICT DO NOTHING"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(values.values()))
+        return cursor.rowcount == 1
+
+
+def _backoff(attempt):
+    delay = min(getattr(settings, 'TASK_RETRY_BACKOFF_MAX', RETRY_BACKOFF_MAX),
+                getattr(settings, 'TASK_RETRY_BACKOFF', RETRY_BACKOFF) * 2 ** (attempt - 1))
+    # Half fixed, half random, so failing tasks don't all come back together
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _claimable(now):
+    return Q(status=Task.QUEUED, run_after__lte=now) | Q(
+        status=Task.RUNNING, locked_until__lt=now, attempts__lt=F('max_attempts'),
+    )
+
+
+@retry_on_lock
+def claim():
+    """Lease the next due task to this worker; None if there is nothing to do."""
+    now = timezone.now()
+    candidates = Task.objects.filter(_claimable(now)).order_by('run_after', 'pk').only(
+        'name', 'args', 'status', 'attempts', 'max_attempts', 'timeout',
+    )[:CLAIM_CANDIDATES]
+    for candidate in candidates:
+        lease = now + timedelta(seconds=candidate.timeout)
+        # Only one worker's UPDATE can match the status and attempts it read
+        claimed = Task.objects.filter(
+            pk=candidate.pk, status=candidate.status, attempts=candidate.attempts,
+        ).update(status=Task.RUNNING, attempts=candidate.attempts + 1, locked_until=lease)
+        if claimed:
+            candidate.status, candidate.attempts, candidate.locked_until = Task.RUNNING, candidate.attempts + 1, lease
+            return candidate
+    return None
+
+
+@retry_on_lock
+def _finish(task_row, **fields):
+    # Matches nothing if the lease ran out and another worker took the task
+    updated = Task.objects.filter(pk=task_row.pk, status=Task.RUNNING, attempts=task_row.attempts).update(**fields)
+    if not updated:
+        logger.warning("Task %s (%s) finished after its lease ran out", task_row.pk, task_row.name)
+
+
+def run(task_row):
+    """Run a claimed task and record the outcome. Returns True if it succeeded."""
+    try:
+        func = _registry.get(task_row.name)
+        if func is None:
+            # Registered when its module is imported
+            import_string(task_row.name)
+            func = _registry.get(task_row.name)
+        if func is None:
+            raise UnknownTask(f"{task_row.name} is not a @task.")
+    except (ImportError, UnknownTask):
+        logger.error("Unknown task %s (%s)", task_row.pk, task_row.name)
+        _finish(task_row, status=Task.FAILED, finished_at=timezone.now(), locked_until=None,
+                last_error=traceback.format_exc())
+        return False
+
+    try:
+        func(*task_row.args)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if task_row.attempts >= task_row.max_attempts:
+            logger.error("Task %s (%s) failed for good:\n%s", task_row.pk, task_row.name, error)
+            _finish(task_row, status=Task.FAILED, finished_at=now, locked_until=None, last_error=error)
+        else:
+            logger.warning("Task %s (%s) failed, will retry:\n%s", task_row.pk, task_row.name, error)
+            _finish(task_row, status=Task.QUEUED, locked_until=None, last_error=error,
+                    run_after=now + timedelta(seconds=_backoff(task_row.attempts)))
+        return False
+
+    _finish(task_row, status=Task.DONE, finished_at=timezone.now(), locked_until=None)
+    return True
+
+
+@retry_on_lock
+def sweep():
+    """Fail tasks whose last lease ran out and delete old done tasks."""
+    now = timezone.now()
+    Task.objects.filter(status=Task.RUNNING, locked_until__lt=now, attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, finished_at=now, locked_until=None,
+        last_error="The worker didn't finish it within its visibility timeout.",
+    )
+    retention = timedelta(days=getattr(settings, 'TASK_RETENTION_DAYS', RETENTION_DAYS))
+    Task.objects.filter(status=Task.DONE, finished_at__lt=now - retention).delete()
+
+
+def work(stop=None, burst=False, poll=POLL_INTERVAL):
+    """
+    Run tasks until `stop` (a threading/multiprocessing Event) is set, or,
+    with `burst`, until no task is due. Returns the number of tasks run.
+    """
+    processed = 0
+    last_sweep = None
+    while not (stop and stop.is_set()):
+        close_old_connections()
+        if last_sweep is None or time.monotonic() - last_sweep > SWEEP_INTERVAL:
+            sweep()
+            last_sweep = time.monotonic()
+
+        task_row = claim()
+        if task_row is None:
+            if burst:
+                break
+            if stop:
+                stop.wait(poll)
+            else:
+                time.sleep(poll)
+            continue
+        run(task_row)
+        processed += 1
+    close_old_connections()
+    return processed
+
+
+def _worker_main(stop, burst, poll):
+    # The parent handles Ctrl-C and SIGTERM by setting `stop`; the running
+    # task is finished first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    work(stop, burst, poll)
+
+
+def run_workers(processes=None, burst=False, poll=POLL_INTERVAL):
+    """
+    Run `processes` workers (TASK_WORKERS or one per CPU) until SIGINT or
+    SIGTERM, or, with `burst`, until the queue is empty. Worker processes
+    that die are replaced. One process runs in this one.
+    """
+    processes = processes or getattr(settings, 'TASK_WORKERS', None) or os.cpu_count() or 1
+    if processes == 1:
+        return work(burst=burst, poll=poll)
+
+    # Forked workers inherit the loaded project; they must not share its DB connections
+    context = multiprocessing.get_context('fork')
+    stop = context.Event()
+    connections.close_all()
+
+    def start(number):
+        process = context.Process(target=_worker_main, args=(stop, burst, poll), name=f'task-worker-{number}')
+        process.start()
+        return process
+
+    previous = {sig: signal.signal(sig, lambda signum, frame: stop.set()) for sig in (signal.SIGINT, signal.SIGTERM)}
+    pool = [start(number) for number in range(processes)]
+    try:
+        while not stop.is_set() and any(p.is_alive() for p in pool):
+            for number, process in enumerate(pool):
+                if not burst and not process.is_alive():
+                    logger.warning("Task worker %s exited with %s, restarting it", process.name, process.exitcode)
+                    pool[number] = start(number)
+            stop.wait(1)
+    finally:
+        stop.set()
+        for process in pool:
+            process.join()
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
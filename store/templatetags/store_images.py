@@ -0,0 +1,52 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from ..images import RENDITION_FORMATS, RENDITION_WIDTHS, rendition_name
+
+register = template.Library()
+
+
+def _srcset(image_name, ext):
+    return ', '.join(
+        f'{default_storage.url(rendition_name(image_name, width, ext))} {width}w'
+        for width in RENDITION_WIDTHS
+    )
+
+
+@register.simple_tag
+def product_image(product, sizes='100vw', css_class='', width=240):
+    """
+    Render the product's image as a <picture> with a WebP srcset and a JPEG
+    fallback, letting the browser pick the smallest file that fits `sizes`.
+
+    Usage: {% product_image product sizes="56px" css_class="w-14 h-14" %}
+
+    `width` picks the rendition used as the plain <img src> for browsers
+    without srcset support. Products whose renditions are not built yet
+    get a plain <img> of the original.
+    """
+    if not product.image:
+        return ''
+
+    if not product.has_renditions:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy">',
+            product.image.url, product.name, css_class,
+        )
+
+    name = product.image.name
+    *sources, (fallback_ext, _, _) = RENDITION_FORMATS
+
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy"></picture>',
+        format_html_join(
+            '', '<source type="{}" srcset="{}" sizes="{}">',
+            ((mime, _srcset(name, ext), sizes) for ext, _, mime in sources),
+        ),
+        default_storage.url(rendition_name(name, width, fallback_ext)),
+        _srcset(name, fallback_ext),
+        sizes,
+        product.name,
+        css_class,
+    )
@@ -1,3 +1,1364 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from asyncio import iscoroutinefunction
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.signed_cookies import SessionStore as SignedCookieSession
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections, transaction
+from django.http import QueryDict
+from django.middleware.csrf import _get_new_csrf_string
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import (
+    autocomplete, bulk_actions, cart_service, catalog_io, facets, images, metrics, order_archive, order_export,
+    order_history, recommendations, sales, search, task_queue,
+)
+from .benchmarks import admin_client, find_regressions, load_baseline, run_suite
+from .cache import FileBasedCache
+from .checkout import place_order
+from .conditional import product_state
+from .models import (
+    CartItem, Category, CategoryDailySales, DailySales, Order, OrderItem, Product, ProductDailySales, Recommendation,
+    Task,
+)
+from .page_cache import bump_catalog_version, catalog_version
+from .sqlite import retry_on_lock
+from .task_queue import task
+from .views import _filtered_orders
+
+
+def make_product(category, stock, price=100, name='Runner'):
+    return Product.objects.create(
+        name=name, category=category, price=price, description='', image='shoes/test.jpg', stock=stock
+    )
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        self.category = Category.objects.create(name='Running')
+
+    def test_order_takes_stock_and_totals_lines(self):
+        a = make_product(self.category, stock=5, price=100, name='A')
+        b = make_product(self.category, stock=2, price=250, name='B')
+
+        order, items, out_of_stock = place_order(self.user, {a.id: 2, b.id: 1})
+
+        self.assertEqual(out_of_stock, [])
+        self.assertEqual(order.total_price, 450)
+        self.assertEqual(len(items), 2)
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.stock, b.stock), (3, 1))
+
+    def test_short_line_rolls_back_whole_order(self):
+        a = make_product(self.category, stock=5, name='A')
+        b = make_product(self.category, stock=1, name='B')
+
+        order, items, out_of_stock = place_order(self.user, {a.id: 2, b.id: 3})
+
+        self.assertIsNone(order)
+        self.assertEqual(
+            [(line['product'].id, line['requested'], line['available']) for line in out_of_stock],
+            [(b.id, 3, 1)],
+        )
+        a.refresh_from_db()
+        self.assertEqual(a.stock, 5)
+        self.assertFalse(Order.objects.exists())
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 20
+    stock = 7
+
+    def test_parallel_buyers_never_oversell(self):
+        category = Category.objects.create(name='Limited')
+        product = make_product(category, stock=self.stock)
+        users = [User.objects.create_user(f'buyer{i}') for i in range(self.buyers)]
+        results = []
+        start = threading.Barrier(self.buyers)
+
+        def buy(user):
+            start.wait(timeout=30)
+            try:
+                order, _, _ = place_order(user, {product.id: 1})
+                results.append(order is not None)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(len(results), self.buyers)
+        self.assertEqual(results.count(True), self.stock)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), self.stock)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SessionIsolationStressTests(TransactionTestCase):
+    workers = 8
+    rounds = 15
+
+    def welcome(self, username):
+        return f'Welcome, <span class="font-semibold text-red-400">{username}</span>'.encode()
+
+    def test_admin_and_shopper_sessions_never_cross(self):
+        failures = []
+        start = threading.Barrier(self.workers)
+
+        def shopper(name):
+            client = Client()
+            client.post('/login/', {'username': name, 'password': 'pw'})
+            start.wait(timeout=30)
+            for _ in range(self.rounds):
+                if self.welcome(name) not in client.get('/cart/').content:
+                    failures.append(f'{name} lost their shop session')
+                if client.get('/myadmin/').status_code == 200:
+                    failures.append(f'{name} reached the admin')
+            if 'admin_sessionid' in client.cookies:
+                failures.append(f'{name} got an admin cookie')
+
+        def admin(name):
+            client = Client()
+            client.post('/admin-login/', {'username': name, 'password': 'pw'})
+            start.wait(timeout=30)
+            for _ in range(self.rounds):
+                if client.get('/myadmin/').status_code != 200:
+                    failures.append(f'{name} lost their admin session')
+                if b'Welcome,' in client.get('/cart/').content:
+                    failures.append(f'{name} is logged in on the shop side')
+            if 'sessionid' in client.cookies and client.cookies['sessionid'].value:
+                failures.append(f'{name} got a shop session cookie')
+
+        threads = []
+        for i in range(self.workers):
+            name = f'person{i}'
+            is_admin = i % 2 == 0
+            User.objects.create_user(name, password='pw', is_staff=is_admin)
+            threads.append(threading.Thread(target=self.run_and_close, args=(admin if is_admin else shopper, name)))
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failures, [])
+
+    @staticmethod
+    def run_and_close(target, name):
+        try:
+            target(name)
+        finally:
+            connection.close()
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CartServiceTests(TestCase):
+    """store/cart_service.py: CartItem rows for shoppers, the session cart for visitors."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('shopper', password='pw')
+        category = Category.objects.create(name='Running')
+        self.a = make_product(category, stock=10, price=100, name='A')
+        self.b = make_product(category, stock=10, price=250, name='B')
+
+    def cart_request(self, user=None):
+        request = RequestFactory().get('/cart/')
+        request.user = user or AnonymousUser()
+        request.session = SignedCookieSession()
+        return request
+
+    def test_repeated_adds_update_one_line(self):
+        request = self.cart_request(self.user)
+        self.assertTrue(cart_service.add(request, self.a.pk))
+        with self.assertNumQueries(1):
+            cart_service.add(request, self.a.pk, 2)
+        cart_service.add(request, self.a.pk)
+
+        self.assertEqual(list(CartItem.objects.values_list('product_id', 'quantity')), [(self.a.pk, 4)])
+        self.assertFalse(cart_service.add(request, 999999))
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_totals_are_computed_in_the_database(self):
+        request = self.cart_request(self.user)
+        cart_service.add(request, self.a.pk, 3)
+        cart_service.add(request, self.b.pk)
+
+        with self.assertNumQueries(2):
+            lines, total = cart_service.contents(request)
+            self.assertEqual([(line.product.name, line.line_total) for line in lines], [('A', 300), ('B', 250)])
+        self.assertEqual(total, 550)
+        self.assertEqual(cart_service.contents(self.cart_request(User.objects.create_user('empty'))), ([], 0))
+
+    def test_quantity_changes(self):
+        request = self.cart_request(self.user)
+        cart_service.add(request, self.a.pk)
+        cart_service.add(request, self.b.pk)
+
+        with self.assertNumQueries(1):
+            cart_service.increase(request, self.a.pk)
+        with self.assertNumQueries(1):
+            cart_service.set_quantity(request, self.b.pk, 5)
+        self.assertEqual(cart_service.quantities(request), {self.a.pk: 2, self.b.pk: 5})
+
+        cart_service.decrease(request, self.a.pk)
+        cart_service.decrease(request, self.a.pk)
+        with self.assertNumQueries(1):
+            cart_service.set_quantity(request, self.b.pk, 0)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_logged_in_changes_leave_the_session_alone(self):
+        request = self.cart_request(self.user)
+        cart_service.add(request, self.a.pk)
+        cart_service.increase(request, self.a.pk)
+        cart_service.set_quantity(request, self.b.pk, 2)
+        cart_service.decrease(request, self.b.pk)
+        cart_service.remove(request, [self.a.pk])
+        cart_service.contents(request)
+
+        self.assertFalse(request.session.modified)
+        self.assertNotIn('cart', request.session)
+        self.assertEqual(cart_service.quantities(request), {self.b.pk: 1})
+
+    def test_anonymous_cart_lives_in_the_session(self):
+        request = self.cart_request()
+        with self.assertNumQueries(0):
+            cart_service.add(request, self.a.pk, 2)
+            cart_service.set_quantity(request, self.b.pk, 1)
+            cart_service.decrease(request, self.b.pk)
+        self.assertEqual(request.session['cart'], {str(self.a.pk): 2})
+        self.assertEqual(cart_service.contents(request)[1], 200)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_session_cart_is_merged_on_login(self):
+        cart_service.add(self.cart_request(self.user), self.a.pk)
+        client = Client()
+        client.get(f'/add-to-cart/{self.a.pk}/')
+        client.get(f'/add-to-cart/{self.a.pk}/')
+        client.get(f'/add-to-cart/{self.b.pk}/')
+
+        client.post('/login/', {'username': 'shopper', 'password': 'pw'})
+
+        self.assertEqual(
+            dict(CartItem.objects.filter(user=self.user).values_list('product_id', 'quantity')),
+            {self.a.pk: 3, self.b.pk: 1},
+        )
+        self.assertNotIn('cart', client.session)
+
+
+class SqliteTests(TransactionTestCase):
+    """store/sqlite.py: connection pragmas and the lock retry (outside TestCase's transaction)."""
+
+    def locked_then(self, failures, error='database is locked'):
+        calls = []
+
+        @retry_on_lock
+        def write():
+            calls.append(connection.in_atomic_block)
+            if len(calls) <= failures:
+                raise OperationalError(error)
+            return 'done'
+
+        return write, calls
+
+    def test_new_connections_use_wal(self):
+        conn = connections.create_connection('default')
+        self.addCleanup(conn.close)
+        with conn.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000})
+
+    @override_settings(SQLITE_LOCK_RETRIES=3)
+    @mock.patch('store.sqlite.time.sleep')
+    def test_lock_errors_are_retried(self, sleep):
+        write, calls = self.locked_then(2)
+        self.assertEqual(write(), 'done')
+        self.assertEqual(calls, [False] * 3)
+        self.assertEqual(sleep.call_count, 2)
+
+        write, calls = self.locked_then(10)
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            write()
+        self.assertEqual(len(calls), 4)
+
+    @override_settings(SQLITE_LOCK_RETRIES=3)
+    @mock.patch('store.sqlite.time.sleep')
+    def test_other_errors_and_atomic_blocks_are_not_retried(self, sleep):
+        write, calls = self.locked_then(1, error='no such table: store_product')
+        with self.assertRaisesMessage(OperationalError, 'no such table'):
+            write()
+        self.assertEqual(len(calls), 1)
+
+        write, calls = self.locked_then(1)
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            with transaction.atomic():
+                write()
+        self.assertEqual(calls, [True])
+        sleep.assert_not_called()
+
+
+class SearchTests(TestCase):
+    """store/search.py: ranking, paging and the triggers that keep the index in sync."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Running')
+
+    def names(self, query, page=1, page_size=10):
+        results, has_next = search.search_products(query, page, page_size)
+        return [p.name for p in results], has_next
+
+    def test_name_hits_rank_above_description_hits(self):
+        in_description = make_product(self.category, stock=1, name='Trail Shoe')
+        in_description.description = 'A light trail shoe for the weekend trail marathon'
+        in_description.save()
+        make_product(self.category, stock=1, name='Marathon Racer')
+
+        self.assertEqual(self.names('marathon')[0], ['Marathon Racer', 'Trail Shoe'])
+
+    def test_paging(self):
+        for i in range(5):
+            make_product(self.category, stock=1, name=f'Runner {i}')
+
+        first, has_next = self.names('runner', page_size=2)
+        self.assertEqual((len(first), has_next), (2, True))
+        last, has_next = self.names('runner', page=3, page_size=2)
+        self.assertEqual((len(last), has_next), (1, False))
+        self.assertEqual(len(set(first + self.names('runner', page=2, page_size=2)[0] + last)), 5)
+
+    def test_pages_past_max_ranked_are_empty(self):
+        make_product(self.category, stock=1)
+
+        self.assertEqual(self.names('runner', page=search.MAX_RANKED + 1, page_size=1), ([], False))
+        # Would overflow SQLite's OFFSET
+        self.assertEqual(self.names('runner', page=10 ** 20), ([], False))
+        response = self.client.get('/search/', {'q': 'runner', 'page': 10 ** 20})
+        self.assertEqual(response.status_code, 200)
+
+    def test_index_follows_product_and_category_changes(self):
+        product = make_product(self.category, stock=1, name='Air Zoom')
+
+        product.name = 'Cloud Glide'
+        product.save()
+        self.assertEqual(self.names('zoom')[0], [])
+        self.assertEqual(self.names('cloud')[0], ['Cloud Glide'])
+
+        self.category.name = 'Trail'
+        self.category.save()
+        self.assertEqual(self.names('trail')[0], ['Cloud Glide'])
+
+        Product.objects.filter(pk=product.pk).update(category=Category.objects.create(name='Tennis'))
+        self.assertEqual(self.names('trail')[0], [])
+        self.assertEqual(self.names('tennis')[0], ['Cloud Glide'])
+
+        product.delete()
+        self.assertEqual(self.names('cloud')[0], [])
+
+    def test_stock_updates_leave_the_index_alone(self):
+        product = make_product(self.category, stock=1)
+
+        def changes(**fields):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT total_changes()')
+                before = cursor.fetchone()[0]
+                Product.objects.filter(pk=product.pk).update(**fields)
+                cursor.execute('SELECT total_changes()')
+                return cursor.fetchone()[0] - before
+
+        # total_changes() counts the rows trigger bodies change as well
+        self.assertEqual(changes(stock=5), 1)
+        self.assertGreater(changes(name='Racer'), 1)
+
+
+class FacetTests(TestCase):
+    """store/facets.py: filters and the counts next to each option."""
+
+    def setUp(self):
+        self.running = Category.objects.create(name='Running')
+        self.tennis = Category.objects.create(name='Tennis')
+        make_product(self.running, stock=3, price=800, name='Cheap Runner')
+        make_product(self.running, stock=0, price=3000, name='Sold Out Runner')
+        make_product(self.tennis, stock=1, price=3000, name='Court Pro')
+
+    def select(self, **params):
+        query = QueryDict(mutable=True)
+        query.update(params)
+        return query, facets.parse_facets(query)
+
+    def test_filters(self):
+        def names(**params):
+            products = facets.filter_products(Product.objects.all(), self.select(**params)[1])
+            return sorted(products.values_list('name', flat=True))
+
+        self.assertEqual(names(category=str(self.running.pk)), ['Cheap Runner', 'Sold Out Runner'])
+        self.assertEqual(names(price='2500-5000', in_stock='1'), ['Court Pro'])
+        # Invalid values are ignored, including ids SQLite can't hold
+        self.assertEqual(len(names(category='shoes', price='free')), 3)
+        self.assertEqual(len(names(category=str(10 ** 20))), 3)
+        self.assertEqual(self.client.get('/', {'category': 10 ** 20}).status_code, 200)
+
+    def test_counts_apply_the_other_facets(self):
+        cache.clear()
+        with self.assertNumQueries(1):
+            rows, names = facets.counts()
+        params, selected = self.select(category=str(self.running.pk), in_stock='1')
+        built = facets.build(params, selected, rows, names)
+
+        self.assertEqual(built['total'], 1)
+        self.assertEqual([(o['label'], o['count']) for o in built['categories']], [('Running', 1), ('Tennis', 1)])
+        self.assertEqual({o['label']: o['count'] for o in built['price_bands']}['Under ₱1,000'], 1)
+        self.assertEqual({o['label']: o['count'] for o in built['price_bands']}['₱2,500 – ₱5,000'], 0)
+        self.assertEqual(built['in_stock']['count'], 1)
+        self.assertEqual(facets.build(params, self.select()[1], rows, names)['total'], 3)
+
+
+class OrderArchiveTests(TestCase):
+    """store/order_archive.py: an interrupted run is finished by the next one."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        settings = override_settings(ORDER_ARCHIVE_DIR=self.dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        user = User.objects.create_user('buyer')
+        product = make_product(Category.objects.create(name='Running'), stock=5)
+        for _ in range(5):
+            order = Order.objects.create(user=user, total_price=100)
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=100)
+        Order.objects.update(created_at=timezone.now() - timedelta(days=30))
+        self.cutoff = timezone.localdate()
+        self.path = order_archive.archive_path(self.cutoff)
+
+    def archived_ids(self):
+        return sorted(order['order_id'] for order in order_archive.read_archive(self.path))
+
+    def test_resume_after_interrupted_batch(self):
+        ids = sorted(Order.objects.values_list('pk', flat=True))
+        delete_batch = order_archive._delete_batch
+
+        def die_on_second_batch(batch):
+            if batch != ids[:2]:
+                raise RuntimeError('killed')
+            delete_batch(batch)
+
+        # The second batch is written to the archive, then the run dies before deleting it
+        with mock.patch.object(order_archive, '_delete_batch', die_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                order_archive.archive_orders(self.cutoff, batch_size=2, pause=0)
+        self.assertTrue(os.path.exists(self.path + '.pending'))
+
+        result = order_archive.archive_orders(self.cutoff, batch_size=2, pause=0)
+
+        self.assertIn('discarded', result.recovered)
+        self.assertFalse(os.path.exists(self.path + '.pending'))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.archived_ids(), ids)
+
+    def test_resume_when_the_archive_was_never_written(self):
+        ids = sorted(Order.objects.values_list('pk', flat=True))
+        with open(self.path + '.pending', 'w') as f:
+            json.dump({'offset': 0, 'ids': ids[:2]}, f)
+
+        result = order_archive.archive_orders(self.cutoff, batch_size=2, pause=0)
+
+        self.assertIn('discarded', result.recovered)
+        self.assertEqual(self.archived_ids(), ids)
+
+    def test_command_rejects_bad_dates(self):
+        for before in ('2024-13-45', 'last week'):
+            with self.assertRaisesMessage(CommandError, '--before must be a date'):
+                call_command('archive_orders', before=before, stdout=io.StringIO())
+        self.assertEqual(Order.objects.count(), 5)
+
+        out = io.StringIO()
+        call_command('archive_orders', before=self.cutoff.isoformat(), dry_run=True, stdout=out)
+        self.assertIn('5 order(s)', out.getvalue())
+
+
+class RenditionTests(TestCase):
+    def test_replaced_image_is_not_marked_ready(self):
+        category = Category.objects.create(name='Running')
+        kept, replaced = make_product(category, stock=1, name='A'), make_product(category, stock=1, name='B')
+        Product.objects.filter(pk=replaced.pk).update(image='shoes/new.jpg')
+
+        images.mark_ready([(kept.pk, 'shoes/test.jpg'), (replaced.pk, 'shoes/test.jpg')])
+
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'has_renditions')), {'A': True, 'B': False},
+        )
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class PageCacheTests(TestCase):
+    """store/page_cache.py: anonymous pages are cached until the catalog changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Running')
+        self.product = make_product(self.category, stock=5)
+        self.client.cookies['csrftoken'] = _get_new_csrf_string()
+
+    def cache_status(self, client=None):
+        return (client or self.client).get('/').headers.get('X-Page-Cache')
+
+    def test_second_visit_is_a_hit(self):
+        self.assertEqual(self.cache_status(), 'MISS')
+        # Only the validator (store/conditional.py) is read
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache_status(), 'HIT')
+
+    def test_catalog_changes_invalidate(self):
+        for change in (self.product.save, self.category.save, bump_catalog_version):
+            self.cache_status()
+            self.assertEqual(self.cache_status(), 'HIT')
+            change()
+            self.assertEqual(self.cache_status(), 'MISS', change)
+
+    def test_bypassed_without_csrf_cookie_or_when_logged_in(self):
+        self.assertIsNone(self.cache_status(Client()))
+
+        self.client.force_login(User.objects.create_user('shopper'))
+        self.cache_status()
+        self.assertIsNone(self.cache_status())
+
+
+class ConditionalGetTests(TestCase):
+    """store/conditional.py: 304s while the validators match, new ones after a change."""
+
+    def setUp(self):
+        self.product = make_product(Category.objects.create(name='Running'), stock=5)
+        self.url = f'/product/{self.product.pk}/'
+        # The ETag covers the CSRF cookie, which the first page sets
+        self.client.get(self.url)
+
+    def test_if_none_match(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get('/')['Last-Modified']
+        self.assertEqual(self.client.get('/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        # Not sent to logged-in users, whose pages differ
+        self.client.force_login(User.objects.create_user('shopper'))
+        response = self.client.get('/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_saving_the_product_changes_the_validator(self):
+        etag = self.client.get(self.url)['ETag']
+        self.product.price = 120
+        self.product.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class CatalogImportExportTests(TestCase):
+    """store/catalog_io.py: exports import back unchanged; bad rows are reported and skipped."""
+
+    def catalog(self):
+        return sorted(Product.objects.values_list('name', 'category__name', 'price', 'description', 'image', 'stock'))
+
+    def test_export_then_import_round_trip(self):
+        running, tennis = Category.objects.create(name='Running'), Category.objects.create(name='Tennis')
+        for category, name, price, stock in ((running, 'Runner', '1499.50', 3), (tennis, 'Court, "Pro"', '2500', 0)):
+            product = make_product(category, stock=stock, price=price, name=name)
+            product.description = 'Line one\nline two'
+            product.save()
+        expected = self.catalog()
+
+        for fmt in ('csv', 'jsonl'):
+            exported = io.StringIO()
+            self.assertEqual(catalog_io.write_rows(catalog_io.export_rows(), exported, fmt), 2)
+            Product.objects.all().delete()
+            Category.objects.filter(name='Tennis').delete()
+
+            exported.seek(0)
+            result = catalog_io.import_products(catalog_io.read_rows(exported, fmt))
+            self.assertEqual((result.created, result.errors, result.categories_created), (2, 0, 1), fmt)
+            self.assertEqual(self.catalog(), expected, fmt)
+
+    def test_malformed_rows_are_skipped(self):
+        rows = io.StringIO(
+            '{"name": "Good", "category": "Running", "price": "100", "description": "ok", "image": "a.jpg"}\n'
+            '{"name": "Bad price", "category": "Running", "price": "cheap", "description": "x", "image": "a.jpg"}\n'
+            '{"name": "Bad stock", "category": "Running", "price": "1", "description": "x", "image": "a.jpg", '
+            '"stock": -1}\n'
+            '{"category": "Running", "price": "1", "description": "no name", "image": "a.jpg"}\n'
+            '{"name": "Too dear", "category": "Running", "price": "1e12", "description": "x", "image": "a.jpg"}\n'
+            '["not", "an", "object"]\n'
+            '{not json\n'
+        )
+        errors = []
+        result = catalog_io.import_products(
+            catalog_io.read_rows(rows, 'jsonl'), on_error=lambda line, row, message: errors.append((line, message)),
+        )
+
+        self.assertEqual((result.rows, result.created, result.errors), (7, 1, 6))
+        self.assertEqual([line for line, _ in errors], [2, 3, 4, 5, 6, 7])
+        self.assertIn('price', errors[0][1])
+        self.assertIn('name is required', errors[2][1])
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Good'])
+
+
+class OrderExportTests(TestCase):
+    """store/order_export.py: every order line once, across chunk boundaries."""
+
+    def test_csv_and_jsonl_cover_every_line(self):
+        user = User.objects.create_user('buyer')
+        a, b = (make_product(Category.objects.create(name='Running'), stock=5, name=name) for name in 'AB')
+        for lines in ([a], [a, b], [], [b]):
+            order = Order.objects.create(user=user, total_price=100 * len(lines))
+            for product in lines:
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=100)
+        orders = Order.objects.all()
+
+        rows = list(csv.reader(io.StringIO(''.join(order_export.csv_lines(orders, chunk_size=2)))))
+        self.assertEqual(rows[0], order_export.CSV_HEADER)
+        # Four lines, plus one row with blank item columns for the empty order
+        self.assertEqual([row[5] for row in rows[1:]], ['B', '', 'A', 'B', 'A'])
+
+        exported = [json.loads(line) for line in order_export.jsonl_lines(orders, chunk_size=2)]
+        self.assertEqual([len(order['items']) for order in exported], [1, 0, 2, 1])
+        self.assertEqual({order['username'] for order in exported}, {'buyer'})
+
+
+class SalesRollupTests(TestCase):
+    """store/sales.py: rollups match the orders however often they are recomputed."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        category = Category.objects.create(name='Running')
+        self.a = make_product(category, stock=10, price=100, name='A')
+        self.b = make_product(category, stock=10, price=250, name='B')
+
+    def rollups(self):
+        return [
+            sorted(model.objects.values_list(*['day', *keys, 'revenue', 'units', 'orders']))
+            for model, keys in sales.ROLLUPS.items()
+        ]
+
+    def test_rebuild_twice_does_not_double_count(self):
+        place_order(self.user, {self.a.id: 2, self.b.id: 1})
+        place_order(self.user, {self.a.id: 1})
+        recorded = self.rollups()
+        self.assertEqual(DailySales.objects.get().orders, 2)
+
+        sales.rebuild()
+        self.assertEqual(self.rollups(), recorded)
+        sales.rebuild()
+        self.assertEqual(self.rollups(), recorded)
+
+        self.assertEqual(DailySales.objects.values_list('revenue', 'units', 'orders').get(), (550, 4, 2))
+        self.assertEqual(ProductDailySales.objects.get(product=self.a).units, 3)
+        self.assertEqual(CategoryDailySales.objects.get().orders, 2)
+
+    def test_removed_orders_match_a_rebuild(self):
+        first, _, _ = place_order(self.user, {self.a.id: 2, self.b.id: 1})
+        place_order(self.user, {self.b.id: 1})
+
+        Order.objects.filter(pk=first.pk).delete()
+        subtracted = self.rollups()
+        sales.rebuild()
+        self.assertEqual(self.rollups(), subtracted)
+
+    def test_admin_deletes_match_a_rebuild(self):
+        first, _, _ = place_order(self.user, {self.a.id: 2, self.b.id: 1})
+        second, _, _ = place_order(self.user, {self.a.id: 1, self.b.id: 1})
+        staff = admin_client(User.objects.create_superuser('admin', password='pw'))
+
+        response = staff.post('/admin/store/order/', {
+            'action': 'delete_selected', '_selected_action': [first.pk], 'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        line = OrderItem.objects.get(order=second, product=self.b)
+        response = staff.post(f'/admin/store/orderitem/{line.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+
+        subtracted = self.rollups()
+        sales.rebuild()
+        self.assertEqual(self.rollups(), subtracted)
+        self.assertEqual(ProductDailySales.objects.values_list('product_id', 'units', 'orders').get(), (self.a.pk, 1, 1))
+
+    def test_product_deletes_match_a_rebuild(self):
+        other = make_product(Category.objects.create(name='Court'), stock=10, price=80, name='C')
+        place_order(self.user, {self.a.id: 2, self.b.id: 1, other.id: 1})
+        place_order(self.user, {self.b.id: 1})
+        place_order(self.user, {self.a.id: 1, self.b.id: 3})
+
+        self.a.delete()
+        subtracted = self.rollups()
+        sales.rebuild()
+        self.assertEqual(self.rollups(), subtracted)
+
+        # Both lines of the first order in the category go in one delete
+        self.b.delete()
+        other.delete()
+        self.assertFalse(CategoryDailySales.objects.exists())
+        self.assertEqual(DailySales.objects.values_list('units', 'orders').get(), (0, 3))
+        subtracted = self.rollups()
+        sales.rebuild()
+        self.assertEqual(self.rollups(), subtracted)
+
+    def test_category_delete_counts_each_order_once(self):
+        place_order(self.user, {self.a.id: 1, self.b.id: 1})
+        other = make_product(Category.objects.create(name='Court'), stock=10, name='C')
+        place_order(self.user, {other.id: 1})
+
+        Product.objects.filter(pk__in=[self.a.pk, self.b.pk]).delete()
+        self.assertEqual(list(CategoryDailySales.objects.values_list('category__name', 'units', 'orders')),
+                         [('Court', 1, 1)])
+        subtracted = self.rollups()
+        sales.rebuild()
+        self.assertEqual(self.rollups(), subtracted)
+
+    def test_archived_orders_stay_in_the_rollups(self):
+        order, _, _ = place_order(self.user, {self.a.id: 2})
+        recorded = self.rollups()
+
+        order_archive._delete_batch([order.pk])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.rollups(), recorded)
+
+
+class BulkActionTests(TestCase):
+    """store/bulk_actions.py: one UPDATE per action, with the page cache bumped."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Running')
+        self.products = [make_product(self.category, stock=5, price=100 * (i + 1), name=f'Runner {i}') for i in range(3)]
+        self.ids = [p.pk for p in self.products[:2]]
+
+    def values(self, field):
+        return list(Product.objects.order_by('pk').values_list(field, flat=True))
+
+    def test_price_and_stock_updates(self):
+        version = catalog_version()
+        self.assertEqual(bulk_actions.apply('set_price', self.ids, '100')[0], 2)
+        self.assertEqual(self.values('price'), [100, 100, 300])
+        self.assertNotEqual(catalog_version(), version)
+
+        bulk_actions.apply('adjust_price', [self.products[2].pk], '-15%')
+        self.assertEqual(self.values('price')[2], 255)
+
+        before = self.values('updated_at')
+        version = catalog_version()
+        with self.assertNumQueries(3):  # savepoint, UPDATE, release
+            bulk_actions.apply('set_stock', self.ids, '0')
+        self.assertEqual(self.values('stock'), [0, 0, 5])
+        self.assertEqual([a < b for a, b in zip(before, self.values('updated_at'))], [True, True, False])
+        self.assertNotEqual(catalog_version(), version)
+
+    def test_invalid_values_change_nothing(self):
+        version = catalog_version()
+        for action, value in (('set_price', '-1'), ('adjust_price', '-100'), ('set_stock', 'lots'),
+                              ('set_price', '1' * 20), ('rename', 'x')):
+            with self.assertRaises(ValidationError, msg=action):
+                bulk_actions.apply(action, self.ids, value)
+        self.assertEqual(self.values('price'), [100, 200, 300])
+        self.assertEqual(catalog_version(), version)
+
+    def test_category_delete_runs_in_batches(self):
+        user = User.objects.create_user('buyer')
+        place_order(user, {self.products[0].pk: 1})
+        other = make_product(Category.objects.create(name='Tennis'), stock=1)
+        admin = admin_client(User.objects.create_user('admin', is_staff=True))
+
+        admin.post(f'/myadmin/categories/{self.category.pk}/delete/')
+        self.assertEqual(Product.objects.count(), 4)  # queued, not run yet
+        version = catalog_version()
+        with mock.patch.object(bulk_actions, 'DELETE_BATCH_SIZE', 2):
+            self.assertTrue(task_queue.run(task_queue.claim()))
+
+        self.assertEqual(list(Product.objects.all()), [other])
+        self.assertFalse(Category.objects.filter(pk=self.category.pk).exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertNotEqual(catalog_version(), version)
+
+
+class OrderHistoryTests(TestCase):
+    """store/order_history.py: the cached summary follows new and removed orders."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('buyer')
+        self.product = make_product(Category.objects.create(name='Running'), stock=10, price=100)
+
+    def test_summary_is_dropped_after_a_new_order(self):
+        self.assertEqual(order_history.summary(self.user), {'orders': 0, 'spent': 0})
+        with self.assertNumQueries(0):
+            order_history.summary(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order, _, _ = place_order(self.user, {self.product.pk: 2})
+        self.assertEqual(order_history.summary(self.user), {'orders': 1, 'spent': 200})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(order_history.summary(self.user), {'orders': 0, 'spent': 0})
+
+    def test_history_pages(self):
+        for _ in range(3):
+            place_order(self.user, {self.product.pk: 1})
+        first, cursor = order_history.history_page(self.user, page_size=2)
+        with self.assertNumQueries(2):
+            second, last_cursor = order_history.history_page(self.user, after=cursor, page_size=2)
+            self.assertEqual([len(order.items.all()) for order in second], [1])
+        self.assertIsNone(last_cursor)
+        self.assertGreater(first[-1].pk, second[0].pk)
+
+
+class ByteRangeTests(TestCase):
+    """store/assets.py: single byte ranges of media files (206, 416, If-Range)."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, ASSET_SENDFILE='')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        with open(os.path.join(media.name, 'clip.bin'), 'wb') as f:
+            f.write(b'0123456789')
+        self.url = '/media/clip.bin'
+
+    def get(self, byte_range, **headers):
+        response = self.client.get(self.url, HTTP_RANGE=byte_range, **headers)
+        return response.status_code, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_partial_content(self):
+        self.assertEqual(self.get('bytes=2-4'), (206, b'234'))
+        self.assertEqual(self.get('bytes=7-'), (206, b'789'))
+        self.assertEqual(self.get('bytes=-3'), (206, b'789'))
+        self.assertEqual(self.get('bytes=8-100'), (206, b'89'))
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-4')
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 2-4/10', '3'))
+
+    def test_unsatisfiable_and_invalid_ranges(self):
+        self.assertEqual(self.get('bytes=10-')[0], 416)
+        self.assertEqual(self.get('bytes=-0')[0], 416)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=10-')['Content-Range'], 'bytes */10')
+        # Invalid or unsupported: the whole file
+        for header in ('bytes=5-3', 'bytes=0-1,4-5', 'items=0-1'):
+            self.assertEqual(self.get(header), (200, b'0123456789'), header)
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.get('bytes=0-1', HTTP_IF_RANGE=etag), (206, b'01'))
+        # The file changed since: the whole new file
+        self.assertEqual(self.get('bytes=0-1', HTTP_IF_RANGE='"stale"'), (200, b'0123456789'))
+
+
+class OrderSearchTests(TestCase):
+    """The orders page filter (views._filtered_orders): username prefix or product name."""
+
+    def setUp(self):
+        product = make_product(Category.objects.create(name='Running'), stock=10, name='Air Zoom')
+        for username in ('Alice', 'alina', 'bob'):
+            place_order(User.objects.create_user(username), {product.pk: 1})
+
+    def usernames(self, query):
+        orders = _filtered_orders({'q': query, 'from': None, 'to': None})
+        return sorted(orders.values_list('user__username', flat=True))
+
+    def test_username_prefix_is_case_insensitive(self):
+        self.assertEqual(self.usernames('ali'), ['Alice', 'alina'])
+        self.assertEqual(self.usernames('ALICE'), ['Alice'])
+        self.assertEqual(self.usernames('lice'), [])
+        self.assertEqual(len(self.usernames('zoom')), 3)
+
+    def test_username_prefix_uses_the_index(self):
+        users = User.objects.filter(username__istartswith='ali').values('id')
+        sql, params = users.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('store_username_nocase_idx', plan)
+
+
+@override_settings(ROOT_URLCONF='shoecommerce.asgi_urls')
+class AsyncViewTests(TestCase):
+    """The async catalog views (store/async_views.py) behind the ASGI URLconf."""
+
+    async_client_class = AsyncClient
+
+    def setUp(self):
+        category = Category.objects.create(name='Running')
+        self.products = [make_product(category, stock=5, name=f'Air Runner {i}') for i in range(3)]
+        make_product(category, stock=5, name='Court Pro')
+
+    async def get(self, url, **extra):
+        response = await self.async_client.get(url, **extra)
+        self.assertTrue(iscoroutinefunction(response.resolver_match.func), url)
+        return response
+
+    async def test_home_and_more(self):
+        response = await self.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Air Runner 2')
+        self.assertContains(response, 'Court Pro')
+
+        response = await self.get('/catalog/more/', query_params={'category': self.products[0].category_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Air Runner 0', response.json()['html'])
+
+    async def test_product_detail(self):
+        url = f'/product/{self.products[0].pk}/'
+        await self.get(url)  # sets the CSRF cookie the ETag covers
+        response = await self.get(url)
+        self.assertContains(response, 'Air Runner 0')
+        response = await self.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual((await self.get('/product/999999/')).status_code, 404)
+
+    async def test_search(self):
+        response = await self.get('/search/', query_params={'q': 'runner'})
+        self.assertContains(response, 'Air Runner 1')
+        self.assertNotContains(response, 'Court Pro')
+
+
+class RequestMetricsTests(TestCase):
+    """store/metrics.py and its middleware: per-view histograms, exports and the staff page."""
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        self.product = make_product(Category.objects.create(name='Running'), stock=5)
+
+    def recorded(self, view):
+        return metrics.registry._views[view]
+
+    def test_queries_and_time_per_request(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(f'/product/{self.product.pk}/').status_code, 200)
+
+        histograms = self.recorded('product_detail')
+        self.assertEqual(histograms['sql_queries'].count, 1)
+        self.assertEqual(histograms['sql_queries'].total, len(queries))
+        self.assertGreater(histograms['sql_duration_seconds'].total, 0)
+        self.assertGreater(histograms['template_duration_seconds'].total, 0)
+        self.assertGreaterEqual(
+            histograms['request_duration_seconds'].total,
+            histograms['sql_duration_seconds'].total + histograms['template_duration_seconds'].total,
+        )
+        # Queries outside a request are not counted
+        Product.objects.count()
+        self.assertEqual(histograms['sql_queries'].total, len(queries))
+
+    @override_settings(ROOT_URLCONF='shoecommerce.asgi_urls')
+    def test_async_views_count_the_queries_of_their_threads(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = async_to_sync(AsyncClient().get)('/')
+        self.assertTrue(iscoroutinefunction(response.resolver_match.func))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(queries), 0)
+        self.assertEqual(self.recorded('home')['sql_queries'].total, len(queries))
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        Client().get('/')
+        self.assertEqual(metrics.registry.summary(), [])
+
+    def test_percentile_edges(self):
+        histogram = metrics.Histogram(metrics.SECONDS_BUCKETS)
+        self.assertEqual(histogram.percentile(50), 0.0)
+
+        histogram.observe(0.03)
+        self.assertAlmostEqual(histogram.percentile(0), 0.025)
+        self.assertAlmostEqual(histogram.percentile(50), 0.0375)
+        self.assertAlmostEqual(histogram.percentile(100), 0.05)
+
+        slow = metrics.Histogram(metrics.SECONDS_BUCKETS)
+        slow.observe(60)
+        self.assertEqual(slow.percentile(50), metrics.SECONDS_BUCKETS[-1])
+        self.assertEqual(slow.counts[-1], 1)
+
+    def test_prometheus_format(self):
+        registry = metrics.Registry()
+        registry.record('say "hi"', sql_queries=3)
+        registry.record('say "hi"', sql_queries=30)
+
+        lines = registry.prometheus().splitlines()
+        start = lines.index('# HELP store_sql_queries SQL queries run by the request.')
+        self.assertEqual(lines[start + 1], '# TYPE store_sql_queries histogram')
+        buckets = lines[start + 2:start + 2 + len(metrics.COUNT_BUCKETS) + 1]
+        self.assertEqual(buckets[0], 'store_sql_queries_bucket{view="say \\"hi\\"",le="1"} 0')
+        self.assertEqual(buckets[3], 'store_sql_queries_bucket{view="say \\"hi\\"",le="5"} 1')
+        self.assertEqual(buckets[-2], 'store_sql_queries_bucket{view="say \\"hi\\"",le="500"} 2')
+        self.assertEqual(buckets[-1], 'store_sql_queries_bucket{view="say \\"hi\\"",le="+Inf"} 2')
+        self.assertEqual(lines[start + 2 + len(buckets)], 'store_sql_queries_sum{view="say \\"hi\\""} 33.0')
+        self.assertEqual(lines[start + 3 + len(buckets)], 'store_sql_queries_count{view="say \\"hi\\""} 2')
+        self.assertEqual(sum(line.startswith('# TYPE ') for line in lines), len(metrics.METRICS))
+
+    def test_metrics_pages_are_staff_only(self):
+        shopper = Client()
+        shopper.force_login(User.objects.create_user('shopper'))
+        for client in (Client(), shopper):
+            for url in ('/myadmin/metrics/', '/myadmin/metrics/prometheus/'):
+                self.assertEqual(client.get(url).status_code, 302, url)
+
+        self.client.get('/')
+        staff = admin_client(User.objects.create_user('staff', is_staff=True))
+        response = staff.get('/myadmin/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'home')
+        response = staff.get('/myadmin/metrics/prometheus/')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn(b'store_request_duration_seconds_count{view="home"} 1', response.content)
+
+
+class ApiTests(TestCase):
+    """The JSON API (store/api.py) stays within its documented query budget."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Running')
+        self.products = [make_product(self.category, stock=5, price=100 + i, name=f'Runner {i}') for i in range(5)]
+
+    def test_product_list_pages_with_sparse_fields(self):
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/v1/products/?limit=2&fields=id,price').json()
+        self.assertEqual([p['id'] for p in data['data']], [self.products[4].pk, self.products[3].pk])
+        self.assertEqual(set(data['data'][0]), {'id', 'price'})
+
+        with self.assertNumQueries(2):
+            data = self.client.get(f"/api/v1/products/?limit=2&after={data['next_cursor']}").json()
+        self.assertEqual(data['data'][0]['id'], self.products[2].pk)
+        self.assertEqual(data['data'][0]['category'], {'id': self.category.pk, 'name': 'Running'})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/v1/products/?fields=id,secret')
+        self.assertEqual(response.status_code, 400)
+
+    def test_detail_and_search(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/v1/products/{self.products[0].pk}/')
+        self.assertEqual(response.json()['data']['name'], 'Runner 0')
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/v1/search/?q=runner&limit=2&fields=id')
+        self.assertEqual(len(response.json()['data']), 2)
+        self.assertEqual(response.json()['next_cursor'], 2)
+
+    def test_responses_are_compressed(self):
+        response = self.client.get('/api/v1/products/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.client.get('/api/v1/products/', HTTP_ACCEPT_ENCODING='deflate')
+        self.assertEqual(response['Content-Encoding'], 'deflate')
+
+    def test_cart_operations(self):
+        user = User.objects.create_user('shopper')
+        self.client.force_login(user)
+        product = self.products[0]
+
+        # session + user, then the lines (an empty cart needs no total)
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get('/api/v1/cart/').json()['data'], [])
+
+        # session + user, UPDATE, product check, savepoint + INSERT + release, lines + total
+        with self.assertNumQueries(9):
+            data = self.client.post('/api/v1/cart/items/', {'product_id': product.pk, 'quantity': 2}).json()
+        self.assertEqual(data['data'][0]['quantity'], 2)
+
+        # session + user, UPDATE, lines + total
+        with self.assertNumQueries(5):
+            data = self.client.put(f'/api/v1/cart/items/{product.pk}/', '{"quantity": 5}',
+                                   content_type='application/json').json()
+        self.assertEqual(data['total'], '500.00')
+
+        response = self.client.post('/api/v1/cart/items/', {'product_id': 999999})
+        self.assertEqual(response.status_code, 404)
+
+        data = self.client.delete(f'/api/v1/cart/items/{product.pk}/').json()
+        self.assertEqual(data['data'], [])
+
+    def test_out_of_range_numbers_are_rejected(self):
+        huge = 10 ** 20
+        for url in (f'/api/v1/products/?after={huge}', f'/api/v1/search/?q=runner&after={huge}',
+                    '/api/v1/products/?after=abc', '/api/v1/products/?limit=abc'):
+            self.assertEqual(self.client.get(url).status_code, 400, url)
+        self.assertEqual(self.client.get(f'/api/v1/products/{huge}/').status_code, 404)
+        # Past the ranked results, but a valid page
+        self.assertEqual(self.client.get('/api/v1/search/?q=runner&after=100000').json()['data'], [])
+
+        self.client.force_login(User.objects.create_user('shopper'))
+        for body in ({'product_id': huge}, {'product_id': self.products[0].pk, 'quantity': huge}):
+            self.assertEqual(self.client.post('/api/v1/cart/items/', body).status_code, 400, body)
+        response = self.client.put(f'/api/v1/cart/items/{self.products[0].pk}/', '{"quantity": 1000000}',
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.delete(f'/api/v1/cart/items/{huge}/').status_code, 404)
+
+
+class RecommendationTests(TestCase):
+    """store/recommendations.py: incremental updates agree with a full rebuild."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Running')
+        self.products = [make_product(category, stock=5, name=f'Runner {i}') for i in range(5)]
+        self.user = User.objects.create_user('buyer')
+
+    def order(self, *indexes):
+        order = Order.objects.create(user=self.user, total_price=0)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.products[i], quantity=1, price=100) for i in indexes
+        ])
+
+    def ranking(self, product):
+        return list(Recommendation.objects.filter(product=product).order_by('rank').values_list('related', 'orders'))
+
+    def test_update_matches_rebuild(self):
+        first, second, third, fourth = self.products[:4]
+        self.order(0, 1, 2)
+        self.order(0, 1)
+        recommendations.rebuild(top_k=2)
+        self.assertEqual(self.ranking(first), [(second.pk, 2), (third.pk, 1)])
+
+        for _ in range(3):
+            self.order(0, 3)
+        self.assertEqual(recommendations.update(batch_size=2, top_k=2), 3)
+        self.assertEqual(self.ranking(first), [(fourth.pk, 3), (second.pk, 2)])
+
+        incremental = sorted(Recommendation.objects.values_list('product', 'related', 'rank', 'orders'))
+        recommendations.rebuild(top_k=2)
+        self.assertEqual(sorted(Recommendation.objects.values_list('product', 'related', 'rank', 'orders')),
+                         incremental)
+
+    def test_update_changes_only_the_affected_product_pages(self):
+        self.order(0, 1)
+        self.order(2, 3)
+        recommendations.rebuild()
+        version = catalog_version()
+        states = {p.pk: product_state(None, p.pk) for p in self.products}
+
+        self.order(0, 4)
+        recommendations.update()
+        changed = {p.pk for p in self.products if product_state(None, p.pk) != states[p.pk]}
+        self.assertEqual(changed, {self.products[0].pk, self.products[4].pk})
+        self.assertEqual(catalog_version(), version)
+
+    def test_order_placed_during_an_update_gets_a_follow_up(self):
+        recommendations.schedule_update()
+        running = task_queue.claim()
+        recommendations.update()  # the worker reads no orders...
+        self.order(0, 1)  # ...and a checkout commits before it is marked done
+        recommendations.schedule_update()
+        Task.objects.filter(pk=running.pk).update(status=Task.DONE)
+
+        follow_up = Task.objects.get(status=Task.QUEUED)
+        self.assertEqual(follow_up.key, 'recommendations:follow-up')
+        Task.objects.update(run_after=timezone.now())
+        self.assertTrue(task_queue.run(task_queue.claim()))
+        self.assertEqual(self.ranking(self.products[0]), [(self.products[1].pk, 1)])
+
+    def test_related_product_changes_refresh_the_product_page(self):
+        self.order(0, 1)
+        recommendations.rebuild()
+        url = f'/product/{self.products[0].pk}/'
+        self.client.get(url)  # sets the CSRF cookie the ETag covers
+        related = self.products[1]
+
+        def rename():
+            related.name = 'Renamed'
+            related.save()
+
+        def reprice():
+            Product.objects.filter(pk=related.pk).update(price=999, updated_at=timezone.now())
+
+        def sell_out():
+            place_order(self.user, {related.pk: 5})
+
+        for change in (rename, reprice, sell_out):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, change.__name__)
+        self.assertNotContains(response, 'Frequently bought together')
+
+    def test_product_page_reads_in_stock_recommendations(self):
+        self.order(0, 1, 2)
+        recommendations.rebuild()
+        Product.objects.filter(pk=self.products[2].pk).update(stock=0)
+
+        with self.assertNumQueries(1):
+            related = [r.related for r in recommendations.for_product(self.products[0].pk)]
+        self.assertEqual(related, [self.products[1]])
+        self.assertContains(self.client.get(f'/product/{self.products[0].pk}/'), 'Frequently bought together')
+
+
+class AutocompleteTests(TestCase):
+    """store/autocomplete.py: prefix lookups, in-place updates and rebuilds on a version change."""
+
+    def setUp(self):
+        autocomplete.invalidate()
+        self.category = Category.objects.create(name='Trail Running')
+        self.product = make_product(self.category, stock=5, name='Air Rünner 5')
+
+    def names(self, query, kind='products'):
+        return [name for _, name in autocomplete.suggest(query)[kind]]
+
+    def test_matches_any_word_prefix(self):
+        make_product(self.category, stock=5, name='Court Classic')
+        self.assertEqual(self.names('air'), ['Air Rünner 5'])
+        self.assertEqual(self.names('RUNN'), ['Air Rünner 5'])
+        self.assertEqual(self.names('air  ru'), ['Air Rünner 5'])
+        self.assertEqual(self.names('cl'), ['Court Classic'])
+        self.assertEqual(self.names('runn', 'categories'), ['Trail Running'])
+        self.assertEqual(self.names('xyz'), [])
+
+    def test_saves_update_the_index_in_place(self):
+        self.names('air')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Street Flex'
+            self.product.save()
+            make_product(self.category, stock=5, name='Air Max')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('air'), ['Air Max'])
+            self.assertEqual(self.names('street'), ['Street Flex'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('street'), [])
+
+    def test_change_elsewhere_rebuilds(self):
+        self.names('air')
+        # Another worker saved a product: only the shared version moves here
+        Product.objects.filter(pk=self.product.pk).update(name='Lite Pro')
+        autocomplete.invalidate()
+        with self.assertNumQueries(2):
+            self.assertEqual(self.names('lite'), ['Lite Pro'])
+
+    def test_endpoint(self):
+        self.names('air')
+        with self.assertNumQueries(0):
+            data = self.client.get('/search/suggest/?q=ai&limit=1').json()
+        self.assertEqual(data['products'], [
+            {'id': self.product.pk, 'name': 'Air Rünner 5', 'url': f'/product/{self.product.pk}/'},
+        ])
+        self.assertEqual(data['categories'], [])
+
+
+@task(max_attempts=2)
+def failing_task(message):
+    raise ValueError(message)
+
+
+def _bump_versions():
+    # Bumps only, like a worker's bulk change; it doesn't touch the database
+    bump_catalog_version()
+    autocomplete.invalidate()
+
+
+def _incr_many(location, times):
+    shared = FileBasedCache(location, {})
+    for _ in range(times):
+        shared.incr('counter')
+
+
+class TaskQueueTests(TestCase):
+    """store/task_queue.py: idempotent keys, retries with backoff and visibility timeouts."""
+
+    def test_key_is_idempotent_while_pending(self):
+        self.assertTrue(task_queue.enqueue(recommendations.update, key='recommendations'))
+        self.assertFalse(task_queue.enqueue(recommendations.update, key='recommendations'))
+        self.assertTrue(task_queue.run(task_queue.claim()))
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+        self.assertTrue(task_queue.enqueue(recommendations.update, key='recommendations'))
+
+    def test_failure_is_retried_after_backoff_then_given_up(self):
+        task_queue.enqueue(failing_task, 'boom')
+        with self.assertLogs('store.task_queue', 'WARNING') as logs:
+            self.assertFalse(task_queue.run(task_queue.claim()))
+        self.assertIn('will retry', logs.output[0])
+        row = Task.objects.get()
+        self.assertEqual((row.status, row.attempts), (Task.QUEUED, 1))
+        self.assertGreater(row.run_after, timezone.now())
+        self.assertIn('ValueError: boom', row.last_error)
+        self.assertIsNone(task_queue.claim())  # not due yet
+
+        Task.objects.update(run_after=timezone.now())
+        with self.assertLogs('store.task_queue', 'ERROR') as logs:
+            task_queue.run(task_queue.claim())
+        self.assertIn('failed for good', logs.output[0])
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (Task.FAILED, 2))
+
+    def test_expired_lease_is_picked_up_again(self):
+        task_queue.enqueue(recommendations.update)
+        first = task_queue.claim()
+        self.assertIsNone(task_queue.claim())
+
+        # The first worker died: its lease runs out
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        second = task_queue.claim()
+        self.assertEqual((second.pk, second.attempts), (first.pk, 2))
+        self.assertTrue(task_queue.run(second))
+        # A late finish from the first worker changes nothing
+        with self.assertLogs('store.task_queue', 'WARNING') as logs:
+            task_queue.run(first)
+        self.assertIn('after its lease ran out', logs.output[0])
+        self.assertEqual(Task.objects.get().attempts, 2)
+
+    def test_bumps_from_a_worker_process_reach_the_web_process(self):
+        # The task workers are separate processes; the cache they bump is shared
+        autocomplete.warm()
+        self.assertEqual(autocomplete.suggest('cour')['products'], [])
+        catalog = catalog_version()
+        make_product(Category.objects.create(name='Tennis'), stock=1, name='Court Pro')
+
+        context = multiprocessing.get_context('fork')
+        worker = context.Process(target=_bump_versions)
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+
+        self.assertNotEqual(catalog_version(), catalog)
+        self.assertEqual([name for _, name in autocomplete.suggest('cour')['products']], ['Court Pro'])
+
+    def test_counters_are_atomic_across_processes(self):
+        with tempfile.TemporaryDirectory() as location:
+            shared = FileBasedCache(location, {})
+            shared.set('counter', 0)
+            context = multiprocessing.get_context('fork')
+            workers = [context.Process(target=_incr_many, args=(location, 50)) for _ in range(4)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            self.assertEqual(shared.get('counter'), 200)
+
+
+class ViewBenchmarkTests(TestCase):
+    def test_views_match_baseline(self):
+        baseline = load_baseline()
+        results = run_suite(scale=baseline['scale'], iterations=1)
+
+        # Latency depends on the machine; `manage.py bench_views` checks it
+        self.assertEqual(find_regressions(results, baseline, latency_tolerance=None), [])
@@ -1,10 +1,9 @@
 from django.urls import path
-from . import views
-from django.conf import settings
-from django.conf.urls.static import static
+from . import api, assets, views
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('catalog/more/', views.catalog_more, name='catalog_more'),
     path('product/<int:pk>/', views.product_detail, name='product_detail'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/', views.cart, name='cart'),
@@ -20,17 +19,23 @@ urlpatterns = [
     # Checkout
     path('checkout/', views.checkout, name='checkout'),
     path('order-confirmation/<int:order_id>/', views.order_confirmation, name='order_confirmation'),
+    path('my-orders/', views.my_orders, name='my_orders'),
 
     # Admin
     path('admin-login/', views.admin_login, name='admin_login'),
-    # path('admin_logout/', views.admin_logout, name='admin_logout'),
+    path('myadmin/logout/', views.admin_logout, name='admin_logout'),
     path('myadmin/', views.myadmin, name='myadmin'),
+    path('myadmin/metrics/', views.metrics_page, name='metrics_page'),
+    path('myadmin/metrics/prometheus/', views.metrics_prometheus, name='metrics_prometheus'),
     # --- Product CRUD ---
     # --- Product CRUD (Custom Admin) ---
     path('myadmin/products/add/', views.add_product, name='add_product'),
     path('myadmin/products/<int:pk>/edit/', views.edit_product, name='edit_product'),
     path('myadmin/products/<int:pk>/delete/', views.delete_product, name='delete_product'),
+    path('myadmin/products/bulk/', views.bulk_products, name='bulk_products'),
     path('myadmin/orders/', views.orders_page, name='orders_page'),
+    path('myadmin/orders/export/', views.export_orders, name='export_orders'),
+    path('myadmin/orders/archive/', views.archive_orders, name='archive_orders'),
 
  # --- ✅ Category Management (NEW) ---
     path('myadmin/categories/add/', views.add_category, name='add_category'),
@@ -39,7 +44,15 @@ urlpatterns = [
 
     path('orders/', views.orders_page, name='orders_page'),
     path('delete_order/<int:order_id>/', views.delete_order, name='delete_order'),
-    path('delete_all_orders/', views.delete_all_orders, name='delete_all_orders'),
 
     path('search/', views.search_products, name='search_products'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('search/suggest/', views.search_suggestions, name='search_suggestions'),
+
+    # JSON API for the mobile app (store/api.py)
+    path('api/v1/products/', api.products, name='api_v1_products'),
+    path('api/v1/products/<int:pk>/', api.product, name='api_v1_product'),
+    path('api/v1/search/', api.search_products, name='api_v1_search'),
+    path('api/v1/cart/', api.cart, name='api_v1_cart'),
+    path('api/v1/cart/items/', api.cart_items, name='api_v1_cart_items'),
+    path('api/v1/cart/items/<int:product_id>/', api.cart_item, name='api_v1_cart_item'),
+] + assets.urlpatterns()
@@ -1,64 +1,83 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from .models import Product, Category, Order, OrderItem
+from .pagination import keyset_page, parse_cursor
+from . import (
+    autocomplete, bulk_actions, cart_service, facets, metrics, order_archive, order_export, order_history,
+    recommendations, sales, search, task_queue,
+)
+from .checkout import place_order
+from .conditional import catalog_state, conditional_page, product_state
+from .images import schedule_renditions
+from .page_cache import cache_anonymous_page
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import user_passes_test
 from django.conf import settings
-from django.db.models import Q
-
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch, Q
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
+
+CATALOG_PAGE_SIZE = 24
+
+def _catalog_page(request, selected):
+    # Category is joined in the same query so the cards don't hit the DB again
+    products = facets.filter_products(Product.objects.select_related('category'), selected)
+    after = parse_cursor(request.GET.get('after'))
+    return keyset_page(products, after, CATALOG_PAGE_SIZE)
+
+@conditional_page(catalog_state)
+@cache_anonymous_page
 def home(request):
-    products = Product.objects.all()
-    return render(request, 'store/home.html', {'products': products})
+    selected = facets.parse_facets(request.GET)
+    products, next_cursor = _catalog_page(request, selected)
+    return render(request, 'store/home.html', {
+        'products': products,
+        'next_cursor': next_cursor,
+        'facets': facets.build(request.GET, selected, *facets.counts()),
+    })
+
+@conditional_page(catalog_state)
+@cache_anonymous_page
+def catalog_more(request):
+    # JSON endpoint used by the infinite scroll on the home page
+    products, next_cursor = _catalog_page(request, facets.parse_facets(request.GET))
+    html = render_to_string('store/product_cards.html', {'products': products}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
 
+@conditional_page(product_state)
+@cache_anonymous_page
 def product_detail(request, pk):
-    product = get_object_or_404(Product, pk=pk)
-    return render(request, 'store/product_detail.html', {'product': product})
+    product = get_object_or_404(Product.objects.select_related('category'), pk=pk)
+    related = [r.related for r in recommendations.for_product(pk)]
+    return render(request, 'store/product_detail.html', {'product': product, 'related': related})
 
 # --- Cart functionalities ---
 def add_to_cart(request, product_id):
-    cart = request.session.get('cart', {})
-    cart[str(product_id)] = cart.get(str(product_id), 0) + 1
-    request.session['cart'] = cart
+    cart_service.add(request, product_id)
     return redirect('home')
 
 def cart(request):
-    cart = request.session.get('cart', {})
-    products = Product.objects.filter(id__in=cart.keys())
-    cart_items = []
-    total = 0
-
-    for product in products:
-        quantity = cart[str(product.id)]
-        total_price = product.price * quantity
-        cart_items.append({'product': product, 'quantity': quantity, 'total_price': total_price})
-        total += total_price
-
+    cart_items, total = cart_service.contents(request)
     return render(request, 'store/cart.html', {'cart_items': cart_items, 'total': total})
 
 def remove_from_cart(request, product_id):
-    cart = request.session.get('cart', {})
-    if str(product_id) in cart:
-        del cart[str(product_id)]
-    request.session['cart'] = cart
+    cart_service.remove(request, [product_id])
     return redirect('cart')
 
 def increase_quantity(request, product_id):
-    cart = request.session.get('cart', {})
-    if str(product_id) in cart:
-        cart[str(product_id)] += 1
-    request.session['cart'] = cart
+    cart_service.increase(request, product_id)
     return redirect('cart')
 
 def decrease_quantity(request, product_id):
-    cart = request.session.get('cart', {})
-    if str(product_id) in cart:
-        if cart[str(product_id)] > 1:
-            cart[str(product_id)] -= 1
-        else:
-            del cart[str(product_id)]
-    request.session['cart'] = cart
+    cart_service.decrease(request, product_id)
     return redirect('cart')
 
 def login_view(request):
@@ -121,31 +140,28 @@ def checkout(request):
             messages.error(request, "Please select at least one item to checkout.")
             return redirect('cart')
 
-        cart = request.session.get('cart', {})
-        selected_products = Product.objects.filter(id__in=selected_ids)
+        cart = cart_service.quantities(request)
+        quantities = {int(pid): cart.get(int(pid), 0) for pid in selected_ids if pid.isdigit()}
 
-        total_price = 0
-        order = Order.objects.create(user=request.user, total_price=0)
-        order_items = []
+        # Stock check, stock decrement and order writes all happen in one transaction
+        order, order_items, out_of_stock = place_order(request.user, quantities)
 
-        for product in selected_products:
-            quantity = cart.get(str(product.id), 0)
-            if quantity > 0:
-                item_total = product.price * quantity
-                total_price += item_total
-
-                order_item = OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=quantity,
-                    price=product.price
+        if out_of_stock:
+            for line in out_of_stock:
+                messages.error(
+                    request,
+                    f"Not enough stock for {line['product'].name}: "
+                    f"you asked for {line['requested']}, only {line['available']} left."
                 )
-                order_items.append(order_item)
-                cart.pop(str(product.id), None)
+            return redirect('cart')
+
+        if order is None:
+            messages.error(request, "The selected items are no longer available.")
+            return redirect('cart')
 
-        order.total_price = total_price
-        order.save()
-        request.session['cart'] = cart
+        cart_service.remove(request, [item.product_id for item in order_items])
+        # Fold the order into the recommendations in a task worker
+        recommendations.schedule_update()
 
         return render(request, 'store/order_confirmation.html', {
             'order': order,
@@ -158,6 +174,16 @@ def order_confirmation(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
     return render(request, 'store/order_confirmation.html', {'order': order})
 
+@login_required
+def my_orders(request):
+    # Two queries per page (orders, then their lines), plus the cached summary
+    orders, next_cursor = order_history.history_page(request.user, parse_cursor(request.GET.get('after')))
+    return render(request, 'store/my_orders.html', {
+        'orders': orders,
+        'next_cursor': next_cursor,
+        'summary': order_history.summary(request.user),
+    })
+
 def admin_login(request):
     # If a user is logged in but not admin, log them out
     if request.user.is_authenticated and not (request.user.is_staff or request.user.is_superuser):
@@ -195,19 +221,33 @@ def admin_dashboard(request):
 @user_passes_test(is_admin)
 @login_required
 def myadmin(request):
-    from .models import Product, Category, Order
+    from .models import Product, Category
 
-    products = Product.objects.all().order_by('-id')
+    products = Product.objects.select_related('category').order_by('-id')
     categories = Category.objects.all().order_by('name')
-    orders = Order.objects.all().order_by('-id')
 
     context = {
         'products': products,
         'categories': categories,
-        'orders': orders,
+        'bulk_actions': bulk_actions.ACTIONS,
+        # Read from the daily rollups, not the orders
+        'sales': sales.dashboard(),
     }
     return render(request, 'store/myadmin.html', context)
 
+@user_passes_test(is_admin)
+@login_required
+def metrics_page(request):
+    return render(request, 'store/metrics.html', {
+        'rows': metrics.registry.summary(),
+        'sample_rate': getattr(settings, 'METRICS_SAMPLE_RATE', 1.0),
+    })
+
+@user_passes_test(is_admin)
+@login_required
+def metrics_prometheus(request):
+    return HttpResponse(metrics.registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def add_product(request):
     if not (request.user.is_staff or request.user.is_superuser):
         return redirect('admin_login')
@@ -243,7 +283,7 @@ def add_product(request):
         #     shoe_size = None  # Optional — depending on your Product model
 
         # ✅ Create the product
-        Product.objects.create(
+        product = Product.objects.create(
             name=name,
             price=price,
             stock=stock,
@@ -252,6 +292,8 @@ def add_product(request):
             category=category,
             # size=shoe_size
         )
+        # Thumbnails are built in the background, not in this request
+        schedule_renditions(product)
 
         messages.success(request, "✅ Product added successfully!")
         return redirect('myadmin')
@@ -309,7 +351,10 @@ def edit_product(request, pk):
         product.description = description
         if image:
             product.image = image
+            product.has_renditions = False
         product.save()
+        if image:
+            schedule_renditions(product)
 
         return redirect('myadmin')
 
@@ -329,28 +374,107 @@ def delete_product(request, pk):
     # ✅ If it's a GET request, show a confirmation page
     return render(request, 'store/confirm_delete.html', {'product': product})
 
-def orders_page(request):
+def bulk_products(request):
     if not (request.user.is_staff or request.user.is_superuser):
         return redirect('admin_login')
 
-    query = request.GET.get('q', '')
+    # Only allow POST requests for safety
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        value = request.POST.get('category') if action == 'move_category' else request.POST.get('value')
+        try:
+            count, summary = bulk_actions.apply(action, request.POST.getlist('ids'), value)
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
+        else:
+            messages.success(request, summary)
+
+    return redirect(reverse('myadmin') + '#products')
+
+ORDERS_PAGE_SIZE = 50
+
+def _parse_day(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+def _order_filters(request):
+    """Read the orders page filters (?q=, ?from=, ?to=) from the query string."""
+    return {
+        'q': request.GET.get('q', '').strip(),
+        'from': _parse_day(request.GET.get('from')),
+        'to': _parse_day(request.GET.get('to')),
+    }
 
-    # ✅ Filter orders if there's a search query
+def _filtered_orders(filters):
+    orders = Order.objects.all()
+
+    # Date range on the indexed created_at column (whole days, inclusive)
+    if filters['from']:
+        start = datetime.combine(filters['from'], time.min)
+        orders = orders.filter(created_at__gte=timezone.make_aware(start))
+    if filters['to']:
+        end = datetime.combine(filters['to'] + timedelta(days=1), time.min)
+        orders = orders.filter(created_at__lt=timezone.make_aware(end))
+
+    # Each side is a subquery on an indexed key, so no join fan-out and
+    # no DISTINCT is needed. Usernames match by prefix, a range on the
+    # NOCASE username index (migration 0019)
+    query = filters['q']
     if query:
-        orders = Order.objects.filter(
-            user__username__icontains=query
-        ) | Order.objects.filter(
-            items__product__name__icontains=query
-        )
-        orders = orders.distinct()
-    else:
-        orders = Order.objects.all()
+        matching_users = User.objects.filter(username__istartswith=query).values('id')
+        matching_items = OrderItem.objects.filter(
+            product__in=search.product_ids_matching_name(query)
+        ).values('order_id')
+        orders = orders.filter(Q(user__in=matching_users) | Q(id__in=matching_items))
+
+    return orders
+
+def orders_page(request):
+    if not (request.user.is_staff or request.user.is_superuser):
+        return redirect('admin_login')
+
+    filters = _order_filters(request)
+
+    # ✅ Users, items and products come in with two extra queries total
+    orders = _filtered_orders(filters).select_related('user').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+    )
+    orders, next_cursor = keyset_page(orders, parse_cursor(request.GET.get('after')), ORDERS_PAGE_SIZE)
+
+    # Keep the filters in the "older orders" link
+    params = request.GET.copy()
+    params.pop('after', None)
 
     # ✅ Render the template with context
     return render(request, 'store/orders.html', {
         'orders': orders,
-        'query': query,
+        'query': filters['q'],
+        'date_from': request.GET.get('from', ''),
+        'date_to': request.GET.get('to', ''),
+        'next_cursor': next_cursor,
+        'filter_params': params.urlencode(),
+        'archive_status': order_archive.read_status(),
+        'archive_before': timezone.localdate() - timedelta(days=365),
     })
+
+def export_orders(request):
+    if not (request.user.is_staff or request.user.is_superuser):
+        return redirect('admin_login')
+
+    # Same filters as the orders page, streamed chunk by chunk
+    orders = _filtered_orders(_order_filters(request))
+    if request.GET.get('format') == 'jsonl':
+        lines, content_type, ext = order_export.jsonl_lines(orders), 'application/x-ndjson', 'jsonl'
+    else:
+        lines, content_type, ext = order_export.csv_lines(orders), 'text/csv; charset=utf-8', 'csv'
+
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    filename = f"orders-{timezone.localdate():%Y%m%d}.{ext}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 def add_category(request):
     if not (request.user.is_staff or request.user.is_superuser):
         return redirect('admin_login')
@@ -382,12 +506,14 @@ def delete_category(request, pk):
     if not (request.user.is_staff or request.user.is_superuser):
         return redirect('admin_login')
 
-    try:
-        category = Category.objects.get(pk=pk)
-        category.delete()
-        messages.success(request, "Category deleted successfully.")
-    except Category.DoesNotExist:
+    category = Category.objects.filter(pk=pk).first()
+    if category is None:
         messages.error(request, "Category not found.")
+    else:
+        # Its products (and their order lines) can be many: a task worker
+        # deletes them in batches (store/bulk_actions.py)
+        task_queue.enqueue(bulk_actions.delete_category, category.pk, key=f'delete-category:{category.pk}')
+        messages.success(request, f"Deleting category {category.name} and its products…")
 
     return redirect('myadmin')
 
@@ -397,38 +523,75 @@ def delete_order(request, order_id):
 
     # Only allow POST requests for safety
     if request.method == 'POST':
-        order = get_object_or_404(Order, id=order_id)
-        order.delete()
+        # The sales rollups are subtracted by a pre_delete signal (store/sales.py)
+        get_object_or_404(Order, id=order_id).delete()
         # Redirect back to orders page after deleting
         return redirect('orders_page')
 
     # If someone tries to access via GET, redirect back safely
     return redirect('orders_page')
 
-def delete_all_orders(request):
+def archive_orders(request):
     if not (request.user.is_staff or request.user.is_superuser):
         return redirect('admin_login')
 
     # Only allow POST requests for safety
     if request.method == 'POST':
-        Order.objects.all().delete()
-        # Redirect back to the orders page after deleting
-        return redirect('orders_page')
+        cutoff = _parse_day(request.POST.get('before'))
+        if cutoff is None:
+            messages.error(request, "Pick the day to archive orders before.")
+        elif order_archive.start_archive(cutoff):
+            # Archived in small batches by a task worker (store/order_archive.py)
+            messages.success(request, f"Archiving orders placed before {cutoff}…")
+        else:
+            messages.error(request, "An archive is already queued or running.")
 
-    # If someone tries to access via GET, just redirect safely
     return redirect('orders_page')
 
+SEARCH_PAGE_SIZE = 24
+SUGGESTIONS_MAX_AGE = 60
+
+def _search_params(request):
+    query = request.GET.get('q', '').strip()  # get the search keyword
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    return query, page
+
+@conditional_page(catalog_state)
+@cache_anonymous_page
 def search_products(request):
-    query = request.GET.get('q', '')  # get the search keyword
-    results = []
+    query, page = _search_params(request)
 
+    results, has_next = [], False
     if query:
-        results = Product.objects.filter(
-            Q(name__icontains=query) | Q(description__icontains=query)
-        )
+        # Ranked full-text search with prefix matching (see store/search.py)
+        results, has_next = search.search_products(query, page, SEARCH_PAGE_SIZE)
 
     context = {
         'query': query,
         'results': results,
+        'page': page,
+        'has_next': has_next,
     }
-    return render(request, 'shop/search_results.html', context)
\ No newline at end of file
+    return render(request, 'store/search_results.html', context)
+
+
+# ✅ Search box suggestions: served from the in-process index, no database work per keystroke
+def search_suggestions(request):
+    try:
+        limit = min(max(int(request.GET.get('limit', autocomplete.DEFAULT_LIMIT)), 1), autocomplete.MAX_LIMIT)
+    except ValueError:
+        limit = autocomplete.DEFAULT_LIMIT
+    found = autocomplete.suggest(request.GET.get('q', ''), limit)
+    home_url = reverse('home')
+    response = JsonResponse({
+        'products': [{'id': pk, 'name': name, 'url': reverse('product_detail', args=[pk])}
+                     for pk, name in found['products']],
+        'categories': [{'id': pk, 'name': name, 'url': f'{home_url}?category={pk}'}
+                       for pk, name in found['categories']],
+    })
+    # Browsers repeat the same prefixes while typing and deleting
+    patch_cache_control(response, public=True, max_age=SUGGESTIONS_MAX_AGE)
+    return response